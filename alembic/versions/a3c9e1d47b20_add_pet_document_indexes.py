@@ -0,0 +1,46 @@
+"""add_pet_document_indexes
+
+Revision ID: a3c9e1d47b20
+Revises: f5d51e98ab1c
+Create Date: 2026-10-17 09:12:31.418207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c9e1d47b20'
+down_revision: Union[str, Sequence[str], None] = 'f5d51e98ab1c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Registro del índice vectorial vigente de cada mascota (una fila por mascota)
+    op.create_table('pet_document_indexes',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('pet_id', postgresql.UUID(as_uuid=True),
+                  sa.ForeignKey('petcare.pets.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('collection_name', sa.String(), nullable=False),
+        sa.Column('fingerprint', sa.String(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('document_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('chunk_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('built_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        schema='petcare'
+    )
+    op.create_index('ix_petcare_pet_document_indexes_pet_id', 'pet_document_indexes', ['pet_id'],
+                    unique=True, schema='petcare')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_petcare_pet_document_indexes_pet_id', table_name='pet_document_indexes', schema='petcare')
+    op.drop_table('pet_document_indexes', schema='petcare')
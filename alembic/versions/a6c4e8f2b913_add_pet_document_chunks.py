@@ -0,0 +1,137 @@
+"""add_pet_document_chunks
+
+Revision ID: a6c4e8f2b913
+Revises: f8b2d6e4a1c7
+Create Date: 2026-10-17 17:40:52.207614
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from pgvector.sqlalchemy import Vector
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c4e8f2b913'
+down_revision: Union[str, Sequence[str], None] = 'f8b2d6e4a1c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Deben coincidir con RAG_EMBEDDING_DIMENSIONS y RAG_TEXT_SEARCH_CONFIG
+EMBEDDING_DIMENSIONS = 1536
+TEXT_SEARCH_CONFIG = 'spanish'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tabla única de chunks para todas las mascotas (sustituye a una colección PGVector por mascota)
+    op.create_table('pet_document_chunks',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('pet_id', postgresql.UUID(as_uuid=True),
+                  sa.ForeignKey('petcare.pets.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('document_id', postgresql.UUID(as_uuid=True),
+                  sa.ForeignKey('petcare.pet_photos.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('generation', sa.Integer(), nullable=False),
+        sa.Column('chunk_index', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('metadata', postgresql.JSONB(), nullable=False, server_default='{}'),
+        sa.Column('embedding', Vector(EMBEDDING_DIMENSIONS), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        schema='petcare'
+    )
+    op.create_index('ix_pet_document_chunks_pet_generation', 'pet_document_chunks',
+                    ['pet_id', 'generation'], schema='petcare')
+    op.create_index('ix_pet_document_chunks_document_chunk', 'pet_document_chunks',
+                    ['document_id', 'generation', 'chunk_index'], unique=True, schema='petcare')
+    # Un solo índice ANN y un solo índice de texto completo para todas las mascotas
+    op.execute(
+        "CREATE INDEX ix_pet_document_chunks_embedding_hnsw "
+        "ON petcare.pet_document_chunks USING hnsw (embedding vector_cosine_ops)"
+    )
+    op.execute(
+        "CREATE INDEX ix_pet_document_chunks_content_fts "
+        f"ON petcare.pet_document_chunks USING gin (to_tsvector('{TEXT_SEARCH_CONFIG}'::regconfig, content))"
+    )
+    
+    # El índice de cada mascota pasa de nombrar una colección a una generación de chunks
+    op.add_column('pet_document_indexes',
+        sa.Column('generation', sa.Integer(), nullable=False, server_default='1'),
+        schema='petcare'
+    )
+    
+    # Copiar los embeddings de las colecciones vigentes (documentos que aún existen)
+    op.execute(f"""
+        INSERT INTO petcare.pet_document_chunks
+            (id, pet_id, document_id, generation, chunk_index, content, metadata, embedding)
+        SELECT e.uuid, i.pet_id, p.id, i.generation,
+               COALESCE((e.cmetadata->>'chunk_index')::int, 0),
+               COALESCE(e.document, ''),
+               COALESCE(e.cmetadata::jsonb, '{{}}'::jsonb),
+               e.embedding::vector({EMBEDDING_DIMENSIONS})
+        FROM langchain_pg_embedding e
+        JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+        JOIN petcare.pet_document_indexes i ON i.collection_name = c.name
+        JOIN petcare.pet_photos p ON p.id::text = e.cmetadata->>'document_id'
+        ON CONFLICT DO NOTHING
+    """)
+    
+    op.drop_column('pet_document_indexes', 'collection_name', schema='petcare')
+    
+    # Las tablas de PGVector ya no se usan: sin ellas no se mantienen sus índices HNSW y de texto
+    op.execute("DROP INDEX IF EXISTS ix_langchain_pg_embedding_document_fts")
+    op.execute("DROP INDEX IF EXISTS ix_langchain_pg_embedding_hnsw")
+    op.execute("DROP INDEX IF EXISTS ix_langchain_pg_embedding_collection_id")
+    op.execute("DROP TABLE IF EXISTS langchain_pg_embedding")
+    op.execute("DROP TABLE IF EXISTS langchain_pg_collection")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Tablas de PGVector vacías con sus índices (como tras f8b2d6e4a1c7)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS langchain_pg_collection (
+            name VARCHAR,
+            cmetadata JSON,
+            uuid UUID PRIMARY KEY
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS langchain_pg_embedding (
+            collection_id UUID REFERENCES langchain_pg_collection (uuid) ON DELETE CASCADE,
+            embedding VECTOR,
+            document VARCHAR,
+            cmetadata JSON,
+            custom_id VARCHAR,
+            uuid UUID PRIMARY KEY
+        )
+    """)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_langchain_pg_embedding_collection_id "
+        "ON langchain_pg_embedding (collection_id)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_langchain_pg_embedding_hnsw "
+        f"ON langchain_pg_embedding USING hnsw ((embedding::vector({EMBEDDING_DIMENSIONS})) vector_cosine_ops)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_langchain_pg_embedding_document_fts "
+        f"ON langchain_pg_embedding USING gin (to_tsvector('{TEXT_SEARCH_CONFIG}'::regconfig, document))"
+    )
+    
+    # Los embeddings no se copian de vuelta: las mascotas se reindexan al consultar
+    op.add_column('pet_document_indexes',
+        sa.Column('collection_name', sa.String(), nullable=False, server_default=''),
+        schema='petcare'
+    )
+    op.execute(
+        "UPDATE petcare.pet_document_indexes "
+        "SET collection_name = 'pet_' || pet_id || '_documents_v' || generation, fingerprint = ''"
+    )
+    op.drop_column('pet_document_indexes', 'generation', schema='petcare')
+    op.drop_index('ix_pet_document_chunks_content_fts', table_name='pet_document_chunks', schema='petcare')
+    op.drop_index('ix_pet_document_chunks_embedding_hnsw', table_name='pet_document_chunks', schema='petcare')
+    op.drop_index('ix_pet_document_chunks_document_chunk', table_name='pet_document_chunks', schema='petcare')
+    op.drop_index('ix_pet_document_chunks_pet_generation', table_name='pet_document_chunks', schema='petcare')
+    op.drop_table('pet_document_chunks', schema='petcare')
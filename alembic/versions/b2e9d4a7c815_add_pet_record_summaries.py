@@ -0,0 +1,38 @@
+"""add_pet_record_summaries
+
+Revision ID: b2e9d4a7c815
+Revises: a6c4e8f2b913
+Create Date: 2026-10-17 19:05:37.882140
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2e9d4a7c815'
+down_revision: Union[str, Sequence[str], None] = 'a6c4e8f2b913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Ficha clínica cacheada por mascota; vigente si summary_version = records_version
+    op.create_table('pet_record_summaries',
+        sa.Column('pet_id', postgresql.UUID(as_uuid=True),
+                  sa.ForeignKey('petcare.pets.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('records_version', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('summary_version', sa.Integer(), nullable=True),
+        sa.Column('summary', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        schema='petcare'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('pet_record_summaries', schema='petcare')
@@ -0,0 +1,50 @@
+"""add_pet_document_ingestions
+
+Revision ID: b7e2f4a91c53
+Revises: a3c9e1d47b20
+Create Date: 2026-10-17 11:40:05.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2f4a91c53'
+down_revision: Union[str, Sequence[str], None] = 'a3c9e1d47b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Estado de ingesta RAG por documento (pending, indexed, failed)
+    op.create_table('pet_document_ingestions',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('document_id', postgresql.UUID(as_uuid=True),
+                  sa.ForeignKey('petcare.pet_photos.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('pet_id', postgresql.UUID(as_uuid=True),
+                  sa.ForeignKey('petcare.pets.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('status', sa.String(), nullable=False, server_default='pending'),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('chunk_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('indexed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        schema='petcare'
+    )
+    op.create_index('ix_petcare_pet_document_ingestions_document_id', 'pet_document_ingestions',
+                    ['document_id'], unique=True, schema='petcare')
+    op.create_index('ix_petcare_pet_document_ingestions_pet_id', 'pet_document_ingestions',
+                    ['pet_id'], schema='petcare')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_petcare_pet_document_ingestions_pet_id', table_name='pet_document_ingestions', schema='petcare')
+    op.drop_index('ix_petcare_pet_document_ingestions_document_id', table_name='pet_document_ingestions', schema='petcare')
+    op.drop_table('pet_document_ingestions', schema='petcare')
@@ -0,0 +1,36 @@
+"""add_embedding_cache
+
+Revision ID: c4d8a2f7e619
+Revises: b7e2f4a91c53
+Create Date: 2026-10-17 13:05:47.220391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d8a2f7e619'
+down_revision: Union[str, Sequence[str], None] = 'b7e2f4a91c53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Caché de embeddings por (modelo, sha256 del texto del chunk)
+    op.create_table('embedding_cache',
+        sa.Column('model', sa.String(), primary_key=True),
+        sa.Column('content_hash', sa.String(length=64), primary_key=True),
+        sa.Column('embedding', postgresql.ARRAY(sa.Float()), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        schema='petcare'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('embedding_cache', schema='petcare')
@@ -0,0 +1,49 @@
+"""add_answer_cache
+
+Revision ID: c7f1a9e3d246
+Revises: b2e9d4a7c815
+Create Date: 2026-10-17 20:31:18.640519
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from pgvector.sqlalchemy import Vector
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7f1a9e3d246'
+down_revision: Union[str, Sequence[str], None] = 'b2e9d4a7c815'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Debe coincidir con RAG_EMBEDDING_DIMENSIONS
+EMBEDDING_DIMENSIONS = 1536
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Caché semántica de respuestas a preguntas generales del chat
+    op.create_table('answer_cache',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('scope', sa.String(), nullable=False),
+        sa.Column('question', sa.Text(), nullable=False),
+        sa.Column('embedding', Vector(EMBEDDING_DIMENSIONS), nullable=False),
+        sa.Column('answer', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        schema='petcare'
+    )
+    op.create_index('ix_answer_cache_scope_created', 'answer_cache', ['scope', 'created_at'], schema='petcare')
+    op.execute(
+        "CREATE INDEX ix_answer_cache_embedding_hnsw "
+        "ON petcare.answer_cache USING hnsw (embedding vector_cosine_ops)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_answer_cache_embedding_hnsw', table_name='answer_cache', schema='petcare')
+    op.drop_index('ix_answer_cache_scope_created', table_name='answer_cache', schema='petcare')
+    op.drop_table('answer_cache', schema='petcare')
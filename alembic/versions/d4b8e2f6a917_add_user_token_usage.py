@@ -0,0 +1,41 @@
+"""add_user_token_usage
+
+Revision ID: d4b8e2f6a917
+Revises: c7f1a9e3d246
+Create Date: 2026-10-17 22:04:51.318274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4b8e2f6a917'
+down_revision: Union[str, Sequence[str], None] = 'c7f1a9e3d246'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Contadores diarios de tokens del LLM por usuario (una fila por usuario y día)
+    op.create_table('user_token_usage',
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('petcare.users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('usage_date', sa.Date(), primary_key=True),
+        sa.Column('prompt_tokens', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('completion_tokens', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('requests', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        schema='petcare'
+    )
+    # Informe de administración por rango de fechas
+    op.create_index('ix_user_token_usage_date', 'user_token_usage', ['usage_date'], schema='petcare')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_token_usage_date', table_name='user_token_usage', schema='petcare')
+    op.drop_table('user_token_usage', schema='petcare')
@@ -0,0 +1,44 @@
+"""add_chat_session_messages
+
+Revision ID: d91f3b6c2a84
+Revises: c4d8a2f7e619
+Create Date: 2026-10-17 14:21:09.581734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd91f3b6c2a84'
+down_revision: Union[str, Sequence[str], None] = 'c4d8a2f7e619'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Mensajes de sesiones de chat compartidos entre workers (solo inserción)
+    op.create_table('chat_session_messages',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('session_id', sa.String(), nullable=False),
+        sa.Column('role', sa.String(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        schema='petcare'
+    )
+    op.create_index(
+        'ix_chat_session_messages_session_created',
+        'chat_session_messages',
+        ['session_id', 'created_at'],
+        schema='petcare'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_session_messages_session_created', table_name='chat_session_messages', schema='petcare')
+    op.drop_table('chat_session_messages', schema='petcare')
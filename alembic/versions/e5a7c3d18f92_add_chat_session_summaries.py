@@ -0,0 +1,34 @@
+"""add_chat_session_summaries
+
+Revision ID: e5a7c3d18f92
+Revises: d91f3b6c2a84
+Create Date: 2026-10-17 15:02:44.173208
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c3d18f92'
+down_revision: Union[str, Sequence[str], None] = 'd91f3b6c2a84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Resumen acumulado de turnos antiguos por sesión de chat
+    op.create_table('chat_session_summaries',
+        sa.Column('session_id', sa.String(), primary_key=True),
+        sa.Column('summary', sa.Text(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        schema='petcare'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('chat_session_summaries', schema='petcare')
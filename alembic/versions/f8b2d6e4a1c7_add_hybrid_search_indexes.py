@@ -0,0 +1,69 @@
+"""add_hybrid_search_indexes
+
+Revision ID: f8b2d6e4a1c7
+Revises: e5a7c3d18f92
+Create Date: 2026-10-17 16:21:09.514327
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f8b2d6e4a1c7'
+down_revision: Union[str, Sequence[str], None] = 'e5a7c3d18f92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Deben coincidir con RAG_EMBEDDING_DIMENSIONS y RAG_TEXT_SEARCH_CONFIG
+EMBEDDING_DIMENSIONS = 1536
+TEXT_SEARCH_CONFIG = 'spanish'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tablas de PGVector (langchain-community); se crean aquí si aún no existen
+    # para que los índices estén disponibles desde la primera ingesta
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS langchain_pg_collection (
+            name VARCHAR,
+            cmetadata JSON,
+            uuid UUID PRIMARY KEY
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS langchain_pg_embedding (
+            collection_id UUID REFERENCES langchain_pg_collection (uuid) ON DELETE CASCADE,
+            embedding VECTOR,
+            document VARCHAR,
+            cmetadata JSON,
+            custom_id VARCHAR,
+            uuid UUID PRIMARY KEY
+        )
+    """)
+    
+    # Filtro por colección (una por mascota)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_langchain_pg_embedding_collection_id "
+        "ON langchain_pg_embedding (collection_id)"
+    )
+    # Búsqueda vectorial aproximada; la columna no tiene dimensión fija, se indexa la expresión
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_langchain_pg_embedding_hnsw "
+        f"ON langchain_pg_embedding USING hnsw ((embedding::vector({EMBEDDING_DIMENSIONS})) vector_cosine_ops)"
+    )
+    # Búsqueda de texto completo sobre el contenido de los chunks
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_langchain_pg_embedding_document_fts "
+        f"ON langchain_pg_embedding USING gin (to_tsvector('{TEXT_SEARCH_CONFIG}'::regconfig, document))"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS ix_langchain_pg_embedding_document_fts")
+    op.execute("DROP INDEX IF EXISTS ix_langchain_pg_embedding_hnsw")
+    op.execute("DROP INDEX IF EXISTS ix_langchain_pg_embedding_collection_id")
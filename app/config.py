@@ -64,6 +64,14 @@ class Settings:
     OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
     OPENAI_EMBEDDING_MODEL: str = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
     OPENAI_TEMPERATURE: float = float(os.getenv("OPENAI_TEMPERATURE", "0.0"))
+    LLM_REQUEST_TIMEOUT_SECONDS: float = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "30"))  # Plazo de cada llamada al LLM
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "2"))  # Reintentos ante errores transitorios (timeouts, 429, 5xx)
+    LLM_BACKOFF_MAX_SECONDS: float = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8"))  # Espera máxima entre reintentos
+    LLM_HEDGE_ENABLED: bool = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"  # Segunda petición de la respuesta si la primera supera el p95
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "3"))  # Espera mínima antes de la segunda petición
+    LLM_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))  # Fallos transitorios seguidos que abren el circuit breaker
+    LLM_BREAKER_RESET_SECONDS: float = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))  # Tiempo abierto antes de probar de nuevo el proveedor
+    EMBEDDING_REQUEST_TIMEOUT_SECONDS: float = float(os.getenv("EMBEDDING_REQUEST_TIMEOUT_SECONDS", "20"))  # Plazo de cada petición de embeddings
     
     # LangSmith Configuration (opcional - para monitoreo)
     LANGSMITH_API_KEY: str = os.getenv("LANGSMITH_API_KEY", "")
@@ -74,8 +82,48 @@ class Settings:
     RAG_CHUNK_SIZE: int = int(os.getenv("RAG_CHUNK_SIZE", "1000"))
     RAG_CHUNK_OVERLAP: int = int(os.getenv("RAG_CHUNK_OVERLAP", "200"))
     RAG_TOP_K_RESULTS: int = int(os.getenv("RAG_TOP_K_RESULTS", "4"))
+    RAG_PDF_DOWNLOAD_CONCURRENCY: int = int(os.getenv("RAG_PDF_DOWNLOAD_CONCURRENCY", "4"))  # Descargas simultáneas de PDFs por lote
+    RAG_PDF_PARSER_PROCESSES: int = int(os.getenv("RAG_PDF_PARSER_PROCESSES", "0"))  # Procesos para extraer texto de PDFs (0 = núcleos de CPU, 1 = sin procesos)
+    RAG_PDF_PAGES_PER_TASK: int = int(os.getenv("RAG_PDF_PAGES_PER_TASK", "16"))  # Páginas por tarea de extracción
+    RAG_INGESTION_WORKERS: int = int(os.getenv("RAG_INGESTION_WORKERS", "2"))  # Hilos para ingesta de documentos en segundo plano
+    RAG_CONTEXT_TOKEN_BUDGET: int = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "2000"))  # Tokens máximos de documentos recuperados en el prompt
+    RAG_HYBRID_SEARCH: bool = os.getenv("RAG_HYBRID_SEARCH", "true").lower() == "true"  # Combinar búsqueda vectorial y de texto completo (RRF)
+    RAG_HYBRID_CANDIDATES: int = int(os.getenv("RAG_HYBRID_CANDIDATES", "20"))  # Candidatos de cada búsqueda antes de fusionar
+    RAG_RRF_K: int = int(os.getenv("RAG_RRF_K", "60"))  # Constante k de reciprocal rank fusion
+    RAG_EMBEDDING_DIMENSIONS: int = int(os.getenv("RAG_EMBEDDING_DIMENSIONS", "1536"))  # Dimensión del índice HNSW (debe coincidir con la migración)
+    RAG_TEXT_SEARCH_CONFIG: str = os.getenv("RAG_TEXT_SEARCH_CONFIG", "spanish")  # Configuración de texto completo de PostgreSQL (debe coincidir con la migración)
+    RAG_HNSW_EF_SEARCH: int = int(os.getenv("RAG_HNSW_EF_SEARCH", "100"))  # Candidatos que explora el índice HNSW por consulta
+    RAG_CONDENSE_MODE: str = os.getenv("RAG_CONDENSE_MODE", "auto")  # auto (omite reformular preguntas autocontenidas) | always
+    RAG_RETRIEVAL_CACHE_SIZE: int = int(os.getenv("RAG_RETRIEVAL_CACHE_SIZE", "512"))  # Recuperaciones cacheadas por (mascota, pregunta); 0 desactiva
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"  # Reutilizar embeddings de chunks ya calculados
+    EMBEDDING_BATCH_MAX_TOKENS: int = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "60000"))  # Tokens máximos por petición de embeddings
+    EMBEDDING_BATCH_MAX_INPUTS: int = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "512"))  # Chunks máximos por petición de embeddings
+    EMBEDDING_MAX_CONCURRENCY: int = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))  # Peticiones de embeddings simultáneas (se reduce sola ante 429)
+    EMBEDDING_MAX_RETRIES: int = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))  # Reintentos ante errores transitorios (429, timeouts, 5xx)
+    EMBEDDING_BACKOFF_MAX_SECONDS: float = float(os.getenv("EMBEDDING_BACKOFF_MAX_SECONDS", "30"))  # Espera máxima entre reintentos
+    ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"  # Reutilizar respuestas de preguntas generales casi idénticas
+    ANSWER_CACHE_SIMILARITY: float = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))  # Similitud coseno mínima para reutilizar una respuesta
+    ANSWER_CACHE_TTL_HOURS: int = int(os.getenv("ANSWER_CACHE_TTL_HOURS", "168"))  # Vigencia de las respuestas cacheadas
     
     # Chat Memory Configuration
     CHAT_MEMORY_MAX_MESSAGES: int = int(os.getenv("CHAT_MEMORY_MAX_MESSAGES", "10"))  # Máximo de mensajes a recordar
+    CHAT_MEMORY_MODE: str = os.getenv("CHAT_MEMORY_MODE", "window")  # window | summary (resume en segundo plano los turnos antiguos)
+    CHAT_SUMMARY_MAX_WORDS: int = int(os.getenv("CHAT_SUMMARY_MAX_WORDS", "200"))  # Longitud máxima del resumen acumulado
+    CHAT_SUMMARY_WORKERS: int = int(os.getenv("CHAT_SUMMARY_WORKERS", "2"))  # Hilos para generar resúmenes
+    CHAT_PROMPT_TOKEN_BUDGET: int = int(os.getenv("CHAT_PROMPT_TOKEN_BUDGET", "6000"))  # Tokens del prompt: sistema + documentos + historial + pregunta
+    CHAT_DAILY_TOKEN_BUDGET: int = int(os.getenv("CHAT_DAILY_TOKEN_BUDGET", "0"))  # Tokens del LLM por usuario y día (0 = sin límite)
+    CHAT_TOKEN_USAGE_FLUSH_SECONDS: int = int(os.getenv("CHAT_TOKEN_USAGE_FLUSH_SECONDS", "10"))  # Cada cuánto se guardan los contadores de tokens
+    CHAT_MAX_CONCURRENT_REQUESTS: int = int(os.getenv("CHAT_MAX_CONCURRENT_REQUESTS", "8"))  # Preguntas atendidas a la vez por worker (0 = sin límite)
+    CHAT_MAX_QUEUED_PER_USER: int = int(os.getenv("CHAT_MAX_QUEUED_PER_USER", "2"))  # Preguntas en espera por usuario antes de responder 429
+    CHAT_ADMISSION_TIMEOUT_SECONDS: float = float(os.getenv("CHAT_ADMISSION_TIMEOUT_SECONDS", "10"))  # Espera máxima en cola antes de responder 503
+    CHAT_DEBUG_TIMINGS: bool = os.getenv("CHAT_DEBUG_TIMINGS", "false").lower() == "true"  # Incluir los tiempos por etapa (`timings`) en cada respuesta
+    PET_RECORD_SUMMARY_ENABLED: bool = os.getenv("PET_RECORD_SUMMARY_ENABLED", "true").lower() == "true"  # Incluir la ficha clínica de la mascota en el prompt
+    PET_RECORD_SUMMARY_MAX_ITEMS: int = int(os.getenv("PET_RECORD_SUMMARY_MAX_ITEMS", "5"))  # Registros por sección de la ficha (vacunas, visitas...)
+    CHAT_SESSION_MAX_COUNT: int = int(os.getenv("CHAT_SESSION_MAX_COUNT", "1000"))  # Máximo de sesiones en memoria por proceso
+    CHAT_SESSION_MAX_BYTES: int = int(os.getenv("CHAT_SESSION_MAX_BYTES", str(50 * 1024 * 1024)))  # Tamaño estimado máximo de todas las sesiones
+    CHAT_SESSION_TTL_MINUTES: int = int(os.getenv("CHAT_SESSION_TTL_MINUTES", "60"))  # Minutos de inactividad antes de expirar una sesión
+    CHAT_SESSION_HISTORY_LIMIT: int = int(os.getenv("CHAT_SESSION_HISTORY_LIMIT", "50"))  # Mensajes guardados por sesión (memory/redis)
+    CHAT_SESSION_BACKEND: str = os.getenv("CHAT_SESSION_BACKEND", "memory")  # memory | postgres | redis (compartido entre workers)
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
 settings = Settings()
\ No newline at end of file
@@ -2,102 +2,134 @@
 Controlador para chat con IA veterinaria
 Maneja sesiones, memoria conversacional con límite de 6 interacciones
 """
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncIterator, Callable, Tuple
 from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
 from app.models import User, Pet
-from app.services.langchain_service import LangChainService
+from app.services.langchain_service import get_langchain_service
+from app.services.chat_session_store import chat_session_store
+from app.services.conversation_summary_service import conversation_summary_service
+from app.services.pet_record_summary_service import pet_record_summary_service
+from app.services.answer_cache import answer_cache
+from app.services.retrieval_cache import retrieval_cache
+from app.services.chat_metrics import chat_metrics
+from app.services.token_metering import token_meter
+from app.services.chat_admission import chat_admission
+from app.services.llm_resilience import llm_breaker
+from app.utils.exceptions import AIProviderUnavailableException
+from app.config import settings
 from app.controllers.pets import PetController
 from langchain.memory import ConversationBufferMemory
 from langchain_core.messages import HumanMessage, AIMessage
+import json
 
 
 class ChatController:
     """Controlador para chat veterinario con IA y memoria limitada"""
     
-    # Almacenar memorias por sesión (en producción usar Redis)
-    _conversation_memories: Dict[str, ConversationBufferMemory] = {}
+    # Mensajes por sesión: almacén configurable (memoria del proceso, Postgres o Redis)
+    _session_store = chat_session_store
     
     # Configuración de límites de memoria
     MAX_INTERACTIONS = 6  # Máximo 6 interacciones (pregunta-respuesta)
     MAX_MESSAGES = MAX_INTERACTIONS * 2  # 12 mensajes totales (6 usuario + 6 asistente)
     
+    # Modo "summary": los turnos que salen de la ventana se resumen en segundo plano
+    SUMMARY_MODE = settings.CHAT_MEMORY_MODE.lower() == "summary"
+    
     @staticmethod
     def get_pet_by_id(db: Session, pet_id: str, current_user: User) -> Pet:
         """Verifica que mascota existe y pertenece al usuario"""
         return PetController.get_pet_by_id(db, pet_id, current_user)
     
     @staticmethod
-    def ask_question_about_pet(
+    def _prepare_conversation(
         db: Session,
         pet_id: str,
-        question: str,
         current_user: User,
         session_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
-        Hace pregunta sobre mascota usando IA veterinaria con memoria limitada
+        Prepara todo lo necesario para responder una pregunta (sin llamar al LLM)
+        
+        Verifica la mascota, obtiene su ficha clínica cacheada, abre el índice
+        vectorial si está listo y carga los últimos mensajes de la sesión en
+        una memoria para este turno. Todo el acceso a la base de datos de la
+        petición ocurre aquí, antes de generar la respuesta.
         
-        Args:
-            db: Sesión de base de datos
-            pet_id: ID de la mascota
-            question: Pregunta del usuario
-            current_user: Usuario actual
-            session_id: ID de sesión para contexto (opcional)
-            
         Returns:
-            Dict con respuesta, historial y metadata
+            Dict con langchain_service, vector_store, use_documents,
+            has_documents, pet_record, session_id, memory, summary,
+            loaded_messages y last_loaded_message
         """
         # Verificar mascota
         pet = ChatController.get_pet_by_id(db, pet_id, current_user)
         
-        # Inicializar servicio
-        langchain_service = LangChainService()
-        
-        # Obtener documentos
-        pdf_urls = langchain_service.get_pet_documents_from_db(db, pet_id)
-        has_documents = len(pdf_urls) > 0
-        
-        # Crear vector store solo si hay documentos
-        vector_store = None
-        use_documents = False
+        # Servicio compartido del proceso (clientes y pools ya inicializados)
+        langchain_service = get_langchain_service()
         
-        if pdf_urls:
+        # Ficha clínica (vacunas, visitas, nutrición...) sin búsqueda vectorial
+        pet_record = None
+        if settings.PET_RECORD_SUMMARY_ENABLED:
             try:
-                print(f"📄 Intentando procesar {len(pdf_urls)} documento(s)...")
-                for i, url in enumerate(pdf_urls, 1):
-                    print(f"   {i}. {url}")
-                
-                vector_store = langchain_service.create_vector_store(
-                    pdf_urls=pdf_urls,
-                    pet_id=pet_id
-                )
-                use_documents = True
-                print(f"✅ RAG activado con {len(pdf_urls)} documentos")
+                pet_record = pet_record_summary_service.get_summary(pet.id)
             except Exception as e:
-                print(f"❌ Error procesando documentos: {str(e)}")
-                import traceback
-                print(f"Traceback completo:")
-                traceback.print_exc()
-                use_documents = False
-                # Continuar sin documentos pero informar al usuario
-        else:
-            print(f"💬 Sin documentos - modo veterinario experto")
+                print(f"⚠️ Error obteniendo ficha clínica: {str(e)}")
+        
+        # Obtener índice vectorial ya construido por el pipeline de ingesta
+        with chat_metrics.span("document_lookup") as span:
+            document_records = langchain_service.get_pet_document_records(db, pet_id)
+            has_documents = len(document_records) > 0
+            span["documents"] = len(document_records)
+            
+            vector_store = None
+            use_documents = False
+            
+            if has_documents:
+                try:
+                    print(f"📄 Mascota con {len(document_records)} documento(s)")
+                    vector_store = langchain_service.get_ready_vector_store(
+                        db, pet_id, documents=document_records
+                    )
+                    use_documents = vector_store is not None
+                    if use_documents:
+                        print(f"✅ RAG activado con {len(document_records)} documentos")
+                    else:
+                        print(f"⏳ Documentos en proceso de indexación - modo veterinario experto")
+                except Exception as e:
+                    print(f"❌ Error abriendo índice de documentos: {str(e)}")
+                    import traceback
+                    print(f"Traceback completo:")
+                    traceback.print_exc()
+                    db.rollback()
+                    use_documents = False
+                    # Continuar sin documentos pero informar al usuario
+            else:
+                print(f"💬 Sin documentos - modo veterinario experto")
         
         # Obtener o crear memoria conversacional
         if not session_id:
             session_id = f"{current_user.id}_{pet_id}"
         
-        # Crear memoria si no existe
-        if session_id not in ChatController._conversation_memories:
-            memory = ConversationBufferMemory(
-                return_messages=True,
-                memory_key="chat_history",
-                output_key="answer"
+        # Cargar los últimos mensajes (y el resumen en modo summary) en una sola lectura
+        summary = None
+        if ChatController.SUMMARY_MODE:
+            stored_messages, summary = ChatController._session_store.load_conversation(
+                session_id, ChatController.MAX_MESSAGES
             )
-            ChatController._conversation_memories[session_id] = memory
+        else:
+            stored_messages = ChatController._session_store.load_messages(
+                session_id, ChatController.MAX_MESSAGES
+            )
+        memory = ConversationBufferMemory(
+            return_messages=True,
+            memory_key="chat_history",
+            output_key="answer"
+        )
+        if stored_messages is None:
             print(f"🆕 Nueva sesión creada: {session_id}")
         else:
-            memory = ChatController._conversation_memories[session_id]
+            memory.chat_memory.messages = stored_messages
             print(f"📚 Sesión existente: {session_id}")
         
         # Limitar mensajes en memoria ANTES de hacer la pregunta
@@ -108,67 +140,269 @@ class ChatController:
         interactions_before = history_before // 2
         print(f"📊 Memoria antes: {interactions_before} interacciones ({history_before} mensajes)")
         
-        # Hacer pregunta
-        try:
-            result = langchain_service.ask_question(
-                question=question,
-                vector_store=vector_store,
-                memory=memory,
-                use_documents=use_documents
-            )
-            
-            # Limitar mensajes DESPUÉS de la pregunta también
-            ChatController._limit_memory_messages(memory)
-            
-            # Log historial después de pregunta
-            history_after = ChatController._get_memory_message_count(memory)
-            interactions_after = history_after // 2
-            print(f"📊 Memoria después: {interactions_after} interacciones ({history_after} mensajes)")
-            
-            # Información de memoria para el usuario
-            memory_info = {
-                "current_messages": history_after,
-                "max_messages": ChatController.MAX_MESSAGES,
-                "interactions_count": interactions_after,
-                "max_interactions": ChatController.MAX_INTERACTIONS
-            }
-            
-            # Asegurar campos completos
-            return {
-                "answer": result.get("answer", "No se pudo generar respuesta."),
-                "source_documents": result.get("source_documents", []),
-                "chat_history": result.get("chat_history", []),
-                "has_documents": has_documents,
-                "session_id": session_id,
-                "memory_info": memory_info,
-                "error": result.get("error")
-            }
+        return {
+            "langchain_service": langchain_service,
+            "vector_store": vector_store,
+            "use_documents": use_documents,
+            "has_documents": has_documents,
+            "pet_record": pet_record,
+            "session_id": session_id,
+            "memory": memory,
+            "summary": summary,
+            "loaded_messages": list(memory.chat_memory.messages),
+            # El recorte por tokens elimina mensajes del inicio; los nuevos del
+            # turno se identifican por posición respecto al último cargado
+            "last_loaded_message": memory.chat_memory.messages[-1] if memory.chat_memory.messages else None
+        }
+    
+    @staticmethod
+    def _save_turn(context: Dict[str, Any]):
+        """Añade al almacén de sesiones los mensajes nuevos de este turno (y encola su resumen)"""
+        messages = context["memory"].chat_memory.messages
+        last_loaded = context["last_loaded_message"]
+        
+        start = 0
+        for position in range(len(messages) - 1, -1, -1):
+            if messages[position] is last_loaded:
+                start = position + 1
+                break
+        
+        new_messages = messages[start:]
+        if new_messages:
+            ChatController._session_store.append_messages(context["session_id"], new_messages)
+        
+        # Mensajes que la próxima lectura ya no cargará: se incorporan al resumen
+        if ChatController.SUMMARY_MODE:
+            loaded_messages = context["loaded_messages"]
+            overflow = len(loaded_messages) + len(new_messages) - ChatController.MAX_MESSAGES
+            if overflow > 0:
+                conversation_summary_service.enqueue_fold(
+                    context["session_id"], loaded_messages[:overflow]
+                )
+    
+    @staticmethod
+    def _build_memory_info(memory: ConversationBufferMemory) -> Dict[str, Any]:
+        """Limita la memoria tras la respuesta y devuelve su estado para el usuario"""
+        # Limitar mensajes DESPUÉS de la pregunta también
+        ChatController._limit_memory_messages(memory)
+        
+        # Log historial después de pregunta
+        history_after = ChatController._get_memory_message_count(memory)
+        interactions_after = history_after // 2
+        print(f"📊 Memoria después: {interactions_after} interacciones ({history_after} mensajes)")
+        
+        return {
+            "current_messages": history_after,
+            "max_messages": ChatController.MAX_MESSAGES,
+            "interactions_count": interactions_after,
+            "max_interactions": ChatController.MAX_INTERACTIONS
+        }
+    
+    @staticmethod
+    async def ask_question_about_pet(
+        db: Session,
+        pet_id: str,
+        question: str,
+        current_user: User,
+        session_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Hace pregunta sobre mascota usando IA veterinaria con memoria limitada
+        
+        Es asíncrono: la preparación (consultas a BD y apertura del índice) se
+        ejecuta en el threadpool y la llamada al LLM usa el cliente asíncrono,
+        de modo que un turno lento no bloquea el event loop del worker.
+        
+        Args:
+            db: Sesión de base de datos
+            pet_id: ID de la mascota
+            question: Pregunta del usuario
+            current_user: Usuario actual
+            session_id: ID de sesión para contexto (opcional)
             
-        except Exception as e:
-            print(f"❌ Error en pregunta: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        Returns:
+            Dict con respuesta, historial y metadata (y `timings` si CHAT_DEBUG_TIMINGS)
+        """
+        # Sin tokens disponibles hoy no se prepara nada ni se llama al modelo
+        await run_in_threadpool(token_meter.ensure_within_budget, current_user.id)
+        # Con el proveedor caído (breaker abierto) se falla antes de encolar
+        llm_breaker.check()
+        trace = chat_metrics.start_trace() if settings.CHAT_DEBUG_TIMINGS else None
+        # Hueco en el worker (cola justa por usuario); se libera al terminar el turno
+        async with chat_admission.admit(current_user.id):
+            # Solo cuentan las peticiones admitidas
+            usage = token_meter.begin_request(current_user.id)
+            context = await run_in_threadpool(
+                ChatController._prepare_conversation, db, pet_id, current_user, session_id
+            )
+            langchain_service = context["langchain_service"]
+            has_documents = context["has_documents"]
+            session_id = context["session_id"]
+            memory = context["memory"]
             
-            return {
-                "answer": f"Lo siento, ocurrió un error: {str(e)}",
-                "source_documents": [],
-                "chat_history": [],
-                "has_documents": has_documents,
-                "session_id": session_id,
-                "memory_info": {
-                    "current_messages": 0,
-                    "max_messages": ChatController.MAX_MESSAGES,
-                    "interactions_count": 0,
-                    "max_interactions": ChatController.MAX_INTERACTIONS
-                },
-                "error": str(e)
-            }
+            # Hacer pregunta
+            try:
+                result = await langchain_service.aask_question(
+                    question=question,
+                    vector_store=context["vector_store"],
+                    memory=memory,
+                    use_documents=context["use_documents"],
+                    summary=context["summary"],
+                    pet_record=context["pet_record"]
+                )
+                
+                # Guardar el turno en el almacén de sesiones
+                await run_in_threadpool(ChatController._save_turn, context)
+                ChatController._log_token_usage(usage)
+                
+                # Información de memoria para el usuario
+                memory_info = ChatController._build_memory_info(memory)
+                
+                # Asegurar campos completos
+                return {
+                    "answer": result.get("answer", "No se pudo generar respuesta."),
+                    "source_documents": result.get("source_documents", []),
+                    "chat_history": result.get("chat_history", []),
+                    "has_documents": has_documents,
+                    "session_id": session_id,
+                    "memory_info": memory_info,
+                    "timings": trace,
+                    "error": result.get("error")
+                }
+                
+            except AIProviderUnavailableException:
+                raise
+            except Exception as e:
+                print(f"❌ Error en pregunta: {str(e)}")
+                import traceback
+                traceback.print_exc()
+                
+                return {
+                    "answer": f"Lo siento, ocurrió un error: {str(e)}",
+                    "source_documents": [],
+                    "chat_history": [],
+                    "has_documents": has_documents,
+                    "session_id": session_id,
+                    "memory_info": {
+                        "current_messages": 0,
+                        "max_messages": ChatController.MAX_MESSAGES,
+                        "interactions_count": 0,
+                        "max_interactions": ChatController.MAX_INTERACTIONS
+                    },
+                    "timings": trace,
+                    "error": str(e)
+                }
+    
+    @staticmethod
+    async def stream_question_about_pet(
+        db: Session,
+        pet_id: str,
+        question: str,
+        current_user: User,
+        session_id: Optional[str] = None
+    ) -> Tuple[AsyncIterator[str], Callable[[], None]]:
+        """
+        Versión en streaming (Server-Sent Events) de ask_question_about_pet
+        
+        La preparación (verificación de mascota, índice y memoria) se hace de
+        inmediato, así los errores de validación se lanzan antes de abrir el
+        stream. El generador devuelto emite:
+        - `token`: fragmentos de la respuesta según llegan del LLM
+        - `done`: documentos fuente, historial y `memory_info` al completar
+        - `error`: si la generación falla (la memoria no se modifica)
+        
+        Returns:
+            Generador de eventos SSE ya formateados y la función que libera el
+            hueco de admisión (idempotente; hay que llamarla al terminar de
+            enviar la respuesta, se haya consumido o no el generador)
+        """
+        # Sin tokens disponibles hoy no se prepara nada ni se llama al modelo
+        await run_in_threadpool(token_meter.ensure_within_budget, current_user.id)
+        # Con el proveedor caído (breaker abierto) se falla antes de encolar
+        llm_breaker.check()
+        trace = chat_metrics.start_trace() if settings.CHAT_DEBUG_TIMINGS else None
+        # El hueco se mantiene hasta que termina el stream
+        ticket = await chat_admission.acquire(current_user.id)
+        try:
+            # Solo cuentan las peticiones admitidas
+            usage = token_meter.begin_request(current_user.id)
+            context = await run_in_threadpool(
+                ChatController._prepare_conversation, db, pet_id, current_user, session_id
+            )
+        except BaseException:
+            chat_admission.release(ticket)
+            raise
+        
+        async def event_stream() -> AsyncIterator[str]:
+            # El stream se consume en otra tarea: se continúa la misma traza
+            chat_metrics.resume_trace(trace)
+            token_meter.resume(usage)
+            memory = context["memory"]
+            try:
+                async for event in context["langchain_service"].astream_question(
+                    question=question,
+                    vector_store=context["vector_store"],
+                    memory=memory,
+                    use_documents=context["use_documents"],
+                    summary=context["summary"],
+                    pet_record=context["pet_record"]
+                ):
+                    if event["type"] == "token":
+                        yield ChatController._format_sse("token", {"content": event["content"]})
+                    elif event["type"] == "end":
+                        # La memoria ya se actualizó al completar la respuesta
+                        await run_in_threadpool(ChatController._save_turn, context)
+                        ChatController._log_token_usage(usage)
+                        yield ChatController._format_sse("done", {
+                            "answer": event["answer"],
+                            "source_documents": event["source_documents"],
+                            "chat_history": event["chat_history"],
+                            "has_documents": context["has_documents"],
+                            "session_id": context["session_id"],
+                            "memory_info": ChatController._build_memory_info(memory),
+                            "timings": trace,
+                            "error": None
+                        })
+            except AIProviderUnavailableException as e:
+                yield ChatController._format_sse("error", {
+                    "message": e.detail,
+                    "session_id": context["session_id"],
+                    "error": "provider_unavailable"
+                })
+            except Exception as e:
+                print(f"❌ Error en streaming: {str(e)}")
+                import traceback
+                traceback.print_exc()
+                yield ChatController._format_sse("error", {
+                    "message": "Lo siento, ocurrió un error al procesar tu pregunta. Por favor, inténtalo nuevamente.",
+                    "session_id": context["session_id"],
+                    "error": str(e)
+                })
+            finally:
+                chat_admission.release(ticket)
+        
+        # El generador puede no llegar a ejecutarse (cliente desconectado antes
+        # del cuerpo): quien envía la respuesta libera también el hueco
+        return event_stream(), lambda: chat_admission.release(ticket)
+    
+    @staticmethod
+    def _log_token_usage(usage):
+        """Muestra los tokens del LLM consumidos en el turno"""
+        if usage.calls:
+            print(
+                f"🔢 Tokens del turno: {usage.prompt_tokens} prompt + {usage.completion_tokens} respuesta "
+                f"({usage.calls} llamadas al LLM)"
+            )
+    
+    @staticmethod
+    def _format_sse(event: str, data: Dict[str, Any]) -> str:
+        """Formatea un evento Server-Sent Events"""
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
     
     @staticmethod
     def clear_conversation(session_id: str) -> bool:
         """Limpia memoria de una conversación"""
-        if session_id in ChatController._conversation_memories:
-            del ChatController._conversation_memories[session_id]
+        if ChatController._session_store.delete(session_id):
             print(f"🗑️ Sesión eliminada: {session_id}")
             return True
         return False
@@ -177,32 +411,23 @@ class ChatController:
     def _limit_memory_messages(memory: ConversationBufferMemory):
         """
         Limita mensajes en memoria a MAX_MESSAGES (12 = 6 interacciones)
-        Mantiene solo los mensajes más recientes
+        Mantiene solo los mensajes más recientes, recortando la lista en el sitio.
+        El tamaño del prompt se acota además por tokens al preguntar
+        (ver LangChainService._fit_history_to_budget).
         """
         try:
-            # Cargar mensajes actuales
-            memory_vars = memory.load_memory_variables({})
-            messages = memory_vars.get('chat_history', [])
-            
-            if not messages:
-                return
-            
+            messages = memory.chat_memory.messages
             current_count = len(messages)
             
             # Si excede el límite, mantener solo los últimos MAX_MESSAGES
             if current_count > ChatController.MAX_MESSAGES:
-                messages_to_keep = messages[-ChatController.MAX_MESSAGES:]
                 interactions_removed = (current_count - ChatController.MAX_MESSAGES) // 2
                 
                 print(f"✂️ Limitando memoria: {current_count} -> {ChatController.MAX_MESSAGES} mensajes")
                 print(f"   Removidas {interactions_removed} interacciones antiguas")
                 
-                # Limpiar y restaurar solo los mensajes recientes
-                if hasattr(memory, 'chat_memory'):
-                    memory.chat_memory.clear()
-                    for msg in messages_to_keep:
-                        memory.chat_memory.add_message(msg)
-                        
+                del messages[:current_count - ChatController.MAX_MESSAGES]
+                
         except Exception as e:
             print(f"⚠️ Error limitando memoria: {str(e)}")
     
@@ -219,14 +444,12 @@ class ChatController:
     @staticmethod
     def get_conversation_history(session_id: str) -> List[Dict[str, str]]:
         """Obtiene historial de conversación de una sesión"""
-        if session_id not in ChatController._conversation_memories:
-            return []
-        
-        memory = ChatController._conversation_memories[session_id]
-        
         try:
-            memory_vars = memory.load_memory_variables({})
-            messages = memory_vars.get('chat_history', [])
+            messages = ChatController._session_store.load_messages(
+                session_id, ChatController.MAX_MESSAGES
+            )
+            if messages is None:
+                return []
             
             history = []
             for msg in messages:
@@ -244,16 +467,74 @@ class ChatController:
     @staticmethod
     def get_active_sessions() -> List[str]:
         """Obtiene lista de sesiones activas"""
-        return list(ChatController._conversation_memories.keys())
+        return ChatController._session_store.session_ids()
+    
+    @staticmethod
+    def get_metrics(current_user: User) -> Dict[str, Any]:
+        """Tiempos por etapa y estado de las cachés del chat en este proceso (solo administradores)"""
+        if current_user.role != "admin":
+            from app.utils.exceptions import InsufficientPermissionsException
+            raise InsufficientPermissionsException()
+        
+        try:
+            embeddings = get_langchain_service().embedding_stats()
+            llm = get_langchain_service().resilience_stats()
+            speculation = get_langchain_service().speculation_stats()
+        except Exception as e:
+            embeddings = llm = speculation = {"error": str(e)}
+        
+        return {
+            "stages": chat_metrics.stats(),
+            "embeddings": embeddings,
+            "llm": llm,
+            "speculative_retrieval": speculation,
+            "answer_cache": answer_cache.stats(),
+            "retrieval_cache": retrieval_cache.stats(),
+            "pet_record_summary": pet_record_summary_service.stats(),
+            "token_usage": token_meter.stats(),
+            "admission": chat_admission.stats(),
+            "sessions": ChatController._session_store.stats()
+        }
+    
+    @staticmethod
+    def get_token_usage_report(
+        db: Session,
+        current_user: User,
+        days: int = 7,
+        limit: int = 50
+    ) -> Dict[str, Any]:
+        """
+        Informe de consumo de tokens del LLM por usuario (solo administradores)
+        
+        Args:
+            db: Sesión de base de datos
+            current_user: Usuario actual
+            days: Días incluidos, contando hoy
+            limit: Número máximo de usuarios (los de mayor consumo)
+            
+        Returns:
+            Dict con el límite diario y el consumo por usuario
+        """
+        if current_user.role != "admin":
+            from app.utils.exceptions import InsufficientPermissionsException
+            raise InsufficientPermissionsException()
+        
+        return {
+            "days": days,
+            "daily_budget": token_meter.daily_budget,
+            "users": token_meter.report(db, days, limit)
+        }
     
     @staticmethod
     def get_session_stats(session_id: str) -> Optional[Dict[str, Any]]:
         """Obtiene estadísticas de una sesión"""
-        if session_id not in ChatController._conversation_memories:
+        messages = ChatController._session_store.load_messages(
+            session_id, ChatController.MAX_MESSAGES
+        )
+        if messages is None:
             return None
         
-        memory = ChatController._conversation_memories[session_id]
-        message_count = ChatController._get_memory_message_count(memory)
+        message_count = len(messages)
         interactions_count = message_count // 2
         
         return {
@@ -262,5 +543,8 @@ class ChatController:
             "max_messages": ChatController.MAX_MESSAGES,
             "interactions_count": interactions_count,
             "max_interactions": ChatController.MAX_INTERACTIONS,
-            "memory_usage": f"{interactions_count}/{ChatController.MAX_INTERACTIONS} interacciones ({message_count}/{ChatController.MAX_MESSAGES} mensajes)"
+            "memory_usage": f"{interactions_count}/{ChatController.MAX_INTERACTIONS} interacciones ({message_count}/{ChatController.MAX_MESSAGES} mensajes)",
+            "store": ChatController._session_store.stats(),
+            "answer_cache": answer_cache.stats(),
+            "retrieval_cache": retrieval_cache.stats()
         }
\ No newline at end of file
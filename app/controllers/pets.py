@@ -4,9 +4,10 @@ from datetime import datetime
 from typing import List, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, or_, func
-from app.models import Pet, User, AuditLog, PetPhoto, Vaccination, Deworming, VetVisit, NutritionPlan, Meal, Reminder, Notification
+from app.models import Pet, User, AuditLog, PetPhoto, PetDocumentIngestion, Vaccination, Deworming, VetVisit, NutritionPlan, Meal, Reminder, Notification
 from app.schemas.pets import PetCreate, PetUpdate
 from app.services.s3_service import s3_service
+from app.services.document_ingestion_service import document_ingestion_service
 from fastapi import HTTPException, status
 import mimetypes
 
@@ -116,6 +117,7 @@ class PetController:
         - Comidas
         - Recordatorios asociados
         - Notificaciones asociadas
+        - Embeddings de sus documentos (chat con IA)
         
         También elimina las fotos físicas de S3 antes de eliminar la mascota.
         """
@@ -461,10 +463,16 @@ class PetController:
         if s3_key:
             s3_success = s3_service.delete_image(s3_key)
         
+        is_document = pet_photo.file_type == "document"
+        
         # Eliminar registro de la base de datos
         db.delete(pet_photo)
         db.commit()
         
+        # Eliminar solo los embeddings de este documento en segundo plano
+        if is_document:
+            document_ingestion_service.enqueue_removal(str(pet.id), str(photo_id))
+        
         # Log de auditoría
         audit = AuditLog(
             actor_user_id=current_user.id,
@@ -496,6 +504,9 @@ class PetController:
             PetPhoto.pet_id == pet.id
         ).order_by(desc(PetPhoto.created_at)).all()
         
+        # Estado de ingesta RAG de los documentos
+        index_statuses = PetController.get_document_index_statuses(db, pet.id)
+        
         # Convertir a formato de respuesta
         photos_list = []
         for photo in pet_photos:
@@ -520,7 +531,9 @@ class PetController:
                 "is_profile": photo.is_profile,  # ✅ Indicar si es foto de perfil
                 "file_type": photo.file_type or "image",  # ✅ Tipo de archivo
                 "document_category": photo.document_category,  # ✅ Categoría del documento (si aplica)
-                "description": photo.description  # ✅ Descripción del documento (si aplica)
+                "description": photo.description,  # ✅ Descripción del documento (si aplica)
+                "index_status": index_statuses.get(str(photo.id), {}).get("status"),
+                "index_error": index_statuses.get(str(photo.id), {}).get("error")
             })
         
         return photos_list
@@ -585,6 +598,14 @@ class PetController:
             description=description
         )
         db.add(pet_photo)
+        db.flush()
+        
+        # Registrar la ingesta RAG como pendiente (se procesa en segundo plano)
+        db.add(PetDocumentIngestion(
+            document_id=pet_photo.id,
+            pet_id=pet.id,
+            status=document_ingestion_service.STATUS_PENDING
+        ))
         db.commit()
         db.refresh(pet_photo)
         
@@ -604,10 +625,34 @@ class PetController:
         db.add(audit)
         db.commit()
         
+        # Extraer texto y calcular embeddings fuera de la petición
+        document_ingestion_service.enqueue_ingestion(str(pet_photo.id))
+        
         # Retornar información incluyendo el ID del registro
         return {
             **result,
             "photo_id": str(pet_photo.id),
             "file_type": "document",
-            "document_category": document_category
+            "document_category": document_category,
+            "index_status": document_ingestion_service.STATUS_PENDING
+        }
+    
+    @staticmethod
+    def get_document_index_statuses(db: Session, pet_id) -> dict:
+        """
+        Obtiene el estado de ingesta RAG de los documentos de una mascota
+        
+        Returns:
+            Dict {document_id: {"status": "pending|indexed|failed", "error": str|None}}
+        """
+        ingestions = db.query(PetDocumentIngestion).filter(
+            PetDocumentIngestion.pet_id == pet_id
+        ).all()
+        
+        return {
+            str(ingestion.document_id): {
+                "status": ingestion.status,
+                "error": ingestion.error
+            }
+            for ingestion in ingestions
         }
\ No newline at end of file
@@ -108,4 +108,10 @@ async def startup_event():
 # Evento de cierre
 @app.on_event("shutdown")
 async def shutdown_event():
+    from app.services.document_ingestion_service import document_ingestion_service
+    from app.services.conversation_summary_service import conversation_summary_service
+    from app.services.pdf_extraction import pdf_extraction_pool
+    document_ingestion_service.shutdown()
+    conversation_summary_service.shutdown()
+    pdf_extraction_pool.shutdown()
     print("👋 Pet HealthCare API detenida")
\ No newline at end of file
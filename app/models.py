@@ -1,8 +1,9 @@
 import uuid
 from datetime import datetime, date
-from sqlalchemy import Column, String, Boolean, Integer, DateTime, Date, ForeignKey, Numeric, LargeBinary, BigInteger, Text, Enum
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import Column, String, Boolean, Integer, DateTime, Date, ForeignKey, Numeric, LargeBinary, BigInteger, Text, Enum, Float, Index
+from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY
 from sqlalchemy.orm import relationship
+from pgvector.sqlalchemy import Vector
 from app.database import Base
 
 # Define the ENUM for reminder_frequency
@@ -93,6 +94,131 @@ class PetPhoto(Base):
     vaccination_proofs = relationship("Vaccination", back_populates="proof_document")
     vet_visit_documents = relationship("VetVisit", back_populates="documents")
 
+class PetDocumentIndex(Base):
+    """Registro del índice vectorial (RAG) construido para los documentos de una mascota"""
+    __tablename__ = "pet_document_indexes"
+    __table_args__ = {'schema': 'petcare'}
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    pet_id = Column(UUID(as_uuid=True), ForeignKey("petcare.pets.id", ondelete="CASCADE"), nullable=False, unique=True, index=True)
+    generation = Column(Integer, nullable=False, default=1)  # Generación vigente de sus chunks en pet_document_chunks
+    fingerprint = Column(String, nullable=False)  # Huella de los documentos (ids + tamaños + updated_at)
+    version = Column(Integer, nullable=False, default=1)
+    document_count = Column(Integer, nullable=False, default=0)
+    chunk_count = Column(Integer, nullable=False, default=0)
+    built_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.now)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=datetime.now, onupdate=datetime.now)
+
+class PetDocumentChunk(Base):
+    """Chunks con embedding de los documentos de todas las mascotas (RAG)"""
+    __tablename__ = "pet_document_chunks"
+    __table_args__ = (
+        Index("ix_pet_document_chunks_pet_generation", "pet_id", "generation"),
+        Index("ix_pet_document_chunks_document_chunk", "document_id", "generation", "chunk_index", unique=True),
+        {'schema': 'petcare'}
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    pet_id = Column(UUID(as_uuid=True), ForeignKey("petcare.pets.id", ondelete="CASCADE"), nullable=False)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("petcare.pet_photos.id", ondelete="CASCADE"), nullable=False)
+    generation = Column(Integer, nullable=False)  # Reindexar escribe una generación nueva y luego borra la anterior
+    chunk_index = Column(Integer, nullable=False)
+    content = Column(Text, nullable=False)
+    chunk_metadata = Column("metadata", JSONB, nullable=False, default=dict)  # source, page, pet_id, document_id...
+    embedding = Column(Vector(1536), nullable=False)  # text-embedding-3-small (RAG_EMBEDDING_DIMENSIONS)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.now)
+
+class PetRecordSummary(Base):
+    """Ficha clínica compacta de una mascota para el chat con IA (caché versionada)"""
+    __tablename__ = "pet_record_summaries"
+    __table_args__ = {'schema': 'petcare'}
+
+    pet_id = Column(UUID(as_uuid=True), ForeignKey("petcare.pets.id", ondelete="CASCADE"), primary_key=True)
+    records_version = Column(Integer, nullable=False, default=0)  # Se incrementa con cada escritura de los registros de la mascota
+    summary_version = Column(Integer)  # records_version con la que se generó `summary`
+    summary = Column(Text)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=datetime.now, onupdate=datetime.now)
+
+class PetDocumentIngestion(Base):
+    """Estado de ingesta (extracción + embeddings) de cada documento PDF"""
+    __tablename__ = "pet_document_ingestions"
+    __table_args__ = {'schema': 'petcare'}
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("petcare.pet_photos.id", ondelete="CASCADE"), nullable=False, unique=True, index=True)
+    pet_id = Column(UUID(as_uuid=True), ForeignKey("petcare.pets.id", ondelete="CASCADE"), nullable=False, index=True)
+    status = Column(String, nullable=False, default="pending")  # 'pending', 'indexed' o 'failed'
+    error = Column(Text)
+    chunk_count = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=0)
+    indexed_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.now)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=datetime.now, onupdate=datetime.now)
+
+class EmbeddingCache(Base):
+    """Caché persistente de embeddings por (modelo, sha256 del texto del chunk)"""
+    __tablename__ = "embedding_cache"
+    __table_args__ = {'schema': 'petcare'}
+
+    model = Column(String, primary_key=True)
+    content_hash = Column(String(64), primary_key=True)
+    embedding = Column(ARRAY(Float), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.now)
+
+class AnswerCacheEntry(Base):
+    """Respuestas del chat a preguntas generales, buscadas por similitud del embedding de la pregunta"""
+    __tablename__ = "answer_cache"
+    __table_args__ = (
+        Index("ix_answer_cache_scope_created", "scope", "created_at"),
+        {'schema': 'petcare'}
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    scope = Column(String, nullable=False)  # Modelo de chat + modelo de embeddings + prompt de sistema
+    question = Column(Text, nullable=False)
+    embedding = Column(Vector(1536), nullable=False)  # text-embedding-3-small (RAG_EMBEDDING_DIMENSIONS)
+    answer = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.now)
+
+class UserTokenUsage(Base):
+    """Tokens del LLM consumidos por usuario y día (chat con IA)"""
+    __tablename__ = "user_token_usage"
+    __table_args__ = (
+        Index("ix_user_token_usage_date", "usage_date"),
+        {'schema': 'petcare'}
+    )
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("petcare.users.id", ondelete="CASCADE"), primary_key=True)
+    usage_date = Column(Date, primary_key=True)
+    prompt_tokens = Column(BigInteger, nullable=False, default=0)
+    completion_tokens = Column(BigInteger, nullable=False, default=0)
+    requests = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=datetime.now, onupdate=datetime.now)
+
+class ChatSessionMessage(Base):
+    """Mensajes de las sesiones de chat con IA (solo se insertan, nunca se editan)"""
+    __tablename__ = "chat_session_messages"
+    __table_args__ = (
+        Index("ix_chat_session_messages_session_created", "session_id", "created_at"),
+        {'schema': 'petcare'}
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    session_id = Column(String, nullable=False)
+    role = Column(String, nullable=False)  # user | assistant
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.now)
+
+class ChatSessionSummary(Base):
+    """Resumen acumulado de los turnos antiguos de una sesión de chat"""
+    __tablename__ = "chat_session_summaries"
+    __table_args__ = {'schema': 'petcare'}
+
+    session_id = Column(String, primary_key=True)
+    summary = Column(Text, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=datetime.now, onupdate=datetime.now)
+
 class Vaccination(Base):
     __tablename__ = "vaccinations"
     __table_args__ = {'schema': 'petcare'}
@@ -3,8 +3,9 @@ Rutas mejoradas para chat con IA veterinaria
 Incluye endpoints para gestión de sesiones y estadísticas
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Callable, List
 from app.database import SessionLocal
 from app.middleware.auth import get_current_active_user
 from app.models import User
@@ -29,6 +30,21 @@ def get_db():
         db.close()
 
 
+class AdmittedStreamingResponse(StreamingResponse):
+    """StreamingResponse que libera el hueco de admisión termine como termine el envío"""
+    
+    def __init__(self, content, release: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # También si el cliente se desconecta antes de empezar el cuerpo
+            self._release()
+
+
 @router.post(
     "/pets/{pet_id}/ask",
     response_model=ChatResponse,
@@ -53,6 +69,17 @@ def get_db():
     **Session ID:**
     - Si no proporcionas `session_id`, se crea automáticamente como `{user_id}_{pet_id}`
     - Usa el mismo `session_id` para mantener contexto en múltiples preguntas
+    
+    **Límite diario:**
+    - Si `CHAT_DAILY_TOKEN_BUDGET` está configurado y el usuario ya consumió sus
+      tokens del día, se responde 429 sin llamar al modelo
+    
+    **Saturación:**
+    - Cada worker atiende como mucho `CHAT_MAX_CONCURRENT_REQUESTS` preguntas a la vez
+      y reparte los huecos por turnos entre usuarios
+    - 429 si ya tienes demasiadas preguntas en espera; 503 si no se puede empezar
+      a tiempo. Ambos incluyen `Retry-After`
+    - 503 inmediato si el proveedor de IA está caído (circuit breaker abierto)
     """
 )
 async def ask_veterinary_question(
@@ -72,7 +99,7 @@ async def ask_veterinary_question(
     - `session_id`: ID de sesión para continuar la conversación
     """
     try:
-        result = ChatController.ask_question_about_pet(
+        result = await ChatController.ask_question_about_pet(
             db=db,
             pet_id=pet_id,
             question=request.question,
@@ -82,6 +109,9 @@ async def ask_veterinary_question(
         
         return ChatResponse(**result)
         
+    except HTTPException:
+        # Límite diario (429), saturación (429/503 con Retry-After), permisos...
+        raise
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -98,6 +128,64 @@ async def ask_veterinary_question(
         )
 
 
+@router.post(
+    "/pets/{pet_id}/ask/stream",
+    status_code=status.HTTP_200_OK,
+    summary="Consultar veterinario experto con IA (streaming)",
+    description="""
+    Igual que `/chat/pets/{pet_id}/ask`, pero la respuesta se envía como
+    **Server-Sent Events** a medida que el modelo la genera.
+    
+    **Eventos:**
+    - `token`: `{"content": "..."}` fragmento de la respuesta
+    - `done`: `{"answer", "source_documents", "chat_history", "has_documents", "session_id", "memory_info", "error"}`
+    - `error`: `{"message", "session_id", "error"}` si la generación falla
+    
+    La interacción se guarda en la memoria de la sesión solo cuando llega el evento `done`.
+    
+    **Ejemplo de uso con curl:**
+    ```bash
+    curl -N -X POST "http://localhost:8000/chat/pets/{pet_id}/ask/stream" \\
+      -H "Authorization: Bearer YOUR_TOKEN" \\
+      -H "Content-Type: application/json" \\
+      -d '{"question": "¿Qué alimentos son tóxicos para gatos?"}'
+    ```
+    """
+)
+async def ask_veterinary_question_stream(
+    pet_id: str,
+    request: ChatQuestionRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Consulta al veterinario experto con IA recibiendo la respuesta token a token
+    """
+    try:
+        events, release = await ChatController.stream_question_about_pet(
+            db=db,
+            pet_id=pet_id,
+            question=request.question,
+            current_user=current_user,
+            session_id=request.session_id
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    return AdmittedStreamingResponse(
+        events,
+        release=release,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Evitar buffering en proxies (nginx)
+        }
+    )
+
+
 @router.delete(
     "/sessions/{session_id}",
     status_code=status.HTTP_200_OK,
@@ -209,6 +297,12 @@ async def get_session_statistics(
     - Número de mensajes en memoria
     - Límite máximo de mensajes
     - Porcentaje de uso de memoria
+    - Estado del almacén de sesiones (`store`): sesiones activas, tamaño
+      estimado y contadores de desalojo por LRU, TTL y tamaño
+    - Caché semántica de respuestas generales (`answer_cache`): aciertos,
+      fallos y tasa de aciertos del proceso
+    - Caché de recuperaciones RAG (`retrieval_cache`): entradas, aciertos
+      y aciertos solo de embedding (el índice de la mascota cambió)
     """
     stats = ChatController.get_session_stats(session_id)
     
@@ -221,6 +315,53 @@ async def get_session_statistics(
     return stats
 
 
+@router.get(
+    "/metrics",
+    status_code=status.HTTP_200_OK,
+    summary="Métricas del chat",
+    description="Tiempos por etapa del chat y de la ingesta de documentos, y estado de las cachés (solo administradores)"
+)
+async def get_chat_metrics(
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Métricas del proceso (se reinician al reiniciar el servidor)
+    
+    **Incluye:**
+    - `stages`: por etapa (document_lookup, download, parse, split, embed,
+      vector_insert, retrieval, condense, answer, memory_trim) llamadas,
+      errores, media, p50 y p95 en ms, y totales de bytes, chunks y tokens
+    - `embeddings`: aciertos de la caché y embeddings por segundo del planificador
+    - `answer_cache`, `retrieval_cache` y `pet_record_summary`: aciertos y fallos
+    - `token_usage`: límite diario, contadores pendientes de guardar y peticiones rechazadas
+    - `admission`: preguntas activas y en espera, rechazos (429/503) y p95 de espera en cola
+    - `llm`: reintentos, peticiones duplicadas (hedging) y estado del circuit breaker
+    - `speculative_retrieval`: búsquedas especulativas usadas, desperdiciadas y omitidas
+    - `sessions`: estado del almacén de sesiones
+    """
+    return ChatController.get_metrics(current_user)
+
+
+@router.get(
+    "/usage",
+    status_code=status.HTTP_200_OK,
+    summary="Consumo de tokens por usuario",
+    description="Tokens del LLM consumidos por cada usuario en los últimos días (solo administradores)"
+)
+async def get_token_usage_report(
+    days: int = Query(7, ge=1, le=90, description="Días incluidos, contando hoy"),
+    limit: int = Query(50, ge=1, le=500, description="Número máximo de usuarios"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Informe de consumo ordenado de mayor a menor
+    
+    **Incluye por usuario:** tokens de prompt, de respuesta, total y número de peticiones
+    """
+    return ChatController.get_token_usage_report(db, current_user, days, limit)
+
+
 @router.post(
     "/test",
     status_code=status.HTTP_200_OK,
@@ -244,18 +385,27 @@ async def test_veterinary_chat(
     """
     Prueba rápida del sistema de chat sin asociar a una mascota
     """
-    from app.services.langchain_service import LangChainService
+    from app.services.langchain_service import get_langchain_service
+    from app.services.token_metering import token_meter
+    from app.services.chat_admission import chat_admission
+    from app.services.llm_resilience import llm_breaker
+    from fastapi.concurrency import run_in_threadpool
     from langchain.memory import ConversationBufferMemory
     
+    await run_in_threadpool(token_meter.ensure_within_budget, current_user.id)
+    llm_breaker.check()
+    token_meter.begin_request(current_user.id)
+    ticket = await chat_admission.acquire(current_user.id)
+    
     try:
-        langchain_service = LangChainService()
+        langchain_service = get_langchain_service()
         memory = ConversationBufferMemory(
             return_messages=True,
             memory_key="chat_history",
             output_key="answer"
         )
         
-        result = langchain_service.ask_question(
+        result = await langchain_service.aask_question(
             question=question,
             vector_store=None,
             memory=memory,
@@ -269,8 +419,12 @@ async def test_veterinary_chat(
             "note": "Esta respuesta no se guarda en ninguna sesión"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error: {str(e)}"
-        )
\ No newline at end of file
+        )
+    finally:
+        chat_admission.release(ticket)
\ No newline at end of file
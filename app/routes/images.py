@@ -233,11 +233,14 @@ def delete_all_pet_photos(
     # Verificar que la mascota pertenece al usuario
     pet = PetController.get_pet_by_id(db, pet_id, current_user)
     
+    from app.services.document_ingestion_service import document_ingestion_service
+    
     # Obtener todas las fotos de la base de datos
     pet_photos = db.query(PetPhoto).filter(PetPhoto.pet_id == pet.id).all()
     
     # Eliminar de S3 y de la BD
     deleted_count = 0
+    deleted_document_ids = []
     for photo in pet_photos:
         # Extraer s3_key de la URL
         s3_key = None
@@ -247,12 +250,19 @@ def delete_all_pet_photos(
                 s3_key = url_parts[1]
                 s3_service.delete_image(s3_key)
         
+        if photo.file_type == "document":
+            deleted_document_ids.append(str(photo.id))
+        
         # Eliminar registro de la BD
         db.delete(photo)
         deleted_count += 1
     
     db.commit()
     
+    # Eliminar embeddings de los documentos borrados en segundo plano
+    for document_id in deleted_document_ids:
+        document_ingestion_service.enqueue_removal(str(pet.id), document_id)
+    
     return None
 
 # ========================================
@@ -362,6 +372,9 @@ def get_pet_documents(
     # Ordenar por fecha de creación descendente
     documents = query.order_by(desc(PetPhoto.created_at)).all()
     
+    # Estado de ingesta RAG (pending, indexed, failed)
+    index_statuses = PetController.get_document_index_statuses(db, pet.id)
+    
     # Convertir a formato de respuesta
     documents_list = []
     for doc in documents:
@@ -386,7 +399,9 @@ def get_pet_documents(
             "is_profile": False,
             "file_type": doc.file_type or "document",
             "document_category": doc.document_category,
-            "description": doc.description
+            "description": doc.description,
+            "index_status": index_statuses.get(str(doc.id), {}).get("status"),
+            "index_error": index_statuses.get(str(doc.id), {}).get("error")
         })
     
     return [PetPhotoListResponse(**doc) for doc in documents_list]
\ No newline at end of file
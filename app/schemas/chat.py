@@ -87,6 +87,10 @@ class ChatResponse(BaseModel):
         None,
         description="Información sobre el estado de la memoria"
     )
+    timings: Optional[List[Dict[str, Any]]] = Field(
+        None,
+        description="Tiempos por etapa del turno con conteos de bytes, chunks y tokens (solo con CHAT_DEBUG_TIMINGS)"
+    )
     error: Optional[str] = Field(
         None, 
         description="Mensaje de error si algo falló (null si todo OK)"
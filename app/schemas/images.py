@@ -39,6 +39,8 @@ class PetPhotoListResponse(BaseModel):
     file_type: str = Field("image", description="Tipo de archivo: 'image' o 'document'")
     document_category: Optional[str] = Field(None, description="Categoría del documento (solo para documentos)")
     description: Optional[str] = Field(None, description="Descripción del documento (solo para documentos)")
+    index_status: Optional[str] = Field(None, description="Estado de ingesta para el chat IA: 'pending', 'indexed' o 'failed' (solo para documentos)")
+    index_error: Optional[str] = Field(None, description="Error de la última ingesta fallida (solo para documentos)")
 
 class DocumentUploadResponse(BaseModel):
     """Schema para respuesta de subida de documento"""
@@ -49,6 +51,7 @@ class DocumentUploadResponse(BaseModel):
     photo_id: Optional[str] = Field(None, description="ID del registro en pet_photos")
     file_type: str = Field("document", description="Tipo de archivo")
     document_category: Optional[str] = Field(None, description="Categoría del documento")
+    index_status: Optional[str] = Field(None, description="Estado de ingesta para el chat IA (inicialmente 'pending')")
     
     class Config:
         json_schema_extra = {
@@ -59,6 +62,7 @@ class DocumentUploadResponse(BaseModel):
                 "bucket": "pet-healthcare-images",
                 "photo_id": "550e8400-e29b-41d4-a716-446655440000",
                 "file_type": "document",
-                "document_category": "vaccination"
+                "document_category": "vaccination",
+                "index_status": "pending"
             }
         }
\ No newline at end of file
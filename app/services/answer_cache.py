@@ -0,0 +1,132 @@
+"""
+Caché semántica de respuestas del chat con IA
+Reutiliza la respuesta a una pregunta general (sin historial, documentos ni
+referencias a la mascota del usuario) cuando otra pregunta con un embedding
+casi idéntico ya se respondió hace poco
+"""
+import hashlib
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import delete
+from app.config import settings
+from app.database import SessionLocal
+
+
+class SemanticAnswerCache:
+    """
+    Respuestas cacheadas en PostgreSQL, buscadas por similitud coseno (índice HNSW)
+    
+    Las entradas se separan por `scope` (modelo de chat, modelo de embeddings
+    y prompt de sistema): cambiar cualquiera de ellos no reutiliza respuestas
+    antiguas.
+    
+    Con la ficha clínica de la mascota en el prompt no se usa la caché (ni se
+    consulta ni se guarda): la respuesta depende de la ficha y no se comparte.
+    """
+    
+    # Palabras que indican una pregunta sobre la mascota concreta del usuario
+    # (la respuesta dependería de su ficha y no puede compartirse)
+    PERSONAL_MARKERS = frozenset({
+        "mi", "mis", "me", "nuestro", "nuestra", "nuestros", "nuestras",
+        "último", "última", "ultimo", "ultima", "próxima", "próximo", "proxima", "proximo",
+        "le", "toca", "pesa", "peso", "edad", "historial", "ficha", "registro", "registros",
+        "my", "our", "last", "next"
+    })
+    
+    # Cada cuántas respuestas guardadas se eliminan las caducadas
+    PURGE_EVERY = 100
+    
+    def __init__(
+        self,
+        enabled: bool = settings.ANSWER_CACHE_ENABLED,
+        similarity: float = settings.ANSWER_CACHE_SIMILARITY,
+        ttl_hours: int = settings.ANSWER_CACHE_TTL_HOURS
+    ):
+        self.enabled = enabled
+        self.similarity = similarity
+        self.ttl = timedelta(hours=ttl_hours)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def build_scope(system_prompt: str) -> str:
+        """Clave de compatibilidad de las respuestas cacheadas"""
+        prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:12]
+        return f"{settings.OPENAI_MODEL}|{settings.OPENAI_EMBEDDING_MODEL}|{prompt_hash}"
+    
+    def is_eligible(
+        self,
+        question: str,
+        history: List,
+        summary: Optional[str] = None,
+        pet_record: Optional[str] = None
+    ) -> bool:
+        """Solo preguntas generales: caché activa, sesión vacía, sin ficha y sin referencias a la mascota"""
+        if not self.enabled or history or summary or pet_record:
+            return False
+        words = re.findall(r"\w+", question.lower())
+        return bool(words) and not any(word in self.PERSONAL_MARKERS for word in words)
+    
+    def lookup(self, scope: str, embedding: List[float]) -> Optional[str]:
+        """Respuesta vigente más parecida si supera el umbral de similitud"""
+        from app.models import AnswerCacheEntry
+        
+        distance = AnswerCacheEntry.embedding.cosine_distance(embedding)
+        db = SessionLocal()
+        try:
+            row = db.query(AnswerCacheEntry.answer, distance.label("distance")).filter(
+                AnswerCacheEntry.scope == scope,
+                AnswerCacheEntry.created_at >= datetime.now() - self.ttl
+            ).order_by(distance).limit(1).first()
+        finally:
+            db.close()
+        
+        hit = row is not None and (1 - row.distance) >= self.similarity
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return row.answer if hit else None
+    
+    def store(self, scope: str, question: str, embedding: List[float], answer: str):
+        """Guarda una respuesta nueva (y de vez en cuando purga las caducadas)"""
+        from app.models import AnswerCacheEntry
+        
+        if not answer:
+            return
+        
+        with self._lock:
+            self.stores += 1
+            purge = self.stores % self.PURGE_EVERY == 0
+        
+        db = SessionLocal()
+        try:
+            db.add(AnswerCacheEntry(scope=scope, question=question, embedding=embedding, answer=answer))
+            if purge:
+                db.execute(delete(AnswerCacheEntry).where(
+                    AnswerCacheEntry.created_at < datetime.now() - self.ttl
+                ))
+            db.commit()
+        finally:
+            db.close()
+    
+    def stats(self) -> dict:
+        """Aciertos, fallos y tasa de aciertos en este proceso"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# Instancia global de la caché
+answer_cache = SemanticAnswerCache()
@@ -0,0 +1,221 @@
+"""
+Control de admisión del chat con IA
+Limita las preguntas atendidas a la vez en cada worker y reparte los huecos
+entre usuarios por turnos (cola justa): un usuario con muchas preguntas en
+espera no retrasa a los demás. Si una pregunta no puede empezar dentro del
+plazo se rechaza enseguida con Retry-After en lugar de esperar a que todo
+el servidor se sature.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+from app.config import settings
+from app.services.chat_metrics import chat_metrics
+from app.utils.exceptions import ChatOverloadedException, ChatQueueFullException
+
+
+class AdmissionTicket:
+    """Hueco concedido a una pregunta (se libera una sola vez)"""
+    
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.admitted_at = time.monotonic()
+        self.released = False
+
+
+class ChatAdmissionController:
+    """
+    Semáforo con cola justa por usuario
+    
+    Vive en el event loop del worker (sin locks): `acquire` concede un hueco
+    o encola la petición en la cola de su usuario; al liberar un hueco se
+    atiende al siguiente usuario en orden circular. Se rechaza de inmediato:
+    - 429 si el usuario ya tiene `max_queued_per_user` preguntas esperando
+    - 503 si la espera estimada supera `timeout_seconds`, o al agotarse ese plazo
+    """
+    
+    def __init__(
+        self,
+        max_concurrency: int = settings.CHAT_MAX_CONCURRENT_REQUESTS,
+        max_queued_per_user: int = settings.CHAT_MAX_QUEUED_PER_USER,
+        timeout_seconds: float = settings.CHAT_ADMISSION_TIMEOUT_SECONDS
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queued_per_user = max_queued_per_user
+        self.timeout_seconds = timeout_seconds
+        self._active = 0
+        # Usuario -> peticiones en espera; el orden del dict es el turno
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        # Media móvil de lo que tarda una pregunta admitida (None hasta la primera)
+        self._service_seconds: Optional[float] = None
+        self._waits: Deque[float] = deque(maxlen=1024)
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_queue_full = 0
+        self.rejected_overloaded = 0
+        self.timed_out = 0
+    
+    # ============================================
+    # ADMISIÓN
+    # ============================================
+    
+    async def acquire(self, user_id: Any) -> AdmissionTicket:
+        """
+        Espera un hueco para la pregunta del usuario
+        
+        Raises:
+            ChatQueueFullException: el usuario ya tiene demasiadas preguntas en espera
+            ChatOverloadedException: no se puede empezar dentro del plazo
+        """
+        user_id = str(user_id)
+        started = time.monotonic()
+        
+        if self.max_concurrency <= 0 or (self._active < self.max_concurrency and not self._queues):
+            self._active += 1
+            return self._admit(user_id, started, queued=False)
+        
+        queue = self._queues.get(user_id)
+        waiting = len(queue) if queue else 0
+        if waiting >= self.max_queued_per_user:
+            self.rejected_queue_full += 1
+            print(f"🚦 Usuario {user_id} con {waiting} preguntas en espera: 429")
+            raise ChatQueueFullException(self._retry_after(self._service_seconds))
+        
+        estimated_wait = self._estimated_wait(user_id, waiting)
+        if estimated_wait is not None and estimated_wait > self.timeout_seconds:
+            self.rejected_overloaded += 1
+            print(f"🚦 Espera estimada {estimated_wait:.1f}s > {self.timeout_seconds}s: 503")
+            raise ChatOverloadedException(self._retry_after(estimated_wait))
+        
+        future = asyncio.get_running_loop().create_future()
+        if queue is None:
+            queue = self._queues[user_id] = deque()
+        queue.append(future)
+        self.queued += 1
+        
+        try:
+            await asyncio.wait_for(future, self.timeout_seconds)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # El hueco llegó justo al vencer el plazo: se aprovecha
+                return self._admit(user_id, started, queued=True)
+            self._discard(user_id, future)
+            self.timed_out += 1
+            print(f"🚦 Pregunta de {user_id} sin hueco tras {self.timeout_seconds}s: 503")
+            raise ChatOverloadedException(self._retry_after(self._service_seconds))
+        except asyncio.CancelledError:
+            # Cliente desconectado: devolver el hueco si ya se había concedido
+            if future.done() and not future.cancelled():
+                self._active -= 1
+                self._dispatch()
+            else:
+                self._discard(user_id, future)
+            raise
+        
+        return self._admit(user_id, started, queued=True)
+    
+    def release(self, ticket: Optional[AdmissionTicket]):
+        """Libera el hueco y lo cede al siguiente usuario en turno"""
+        if ticket is None or ticket.released:
+            return
+        ticket.released = True
+        
+        elapsed = time.monotonic() - ticket.admitted_at
+        if self._service_seconds is None:
+            self._service_seconds = elapsed
+        else:
+            self._service_seconds = 0.8 * self._service_seconds + 0.2 * elapsed
+        
+        self._active -= 1
+        self._dispatch()
+    
+    @asynccontextmanager
+    async def admit(self, user_id: Any) -> AsyncIterator[AdmissionTicket]:
+        """Mantiene un hueco mientras dura el bloque"""
+        ticket = await self.acquire(user_id)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+    
+    def _admit(self, user_id: str, started: float, queued: bool) -> AdmissionTicket:
+        waited = time.monotonic() - started
+        self.admitted += 1
+        self._waits.append(waited)
+        chat_metrics.record("admission", waited, {"queued": int(queued)})
+        return AdmissionTicket(user_id)
+    
+    def _dispatch(self):
+        """Concede huecos libres a los usuarios en espera, uno por usuario y turno"""
+        while self._active < self.max_concurrency and self._queues:
+            user_id, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            if queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            if future.done():
+                continue
+            self._active += 1
+            future.set_result(None)
+    
+    def _discard(self, user_id: str, future: asyncio.Future):
+        """Quita de la cola una petición que ya no espera"""
+        queue = self._queues.get(user_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            return
+        if not queue:
+            del self._queues[user_id]
+    
+    # ============================================
+    # ESTIMACIONES
+    # ============================================
+    
+    def _estimated_wait(self, user_id: str, waiting: int) -> Optional[float]:
+        """
+        Segundos estimados hasta empezar si se encola ahora
+        
+        Con turnos circulares, delante quedan las `waiting` del propio usuario
+        y hasta `waiting + 1` de cada uno de los demás.
+        """
+        if self._service_seconds is None:
+            return None
+        ahead = waiting + sum(
+            min(len(queue), waiting + 1)
+            for other, queue in self._queues.items()
+            if other != user_id
+        )
+        return (ahead + 1) / self.max_concurrency * self._service_seconds
+    
+    @staticmethod
+    def _retry_after(seconds: Optional[float]) -> int:
+        return max(1, math.ceil(seconds or 1))
+    
+    def stats(self) -> Dict[str, Any]:
+        """Estado de la admisión en este worker"""
+        ordered = sorted(self._waits)
+        p95 = ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)] if ordered else 0.0
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "waiting": sum(len(queue) for queue in self._queues.values()),
+            "users_waiting": len(self._queues),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_overloaded": self.rejected_overloaded,
+            "timed_out": self.timed_out,
+            "mean_service_ms": round(self._service_seconds * 1000, 1) if self._service_seconds is not None else None,
+            "p95_wait_ms": round(p95 * 1000, 1)
+        }
+
+
+# Instancia global (una por worker)
+chat_admission = ChatAdmissionController()
@@ -0,0 +1,123 @@
+"""
+Métricas de tiempos por etapa del chat con IA y de la ingesta de documentos
+Cada etapa (búsqueda de documentos, descarga, extracción, división,
+embeddings, inserción de vectores, recuperación, reformulación, respuesta y
+recorte de memoria) se mide con un span que lleva sus conteos de bytes,
+chunks y tokens. Los spans se agregan por proceso para el endpoint de
+métricas y, si hay una traza activa, se añaden a la del turno en curso.
+"""
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+
+class _StageStats:
+    """Agregado de una etapa: llamadas, errores, duraciones recientes y conteos acumulados"""
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.durations: Deque[float] = deque(maxlen=window)
+        self.counters: Dict[str, int] = {}
+
+    def add(self, seconds: float, counts: Dict[str, Any], error: bool):
+        self.count += 1
+        self.errors += int(error)
+        self.total_seconds += seconds
+        self.durations.append(seconds)
+        for name, value in counts.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    @staticmethod
+    def _percentile(ordered: List[float], fraction: float) -> float:
+        return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)] if ordered else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        ordered = sorted(self.durations)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": round(self.total_seconds / self.count * 1000, 1) if self.count else 0.0,
+            "p50_ms": round(self._percentile(ordered, 0.50) * 1000, 1),
+            "p95_ms": round(self._percentile(ordered, 0.95) * 1000, 1),
+            "totals": dict(self.counters)
+        }
+
+
+class ChatMetrics:
+    """
+    Spans de tiempo por etapa
+
+    `span()` mide un bloque y devuelve un dict donde el código medido anota
+    sus conteos (`bytes`, `chunks`, `tokens`...). La traza del turno vive en
+    una ContextVar: la heredan run_in_threadpool y las tareas de asyncio,
+    pero no los ThreadPoolExecutor propios (usar `contextvars.copy_context`).
+    """
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._stages: Dict[str, _StageStats] = {}
+        self._lock = threading.Lock()
+        self._trace: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("chat_trace", default=None)
+
+    # ============================================
+    # TRAZA DEL TURNO
+    # ============================================
+
+    def start_trace(self) -> List[Dict[str, Any]]:
+        """Empieza a recoger los spans del turno en el contexto actual"""
+        trace: List[Dict[str, Any]] = []
+        self._trace.set(trace)
+        return trace
+
+    def resume_trace(self, trace: Optional[List[Dict[str, Any]]]):
+        """Sigue añadiendo a `trace` desde otro contexto (ej: el generador de un stream)"""
+        self._trace.set(trace)
+
+    # ============================================
+    # SPANS
+    # ============================================
+
+    @contextmanager
+    def span(self, stage: str, **counts: Any) -> Iterator[Dict[str, Any]]:
+        """Mide el bloque como la etapa `stage` (los conteos se pueden completar dentro)"""
+        started = time.perf_counter()
+        error = False
+        try:
+            yield counts
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - started, counts, error)
+
+    def record(self, stage: str, seconds: float, counts: Optional[Dict[str, Any]] = None, error: bool = False):
+        """Registra una duración ya medida"""
+        counts = counts or {}
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = _StageStats(self.window)
+            stats.add(seconds, counts, error)
+
+        trace = self._trace.get()
+        if trace is not None:
+            entry = {"stage": stage, "duration_ms": round(seconds * 1000, 1), **counts}
+            if error:
+                entry["error"] = True
+            trace.append(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        """Agregado por etapa (p50/p95 sobre las últimas `window` llamadas)"""
+        with self._lock:
+            return {stage: stats.snapshot() for stage, stats in sorted(self._stages.items())}
+
+
+# Instancia global de métricas
+chat_metrics = ChatMetrics()
@@ -0,0 +1,655 @@
+"""
+Almacenes de sesiones del chat con IA
+Guardan los mensajes de cada conversación para que el contexto se mantenga
+entre preguntas. Hay tres implementaciones intercambiables:
+- memory: en memoria del proceso, acotado (LRU + TTL)
+- postgres: tabla de mensajes de solo inserción, compartida entre workers
+- redis: listas por sesión en un servidor compatible con el protocolo Redis
+"""
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from app.config import settings
+from app.database import SessionLocal
+
+
+def message_to_role(message: BaseMessage) -> Optional[str]:
+    """Rol (user | assistant) de un mensaje de LangChain"""
+    if isinstance(message, HumanMessage):
+        return "user"
+    if isinstance(message, AIMessage):
+        return "assistant"
+    return None
+
+
+def role_to_message(role: str, content: str) -> BaseMessage:
+    """Crea el mensaje de LangChain correspondiente a un rol"""
+    if role == "user":
+        return HumanMessage(content=content)
+    return AIMessage(content=content)
+
+
+class ChatSessionBackend(ABC):
+    """
+    Interfaz común de los almacenes de sesiones
+    
+    Las sesiones son listas de mensajes: cada turno añade sus mensajes nuevos
+    (`append_messages`) y la siguiente pregunta carga los últimos N en una
+    sola lectura (`load_messages`).
+    """
+    
+    name = "base"
+    
+    @abstractmethod
+    def load_messages(self, session_id: str, limit: int) -> Optional[List[BaseMessage]]:
+        """Últimos `limit` mensajes de la sesión (None si no existe)"""
+    
+    @abstractmethod
+    def append_messages(self, session_id: str, messages: List[BaseMessage]):
+        """Añade mensajes al final de la sesión (la crea si no existe)"""
+    
+    @abstractmethod
+    def load_summary(self, session_id: str) -> Optional[str]:
+        """Resumen acumulado de los turnos antiguos de la sesión"""
+    
+    @abstractmethod
+    def save_summary(self, session_id: str, summary: str):
+        """Guarda el resumen acumulado de la sesión"""
+    
+    def load_conversation(self, session_id: str, limit: int) -> Tuple[Optional[List[BaseMessage]], Optional[str]]:
+        """Últimos `limit` mensajes y resumen de la sesión"""
+        return self.load_messages(session_id, limit), self.load_summary(session_id)
+    
+    @contextmanager
+    def summary_lock(self, session_id: str) -> Iterator[None]:
+        """
+        Exclusión entre procesos para leer, rehacer y guardar el resumen de una sesión
+        
+        Por defecto no bloquea nada: el almacén en memoria es de un solo
+        proceso y dentro del proceso el servicio de resúmenes ya los ejecuta
+        de uno en uno por sesión.
+        """
+        yield
+    
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Elimina una sesión (mensajes y resumen)"""
+    
+    @abstractmethod
+    def session_ids(self) -> List[str]:
+        """Lista las sesiones activas"""
+    
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas globales del almacén"""
+
+
+class ChatSessionStore(ChatSessionBackend):
+    """
+    Almacén acotado de sesiones en memoria del proceso
+    
+    Las sesiones se ordenan por último uso. Al superar `max_sessions` o
+    `max_bytes` se eliminan las menos usadas recientemente, y las sesiones
+    sin actividad durante `ttl_seconds` expiran en el siguiente acceso.
+    Cada sesión conserva como máximo `max_messages_per_session` mensajes.
+    """
+    
+    name = "memory"
+    
+    # Bytes fijos estimados por sesión y por mensaje (objetos de LangChain)
+    SESSION_OVERHEAD_BYTES = 2048
+    MESSAGE_OVERHEAD_BYTES = 512
+    
+    def __init__(
+        self,
+        max_sessions: int = settings.CHAT_SESSION_MAX_COUNT,
+        max_bytes: int = settings.CHAT_SESSION_MAX_BYTES,
+        ttl_seconds: int = settings.CHAT_SESSION_TTL_MINUTES * 60,
+        max_messages_per_session: int = settings.CHAT_SESSION_HISTORY_LIMIT
+    ):
+        self.max_sessions = max(1, max_sessions)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_messages_per_session = max(1, max_messages_per_session)
+        self._lock = threading.Lock()
+        # session_id -> (mensajes, último acceso, bytes estimados)
+        self._sessions: "OrderedDict[str, Tuple[List[BaseMessage], float, int]]" = OrderedDict()
+        self._summaries: Dict[str, str] = {}
+        self._total_bytes = 0
+        self.evictions_lru = 0
+        self.evictions_ttl = 0
+        self.evictions_bytes = 0
+    
+    # ============================================
+    # ACCESO
+    # ============================================
+    
+    def load_messages(self, session_id: str, limit: int) -> Optional[List[BaseMessage]]:
+        """Copia de los últimos `limit` mensajes (y marca la sesión como usada)"""
+        with self._lock:
+            self._expire(time.monotonic())
+            messages = self._touch(session_id)
+            if messages is None:
+                return None
+            return list(messages[-limit:]) if limit > 0 else []
+    
+    def append_messages(self, session_id: str, messages: List[BaseMessage]):
+        """Añade mensajes a la sesión y recalcula su tamaño estimado"""
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            entry = self._sessions.get(session_id)
+            stored, old_size = (entry[0], entry[2]) if entry else ([], 0)
+            
+            stored.extend(messages)
+            del stored[:-self.max_messages_per_session]
+            new_size = self._estimate_bytes(stored)
+            
+            self._sessions[session_id] = (stored, now, new_size)
+            self._sessions.move_to_end(session_id)
+            self._total_bytes += new_size - old_size
+            self._enforce_limits()
+    
+    def load_summary(self, session_id: str) -> Optional[str]:
+        """Resumen acumulado de la sesión"""
+        with self._lock:
+            return self._summaries.get(session_id)
+    
+    def save_summary(self, session_id: str, summary: str):
+        """Guarda el resumen si la sesión sigue en memoria"""
+        with self._lock:
+            if session_id in self._sessions:
+                self._summaries[session_id] = summary
+    
+    def delete(self, session_id: str) -> bool:
+        """Elimina una sesión"""
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            self._summaries.pop(session_id, None)
+            if entry is None:
+                return False
+            self._total_bytes -= entry[2]
+            return True
+    
+    def session_ids(self) -> List[str]:
+        """Lista las sesiones activas (sin las expiradas)"""
+        with self._lock:
+            self._expire(time.monotonic())
+            return list(self._sessions.keys())
+    
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas globales del almacén"""
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                "backend": self.name,
+                "active_sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "estimated_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "evictions": {
+                    "lru": self.evictions_lru,
+                    "ttl": self.evictions_ttl,
+                    "bytes": self.evictions_bytes
+                }
+            }
+    
+    # ============================================
+    # AUXILIARES (llamar con el lock tomado)
+    # ============================================
+    
+    def _touch(self, session_id: str) -> Optional[List[BaseMessage]]:
+        """Actualiza el último acceso y mueve la sesión al final (más reciente)"""
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        
+        messages, _, size = entry
+        self._sessions[session_id] = (messages, time.monotonic(), size)
+        self._sessions.move_to_end(session_id)
+        return messages
+    
+    def _expire(self, now: float):
+        """Elimina las sesiones inactivas más allá del TTL"""
+        if self.ttl_seconds <= 0:
+            return
+        
+        # El orden LRU coincide con el orden de último acceso
+        while self._sessions:
+            session_id, (_, last_access, size) = next(iter(self._sessions.items()))
+            if now - last_access < self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self._summaries.pop(session_id, None)
+            self._total_bytes -= size
+            self.evictions_ttl += 1
+            print(f"⌛ Sesión expirada por inactividad: {session_id}")
+    
+    def _enforce_limits(self):
+        """Desaloja las sesiones menos usadas hasta cumplir los límites"""
+        while len(self._sessions) > self.max_sessions:
+            self._evict_oldest()
+            self.evictions_lru += 1
+        
+        while self.max_bytes > 0 and self._total_bytes > self.max_bytes and len(self._sessions) > 1:
+            self._evict_oldest()
+            self.evictions_bytes += 1
+    
+    def _evict_oldest(self):
+        """Elimina la sesión usada hace más tiempo"""
+        session_id, (_, _, size) = self._sessions.popitem(last=False)
+        self._summaries.pop(session_id, None)
+        self._total_bytes -= size
+        print(f"♻️ Sesión desalojada de memoria: {session_id}")
+    
+    def _estimate_bytes(self, messages: List[BaseMessage]) -> int:
+        """Estima el tamaño en memoria de una sesión a partir de sus mensajes"""
+        size = self.SESSION_OVERHEAD_BYTES
+        for message in messages:
+            content = message.content if isinstance(message.content, str) else str(message.content)
+            size += len(content.encode("utf-8")) + self.MESSAGE_OVERHEAD_BYTES
+        return size
+
+
+class PostgresSessionBackend(ChatSessionBackend):
+    """
+    Sesiones en la tabla `chat_session_messages` (compartidas entre workers)
+    
+    Cada mensaje es una fila nueva; los últimos N se leen con una única
+    consulta sobre el índice (session_id, created_at). El TTL se aplica por
+    sesión: una sesión expira cuando su último mensaje es más antiguo que el
+    TTL, y entonces se ignora entera (nunca queda media conversación). Las
+    sesiones expiradas se purgan por lotes al escribir, como mucho una vez
+    cada `purge_interval_seconds` por proceso.
+    """
+    
+    name = "postgres"
+    
+    # Sesiones expiradas eliminadas por cada purga
+    PURGE_BATCH_SESSIONS = 500
+    
+    def __init__(
+        self,
+        ttl_seconds: int = settings.CHAT_SESSION_TTL_MINUTES * 60,
+        purge_interval_seconds: int = 300
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.purge_interval_seconds = purge_interval_seconds
+        self._purge_lock = threading.Lock()
+        self._last_purge = time.monotonic()
+    
+    @staticmethod
+    def _now() -> datetime:
+        """Hora actual con zona (las columnas son timestamptz y psycopg2 las devuelve con zona)"""
+        return datetime.now(timezone.utc)
+    
+    def _cutoff(self) -> Optional[datetime]:
+        """Fecha a partir de la cual los mensajes siguen vigentes"""
+        if self.ttl_seconds <= 0:
+            return None
+        return self._now() - timedelta(seconds=self.ttl_seconds)
+    
+    def load_messages(self, session_id: str, limit: int) -> Optional[List[BaseMessage]]:
+        """Últimos `limit` mensajes de la sesión en una sola consulta"""
+        from app.models import ChatSessionMessage
+        
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                ChatSessionMessage.role, ChatSessionMessage.content, ChatSessionMessage.created_at
+            ).filter(
+                ChatSessionMessage.session_id == session_id
+            ).order_by(ChatSessionMessage.created_at.desc()).limit(max(limit, 1)).all()
+            if not rows:
+                return None
+            
+            # TTL por sesión: cuenta la actividad más reciente (la primera fila)
+            cutoff = self._cutoff()
+            if cutoff is not None and rows[0].created_at < cutoff:
+                return None
+            
+            rows = rows[:limit] if limit > 0 else []
+            return [role_to_message(role, content) for role, content, _ in reversed(rows)]
+        finally:
+            db.close()
+    
+    def append_messages(self, session_id: str, messages: List[BaseMessage]):
+        """Inserta los mensajes del turno"""
+        from app.models import ChatSessionMessage
+        
+        if not messages:
+            return
+        
+        db = SessionLocal()
+        try:
+            # Marcas de tiempo crecientes para conservar el orden dentro del turno
+            base_time = self._now()
+            for position, message in enumerate(messages):
+                role = message_to_role(message)
+                if role is None:
+                    continue
+                db.add(ChatSessionMessage(
+                    session_id=session_id,
+                    role=role,
+                    content=message.content,
+                    created_at=base_time + timedelta(microseconds=position)
+                ))
+            db.commit()
+        finally:
+            db.close()
+        
+        self._maybe_purge_expired()
+    
+    def _maybe_purge_expired(self):
+        """Purga un lote de sesiones expiradas si toca (no afecta al turno si falla)"""
+        if self._cutoff() is None:
+            return
+        with self._purge_lock:
+            now = time.monotonic()
+            if now - self._last_purge < self.purge_interval_seconds:
+                return
+            self._last_purge = now
+        
+        try:
+            purged = self.purge_expired()
+            if purged:
+                print(f"🧹 Purgadas {purged} sesiones de chat expiradas")
+        except Exception as e:
+            print(f"⚠️ Error purgando sesiones expiradas: {str(e)}")
+    
+    def purge_expired(self, batch_sessions: Optional[int] = None) -> int:
+        """Elimina mensajes y resumen de un lote de sesiones cuyo último mensaje superó el TTL"""
+        from sqlalchemy import delete, exists, func
+        from app.models import ChatSessionMessage, ChatSessionSummary
+        
+        cutoff = self._cutoff()
+        if cutoff is None:
+            return 0
+        
+        db = SessionLocal()
+        try:
+            expired = [
+                session_id for session_id, in db.query(ChatSessionMessage.session_id).group_by(
+                    ChatSessionMessage.session_id
+                ).having(
+                    func.max(ChatSessionMessage.created_at) < cutoff
+                ).limit(batch_sessions or self.PURGE_BATCH_SESSIONS).all()
+            ]
+            if expired:
+                db.query(ChatSessionMessage).filter(
+                    ChatSessionMessage.session_id.in_(expired)
+                ).delete(synchronize_session=False)
+                db.query(ChatSessionSummary).filter(
+                    ChatSessionSummary.session_id.in_(expired)
+                ).delete(synchronize_session=False)
+            # Resúmenes sin mensajes (sesión ya purgada o borrada) y expirados
+            db.execute(delete(ChatSessionSummary).where(
+                ChatSessionSummary.updated_at < cutoff,
+                ~exists().where(ChatSessionMessage.session_id == ChatSessionSummary.session_id)
+            ))
+            db.commit()
+            return len(expired)
+        finally:
+            db.close()
+    
+    def load_summary(self, session_id: str) -> Optional[str]:
+        """Resumen acumulado de la sesión (si la sesión no expiró)"""
+        from sqlalchemy import or_
+        from app.models import ChatSessionMessage, ChatSessionSummary
+        
+        db = SessionLocal()
+        try:
+            query = db.query(ChatSessionSummary.summary).filter(
+                ChatSessionSummary.session_id == session_id
+            )
+            cutoff = self._cutoff()
+            if cutoff is not None:
+                # Vigente si la sesión tuvo actividad dentro del TTL (mismo criterio que los mensajes)
+                query = query.filter(or_(
+                    ChatSessionSummary.updated_at >= cutoff,
+                    db.query(ChatSessionMessage.id).filter(
+                        ChatSessionMessage.session_id == session_id,
+                        ChatSessionMessage.created_at >= cutoff
+                    ).exists()
+                ))
+            row = query.first()
+            return row[0] if row else None
+        finally:
+            db.close()
+    
+    @contextmanager
+    def summary_lock(self, session_id: str) -> Iterator[None]:
+        """Advisory lock de Postgres por sesión (compartido por todos los workers)"""
+        from sqlalchemy import text
+        
+        key = f"chat_summary:{session_id}"
+        db = SessionLocal()
+        try:
+            db.execute(text("SELECT pg_advisory_lock(hashtext(:key))"), {"key": key})
+            try:
+                yield
+            finally:
+                db.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), {"key": key})
+                db.commit()
+        finally:
+            db.close()
+    
+    def save_summary(self, session_id: str, summary: str):
+        """Crea o reemplaza el resumen de la sesión"""
+        from sqlalchemy.dialects.postgresql import insert
+        from app.models import ChatSessionSummary
+        
+        db = SessionLocal()
+        try:
+            statement = insert(ChatSessionSummary).values(
+                session_id=session_id,
+                summary=summary,
+                updated_at=self._now()
+            )
+            statement = statement.on_conflict_do_update(
+                index_elements=["session_id"],
+                set_={"summary": statement.excluded.summary, "updated_at": statement.excluded.updated_at}
+            )
+            db.execute(statement)
+            db.commit()
+        finally:
+            db.close()
+    
+    def delete(self, session_id: str) -> bool:
+        """Elimina todos los mensajes y el resumen de la sesión"""
+        from app.models import ChatSessionMessage, ChatSessionSummary
+        
+        db = SessionLocal()
+        try:
+            deleted = db.query(ChatSessionMessage).filter(
+                ChatSessionMessage.session_id == session_id
+            ).delete(synchronize_session=False)
+            db.query(ChatSessionSummary).filter(
+                ChatSessionSummary.session_id == session_id
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted > 0
+        finally:
+            db.close()
+    
+    def _active_sessions_query(self, db):
+        """session_id de las sesiones cuyo último mensaje está dentro del TTL"""
+        from sqlalchemy import func
+        from app.models import ChatSessionMessage
+        
+        query = db.query(ChatSessionMessage.session_id).group_by(ChatSessionMessage.session_id)
+        cutoff = self._cutoff()
+        if cutoff is not None:
+            query = query.having(func.max(ChatSessionMessage.created_at) >= cutoff)
+        return query
+    
+    def session_ids(self) -> List[str]:
+        """Lista las sesiones con actividad dentro del TTL (solo lectura)"""
+        db = SessionLocal()
+        try:
+            return [session_id for session_id, in self._active_sessions_query(db).all()]
+        finally:
+            db.close()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas globales del almacén"""
+        from sqlalchemy import func
+        from app.models import ChatSessionMessage
+        
+        db = SessionLocal()
+        try:
+            active_sessions = self._active_sessions_query(db).count()
+            # Incluye los mensajes de sesiones expiradas pendientes de purgar
+            message_count = db.query(func.count(ChatSessionMessage.id)).scalar()
+            
+            return {
+                "backend": self.name,
+                "active_sessions": active_sessions,
+                "stored_messages": message_count,
+                "ttl_seconds": self.ttl_seconds
+            }
+        finally:
+            db.close()
+
+
+class RedisSessionBackend(ChatSessionBackend):
+    """
+    Sesiones en listas de un servidor compatible con el protocolo Redis
+    
+    Cada sesión es una lista `{prefix}{session_id}` con un mensaje JSON por
+    elemento, recortada a `max_messages_per_session` y con expiración por
+    inactividad. Se puede pasar un `client` ya creado (por ejemplo un
+    servidor local de pruebas); si no, se conecta a `REDIS_URL`.
+    """
+    
+    name = "redis"
+    
+    # Duración máxima del lock de resumen (cubre la llamada al LLM con reintentos)
+    SUMMARY_LOCK_SECONDS = 300
+    
+    def __init__(
+        self,
+        client: Any = None,
+        url: str = settings.REDIS_URL,
+        key_prefix: str = "petcare:chat:session:",
+        summary_prefix: str = "petcare:chat:summary:",
+        ttl_seconds: int = settings.CHAT_SESSION_TTL_MINUTES * 60,
+        max_messages_per_session: int = settings.CHAT_SESSION_HISTORY_LIMIT
+    ):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, decode_responses=True)
+        
+        self.client = client
+        self.key_prefix = key_prefix
+        self.summary_prefix = summary_prefix
+        self.ttl_seconds = ttl_seconds
+        self.max_messages_per_session = max(1, max_messages_per_session)
+    
+    def _key(self, session_id: str) -> str:
+        return f"{self.key_prefix}{session_id}"
+    
+    def _summary_key(self, session_id: str) -> str:
+        return f"{self.summary_prefix}{session_id}"
+    
+    def load_messages(self, session_id: str, limit: int) -> Optional[List[BaseMessage]]:
+        """Últimos `limit` mensajes de la sesión con un único LRANGE"""
+        items = self.client.lrange(self._key(session_id), -max(limit, 1), -1)
+        return self._decode_messages(items, limit)
+    
+    def load_summary(self, session_id: str) -> Optional[str]:
+        """Resumen acumulado de la sesión"""
+        return self.client.get(self._summary_key(session_id))
+    
+    def load_conversation(self, session_id: str, limit: int) -> Tuple[Optional[List[BaseMessage]], Optional[str]]:
+        """Mensajes y resumen en un solo viaje al servidor (pipeline)"""
+        pipeline = self.client.pipeline()
+        pipeline.lrange(self._key(session_id), -max(limit, 1), -1)
+        pipeline.get(self._summary_key(session_id))
+        items, summary = pipeline.execute()
+        return self._decode_messages(items, limit), summary
+    
+    @contextmanager
+    def summary_lock(self, session_id: str) -> Iterator[None]:
+        """Lock de Redis por sesión; caduca solo si el worker muere a mitad del resumen"""
+        with self.client.lock(f"{self.summary_prefix}lock:{session_id}", timeout=self.SUMMARY_LOCK_SECONDS):
+            yield
+    
+    def save_summary(self, session_id: str, summary: str):
+        """Guarda el resumen con la misma expiración que la sesión"""
+        if self.ttl_seconds > 0:
+            self.client.set(self._summary_key(session_id), summary, ex=self.ttl_seconds)
+        else:
+            self.client.set(self._summary_key(session_id), summary)
+    
+    def _decode_messages(self, items: List[str], limit: int) -> Optional[List[BaseMessage]]:
+        """Convierte los elementos JSON de la lista en mensajes de LangChain"""
+        if not items:
+            return None
+        
+        items = items[-limit:] if limit > 0 else []
+        messages = []
+        for item in items:
+            data = json.loads(item)
+            messages.append(role_to_message(data["role"], data["content"]))
+        return messages
+    
+    def append_messages(self, session_id: str, messages: List[BaseMessage]):
+        """Añade los mensajes del turno, recorta la lista y renueva la expiración"""
+        items = []
+        for message in messages:
+            role = message_to_role(message)
+            if role is not None:
+                items.append(json.dumps({"role": role, "content": message.content}, ensure_ascii=False))
+        if not items:
+            return
+        
+        key = self._key(session_id)
+        pipeline = self.client.pipeline()
+        pipeline.rpush(key, *items)
+        pipeline.ltrim(key, -self.max_messages_per_session, -1)
+        if self.ttl_seconds > 0:
+            pipeline.expire(key, self.ttl_seconds)
+            pipeline.expire(self._summary_key(session_id), self.ttl_seconds)
+        pipeline.execute()
+    
+    def delete(self, session_id: str) -> bool:
+        """Elimina la lista y el resumen de la sesión"""
+        self.client.delete(self._summary_key(session_id))
+        return bool(self.client.delete(self._key(session_id)))
+    
+    def session_ids(self) -> List[str]:
+        """Lista las sesiones existentes (las expiradas las borra el servidor)"""
+        prefix_length = len(self.key_prefix)
+        return [key[prefix_length:] for key in self.client.scan_iter(match=f"{self.key_prefix}*")]
+    
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas globales del almacén"""
+        return {
+            "backend": self.name,
+            "active_sessions": len(self.session_ids()),
+            "ttl_seconds": self.ttl_seconds
+        }
+
+
+def create_session_backend(backend_name: str = settings.CHAT_SESSION_BACKEND) -> ChatSessionBackend:
+    """Crea el almacén de sesiones configurado en CHAT_SESSION_BACKEND"""
+    backend_name = (backend_name or "memory").lower()
+    if backend_name == "postgres":
+        return PostgresSessionBackend()
+    if backend_name == "redis":
+        return RedisSessionBackend()
+    if backend_name != "memory":
+        print(f"⚠️ CHAT_SESSION_BACKEND desconocido '{backend_name}', usando memoria del proceso")
+    return ChatSessionStore()
+
+
+# Instancia global del almacén de sesiones
+chat_session_store = create_session_backend()
@@ -0,0 +1,145 @@
+"""
+Servicio de resumen progresivo de conversaciones del chat con IA
+Condensa en segundo plano los turnos que salen de la ventana de memoria,
+de modo que el prompt lleva un resumen corto más los últimos turnos
+"""
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional, Tuple
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, get_buffer_string
+from app.config import settings
+from app.services.chat_session_store import ChatSessionBackend, chat_session_store
+from app.services.token_metering import token_meter
+
+
+class ConversationSummaryService:
+    """
+    Mantiene el resumen acumulado de cada sesión fuera del ciclo de la petición
+    
+    Cada sesión tiene su cola de resúmenes y como mucho un hilo del pool
+    vaciándola, así los mensajes entran al resumen en el orden en que salieron
+    de la ventana aunque haya varios hilos; sesiones distintas sí se resumen
+    en paralelo. Entre procesos (almacenes postgres y redis) cada resumen se
+    hace con el lock de la sesión del almacén, así dos workers no pisan el
+    resumen del otro.
+    """
+    
+    SUMMARY_PROMPT = """Eres el asistente de un veterinario. Mantienes un resumen breve de una consulta en curso sobre una mascota.
+
+Combina el resumen actual con los nuevos mensajes y devuelve un único resumen actualizado en español, de como máximo {max_words} palabras.
+Conserva los datos que el veterinario necesita recordar: nombre, especie, raza, edad y peso de la mascota, síntomas y su evolución, medicamentos y dosis, diagnósticos, recomendaciones dadas y preguntas pendientes.
+No inventes datos ni añadas consejos nuevos. Devuelve solo el resumen.
+
+**RESUMEN ACTUAL:**
+{summary}
+
+**NUEVOS MENSAJES:**
+{new_lines}
+
+**RESUMEN ACTUALIZADO:**"""
+    
+    def __init__(
+        self,
+        session_store: ChatSessionBackend = chat_session_store,
+        max_workers: int = settings.CHAT_SUMMARY_WORKERS
+    ):
+        """Inicializa el pool de hilos de resumen"""
+        self.session_store = session_store
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers),
+            thread_name_prefix="chat-summary"
+        )
+        # Sesión -> resúmenes pendientes en orden (solo sesiones con trabajo en curso)
+        self._queues: Dict[str, Deque[Tuple[List[BaseMessage], Optional[str]]]] = {}
+        self._queues_lock = threading.Lock()
+        self._llm = None
+    
+    def enqueue_fold(self, session_id: str, messages: List[BaseMessage], user_id: Optional[str] = None):
+        """
+        Encola la incorporación al resumen de los mensajes que salieron de la ventana
+        
+        Los tokens del resumen cuentan para el límite diario de `user_id` (por
+        defecto, el usuario de la petición en curso).
+        """
+        if not messages:
+            return
+        user_id = user_id or token_meter.current_user_id()
+        with self._queues_lock:
+            queue = self._queues.get(session_id)
+            if queue is not None:
+                # Ya hay un hilo con esta sesión: lo hará a continuación
+                queue.append((list(messages), user_id))
+                return
+            self._queues[session_id] = deque([(list(messages), user_id)])
+        self._executor.submit(self._drain_session, session_id)
+    
+    def shutdown(self):
+        """Detiene el pool de hilos esperando los resúmenes en curso"""
+        self._executor.shutdown(wait=True)
+    
+    def _get_llm(self):
+        """Modelo usado para resumir: el del servicio LangChain (mismos clientes HTTP) sin temperatura"""
+        if self._llm is None:
+            from app.services.langchain_service import get_langchain_service
+            self._llm = get_langchain_service().llm.bind(temperature=0)
+        return self._llm
+    
+    def _invoke_llm(self, messages: List[BaseMessage]):
+        """Llama al modelo de resumen con plazo, reintentos y circuit breaker"""
+        from app.services.langchain_service import get_langchain_service
+        return get_langchain_service().llm_caller.call(lambda: self._get_llm().invoke(messages))
+    
+    def _drain_session(self, session_id: str):
+        """Tarea del pool: resume en orden lo encolado para la sesión hasta vaciar su cola"""
+        while True:
+            with self._queues_lock:
+                queue = self._queues[session_id]
+                if not queue:
+                    del self._queues[session_id]
+                    return
+                messages, user_id = queue.popleft()
+            self._run_fold(session_id, messages, user_id)
+    
+    def _run_fold(self, session_id: str, messages: List[BaseMessage], user_id: Optional[str]):
+        """Resume un lote registrando errores sin afectar al chat"""
+        try:
+            with self.session_store.summary_lock(session_id):
+                self.fold(session_id, messages, user_id)
+        except Exception as e:
+            print(f"❌ Error resumiendo sesión {session_id}: {str(e)}")
+    
+    def fold(self, session_id: str, messages: List[BaseMessage], user_id: Optional[str] = None) -> Optional[str]:
+        """Combina el resumen actual de la sesión con `messages` y lo guarda"""
+        from app.services.langchain_service import LangChainService
+        
+        current_summary = self.session_store.load_summary(session_id) or ""
+        prompt = self.SUMMARY_PROMPT.format(
+            max_words=settings.CHAT_SUMMARY_MAX_WORDS,
+            summary=current_summary or "(vacío)",
+            new_lines=get_buffer_string(messages, human_prefix="Usuario", ai_prefix="Veterinario")
+        )
+        
+        llm_messages = [
+            SystemMessage(content="Resumes consultas veterinarias de forma fiel y concisa."),
+            HumanMessage(content=prompt)
+        ]
+        response = self._invoke_llm(llm_messages)
+        content = response.content if hasattr(response, 'content') else str(response)
+        if user_id is not None:
+            token_meter.record_for(
+                user_id,
+                LangChainService._count_prompt_tokens(llm_messages),
+                LangChainService._completion_tokens(response, content)
+            )
+        summary = content.strip()
+        if not summary:
+            return None
+        
+        self.session_store.save_summary(session_id, summary)
+        print(f"📝 Resumen actualizado para sesión {session_id} (+{len(messages)} mensajes)")
+        return summary
+
+
+# Instancia global del servicio
+conversation_summary_service = ConversationSummaryService()
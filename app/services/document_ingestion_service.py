@@ -0,0 +1,342 @@
+"""
+Servicio de ingesta de documentos para el chat con IA (RAG)
+Extrae, divide y calcula embeddings de cada PDF en segundo plano,
+fuera del ciclo de la petición del usuario
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Set
+from app.config import settings
+from app.database import SessionLocal, engine
+
+
+class DocumentIngestionService:
+    """Pipeline en segundo plano que mantiene el índice vectorial de cada mascota"""
+    
+    STATUS_PENDING = "pending"
+    STATUS_INDEXED = "indexed"
+    STATUS_FAILED = "failed"
+    
+    def __init__(self, max_workers: int = settings.RAG_INGESTION_WORKERS):
+        """Inicializa el pool de hilos de ingesta"""
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers),
+            thread_name_prefix="doc-ingestion"
+        )
+        self._lock = threading.Lock()
+        self._pet_locks: Dict[str, threading.Lock] = {}
+        self._inflight: Set[str] = set()
+    
+    # ============================================
+    # ENCOLADO (llamado desde los controladores)
+    # ============================================
+    
+    def enqueue_ingestion(self, document_id: str) -> bool:
+        """Encola la ingesta de un documento recién subido"""
+        return self._submit(f"ingest:{document_id}", self.ingest_document, str(document_id))
+    
+    def enqueue_removal(self, pet_id: str, document_id: str) -> bool:
+        """Encola la eliminación de los embeddings de un documento borrado"""
+        return self._submit(f"remove:{document_id}", self.remove_document, str(pet_id), str(document_id))
+    
+    def enqueue_reindex(self, pet_id: str) -> bool:
+        """Encola la reconstrucción completa del índice de una mascota"""
+        return self._submit(f"reindex:{pet_id}", self.reindex_pet, str(pet_id))
+    
+    def shutdown(self):
+        """Detiene el pool de hilos esperando las tareas en curso"""
+        self._executor.shutdown(wait=True)
+    
+    def _submit(self, key: str, func, *args) -> bool:
+        """Envía una tarea al pool evitando duplicar tareas ya en curso"""
+        with self._lock:
+            if key in self._inflight:
+                return False
+            self._inflight.add(key)
+        
+        self._executor.submit(self._run, key, func, *args)
+        return True
+    
+    def _run(self, key: str, func, *args):
+        """Ejecuta una tarea del pool registrando errores"""
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"❌ Error en tarea de ingesta {key}: {str(e)}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            with self._lock:
+                self._inflight.discard(key)
+    
+    def _get_pet_lock(self, pet_id: str) -> threading.Lock:
+        """Lock por mascota: serializa las operaciones sobre su índice"""
+        with self._lock:
+            if pet_id not in self._pet_locks:
+                self._pet_locks[pet_id] = threading.Lock()
+            return self._pet_locks[pet_id]
+    
+    @contextmanager
+    def _pet_build_lock(self, pet_id: str):
+        """
+        Serializa las operaciones sobre el índice de una mascota entre hilos y procesos
+        
+        Además del lock del proceso toma un advisory lock de PostgreSQL, de
+        modo que dos workers del servidor no construyen a la vez el índice de
+        la misma mascota: el segundo espera y, al entrar, encuentra el trabajo
+        ya hecho (ver reindex_pet / ingest_document).
+        """
+        from sqlalchemy import text
+        
+        key = {"key": f"pet-index:{pet_id}"}
+        with self._get_pet_lock(pet_id):
+            connection = engine.connect()
+            try:
+                connection.execute(text("SELECT pg_advisory_lock(hashtext(:key))"), key)
+                # El lock es de sesión: no hace falta mantener la transacción abierta
+                connection.commit()
+                try:
+                    yield
+                finally:
+                    connection.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), key)
+                    connection.commit()
+            finally:
+                connection.close()
+    
+    # ============================================
+    # TAREAS (se ejecutan en el pool)
+    # ============================================
+    
+    def ingest_document(self, document_id: str):
+        """Extrae, divide y guarda los embeddings de un documento"""
+        from app.models import PetPhoto
+        from app.services.langchain_service import get_langchain_service
+        
+        db = SessionLocal()
+        try:
+            document = db.query(PetPhoto).filter(PetPhoto.id == document_id).first()
+            if not document or document.file_type != "document":
+                print(f"⚠️ Documento {document_id} no existe, se omite la ingesta")
+                return
+            
+            pet_id = str(document.pet_id)
+            
+            with self._pet_build_lock(pet_id):
+                ingestion = self._get_or_create_ingestion(db, document)
+                if self._is_current(ingestion, document):
+                    # Otra tarea (p. ej. una reconstrucción) ya lo indexó mientras esperaba
+                    print(f"♻️ Documento {document_id} ya indexado, se omite la ingesta")
+                    return
+                
+                ingestion.status = self.STATUS_PENDING
+                ingestion.error = None
+                ingestion.attempts = (ingestion.attempts or 0) + 1
+                db.commit()
+                
+                print(f"📥 Ingestando documento {document_id} (mascota {pet_id})")
+                
+                try:
+                    index = self._get_or_create_index(db, pet_id)
+                    chunk_count = get_langchain_service().index_document(pet_id, index.generation, document)
+                except Exception as e:
+                    db.rollback()
+                    print(f"❌ Ingesta fallida para documento {document_id}: {str(e)}")
+                    ingestion.status = self.STATUS_FAILED
+                    ingestion.error = str(e)[:2000]
+                    self._commit_if_document_exists(db, document_id)
+                    return
+                
+                ingestion.status = self.STATUS_INDEXED
+                ingestion.chunk_count = chunk_count
+                ingestion.indexed_at = datetime.now()
+                self._commit_if_document_exists(db, document_id, refresh_index=index)
+        finally:
+            db.close()
+    
+    def remove_document(self, pet_id: str, document_id: str):
+        """Elimina solo los embeddings de un documento del índice de la mascota"""
+        from app.models import PetDocumentIndex
+        from app.services.langchain_service import LangChainService
+        
+        db = SessionLocal()
+        try:
+            with self._pet_build_lock(pet_id):
+                index = db.query(PetDocumentIndex).filter(
+                    PetDocumentIndex.pet_id == pet_id
+                ).first()
+                if not index:
+                    return
+                
+                removed = LangChainService.delete_document_vectors(document_id)
+                print(f"🗑️ Eliminados {removed} embeddings del documento {document_id}")
+                
+                self._refresh_index(db, index)
+                db.commit()
+        finally:
+            db.close()
+    
+    def reindex_pet(self, pet_id: str):
+        """
+        Reconstruye el índice de la mascota en una nueva generación de chunks
+        
+        Los documentos se indexan en una generación nueva; el registro pasa a
+        apuntar a ella solo al terminar y los chunks anteriores se eliminan en
+        una sentencia, de modo que el chat sigue consultando la generación
+        previa mientras tanto.
+        """
+        from app.models import PetPhoto, PetDocumentIndex, PetDocumentIngestion
+        from app.services.langchain_service import LangChainService, get_langchain_service
+        
+        db = SessionLocal()
+        try:
+            with self._pet_build_lock(pet_id):
+                index = db.query(PetDocumentIndex).filter(
+                    PetDocumentIndex.pet_id == pet_id
+                ).first()
+                documents = db.query(PetPhoto).filter(
+                    PetPhoto.pet_id == pet_id,
+                    PetPhoto.file_type == "document"
+                ).all()
+                
+                if not documents:
+                    if index:
+                        LangChainService.delete_pet_vectors(pet_id)
+                        db.delete(index)
+                        db.commit()
+                    return
+                
+                # Si otra reconstrucción terminó mientras se esperaba el lock, reutilizarla
+                indexed_ids = {
+                    row.document_id
+                    for row in db.query(PetDocumentIngestion).filter(
+                        PetDocumentIngestion.pet_id == pet_id,
+                        PetDocumentIngestion.status == self.STATUS_INDEXED
+                    ).all()
+                }
+                if (
+                    index
+                    and all(document.id in indexed_ids for document in documents)
+                    and index.fingerprint == LangChainService.compute_documents_fingerprint(documents)
+                ):
+                    print(f"♻️ Índice de mascota {pet_id} ya actualizado, se omite la reconstrucción")
+                    return
+                
+                service = get_langchain_service()
+                generation = (index.generation + 1) if index else 1
+                print(f"🔧 Reconstruyendo índice (generación {generation}) para mascota {pet_id} ({len(documents)} documentos)")
+                
+                # Descarga y extracción de todos los PDFs en paralelo
+                prepared = service.prepare_document_chunks(documents)
+                
+                for document in documents:
+                    ingestion = self._get_or_create_ingestion(db, document)
+                    ingestion.attempts = (ingestion.attempts or 0) + 1
+                    try:
+                        chunks = prepared[str(document.id)]
+                        if isinstance(chunks, Exception):
+                            raise chunks
+                        ingestion.chunk_count = service.index_document(pet_id, generation, document, chunks=chunks)
+                        ingestion.status = self.STATUS_INDEXED
+                        ingestion.error = None
+                        ingestion.indexed_at = datetime.now()
+                    except Exception as e:
+                        print(f"❌ Error reindexando documento {document.id}: {str(e)}")
+                        ingestion.status = self.STATUS_FAILED
+                        ingestion.error = str(e)[:2000]
+                
+                if not index:
+                    index = self._get_or_create_index(db, pet_id)
+                index.generation = generation
+                db.flush()
+                self._refresh_index(db, index)
+                db.commit()
+                
+                # Chunks de generaciones anteriores (ya nadie las consulta)
+                LangChainService.delete_pet_vectors(pet_id, keep_generation=generation)
+                
+                print(f"✅ Índice v{index.version} listo para mascota {pet_id}")
+        finally:
+            db.close()
+    
+    # ============================================
+    # AUXILIARES
+    # ============================================
+    
+    def _is_current(self, ingestion, document) -> bool:
+        """El documento ya está indexado y no cambió desde entonces"""
+        if ingestion.status != self.STATUS_INDEXED or not ingestion.indexed_at:
+            return False
+        changed_at = document.updated_at or document.created_at
+        return changed_at is None or ingestion.indexed_at >= changed_at
+    
+    def _get_or_create_ingestion(self, db, document):
+        """Obtiene o crea el registro de estado de ingesta de un documento"""
+        from app.models import PetDocumentIngestion
+        
+        ingestion = db.query(PetDocumentIngestion).filter(
+            PetDocumentIngestion.document_id == document.id
+        ).first()
+        if not ingestion:
+            ingestion = PetDocumentIngestion(
+                document_id=document.id,
+                pet_id=document.pet_id,
+                status=self.STATUS_PENDING
+            )
+            db.add(ingestion)
+        return ingestion
+    
+    def _get_or_create_index(self, db, pet_id: str):
+        """Obtiene o crea el registro del índice vectorial de la mascota"""
+        from app.models import PetDocumentIndex
+        
+        index = db.query(PetDocumentIndex).filter(
+            PetDocumentIndex.pet_id == pet_id
+        ).first()
+        if not index:
+            index = PetDocumentIndex(
+                pet_id=pet_id,
+                generation=1,
+                fingerprint="",
+                version=0
+            )
+            db.add(index)
+            db.flush()
+        return index
+    
+    def _refresh_index(self, db, index):
+        """Recalcula huella, conteos y versión del índice a partir de los documentos indexados"""
+        from app.models import PetPhoto, PetDocumentIngestion
+        from app.services.langchain_service import LangChainService
+        
+        rows = db.query(PetPhoto, PetDocumentIngestion).join(
+            PetDocumentIngestion, PetDocumentIngestion.document_id == PetPhoto.id
+        ).filter(
+            PetPhoto.pet_id == index.pet_id,
+            PetDocumentIngestion.status == self.STATUS_INDEXED
+        ).all()
+        
+        indexed_documents = [photo for photo, _ in rows]
+        index.fingerprint = LangChainService.compute_documents_fingerprint(indexed_documents)
+        index.document_count = len(indexed_documents)
+        index.chunk_count = sum(ingestion.chunk_count or 0 for _, ingestion in rows)
+        index.version = (index.version or 0) + 1
+        index.built_at = datetime.now()
+    
+    def _commit_if_document_exists(self, db, document_id: str, refresh_index=None):
+        """Confirma cambios salvo que el documento se haya eliminado durante la ingesta"""
+        try:
+            if refresh_index is not None:
+                db.flush()
+                self._refresh_index(db, refresh_index)
+            db.commit()
+        except Exception as e:
+            # El documento se eliminó mientras se procesaba: la tarea de
+            # eliminación (serializada por el lock de la mascota) limpia sus vectores
+            db.rollback()
+            print(f"⚠️ Documento {document_id} eliminado durante la ingesta: {str(e)}")
+
+
+# Instancia global del servicio
+document_ingestion_service = DocumentIngestionService()
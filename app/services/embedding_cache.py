@@ -0,0 +1,119 @@
+"""
+Caché persistente de embeddings para RAG
+Evita recalcular en OpenAI los embeddings de chunks con texto ya conocido
+"""
+import hashlib
+from typing import Dict, List
+from langchain_core.embeddings import Embeddings
+from sqlalchemy.dialects.postgresql import insert
+from app.database import SessionLocal
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Envoltorio de un modelo de embeddings con caché en PostgreSQL
+    
+    Los embeddings de documentos se guardan por (modelo, sha256 del texto).
+    Antes de llamar a la API se hace una única consulta masiva con todos los
+    hashes del lote; solo los textos que no están en caché se envían al modelo.
+    Las consultas (`embed_query`) no se cachean aquí.
+    """
+    
+    def __init__(self, underlying: Embeddings, model_name: str):
+        """
+        Args:
+            underlying: Modelo de embeddings real (ej: OpenAIEmbeddings)
+            model_name: Nombre del modelo, forma parte de la clave de caché
+        """
+        self.underlying = underlying
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """sha256 hexadecimal del texto de un chunk"""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
+    def _lookup(self, hashes: List[str]) -> Dict[str, List[float]]:
+        """Obtiene en una sola consulta los embeddings ya cacheados"""
+        from app.models import EmbeddingCache
+        
+        if not hashes:
+            return {}
+        
+        db = SessionLocal()
+        try:
+            rows = db.query(EmbeddingCache.content_hash, EmbeddingCache.embedding).filter(
+                EmbeddingCache.model == self.model_name,
+                EmbeddingCache.content_hash.in_(hashes)
+            ).all()
+            return {content_hash: list(embedding) for content_hash, embedding in rows}
+        finally:
+            db.close()
+    
+    def _store(self, entries: Dict[str, List[float]]):
+        """Guarda embeddings nuevos (ignora los que otro proceso ya insertó)"""
+        from app.models import EmbeddingCache
+        
+        if not entries:
+            return
+        
+        db = SessionLocal()
+        try:
+            statement = insert(EmbeddingCache).values([
+                {"model": self.model_name, "content_hash": content_hash, "embedding": embedding}
+                for content_hash, embedding in entries.items()
+            ]).on_conflict_do_nothing(index_elements=["model", "content_hash"])
+            db.execute(statement)
+            db.commit()
+        finally:
+            db.close()
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Calcula embeddings de documentos usando la caché cuando es posible"""
+        if not texts:
+            return []
+        
+        hashes = [self.hash_text(text) for text in texts]
+        
+        try:
+            cached = self._lookup(list(set(hashes)))
+        except Exception as e:
+            print(f"⚠️ Error consultando caché de embeddings: {str(e)}")
+            cached = {}
+        
+        # Textos únicos que faltan en caché (los duplicados del lote se calculan una vez)
+        missing: Dict[str, str] = {}
+        for content_hash, text in zip(hashes, texts):
+            if content_hash not in cached and content_hash not in missing:
+                missing[content_hash] = text
+        
+        hits = len(texts) - sum(1 for content_hash in hashes if content_hash in missing)
+        self.hits += hits
+        self.misses += len(missing)
+        print(f"   🧠 Caché de embeddings: {hits} aciertos, {len(missing)} por calcular")
+        
+        if missing:
+            new_embeddings = self.underlying.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), new_embeddings))
+            cached.update(computed)
+            
+            try:
+                self._store(computed)
+            except Exception as e:
+                print(f"⚠️ Error guardando caché de embeddings: {str(e)}")
+        
+        return [cached[content_hash] for content_hash in hashes]
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Las consultas se envían directamente al modelo"""
+        return self.underlying.embed_query(text)
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        """Versión asíncrona de embed_query (usa el cliente asíncrono del modelo)"""
+        return await self.underlying.aembed_query(text)
+    
+    def stats(self) -> Dict[str, int]:
+        """Aciertos y fallos de la caché de embeddings en este proceso"""
+        return {"hits": self.hits, "misses": self.misses}
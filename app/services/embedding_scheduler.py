@@ -0,0 +1,235 @@
+"""
+Planificador de embeddings para la ingesta de documentos
+Agrupa los chunks en lotes por tokens, limita las peticiones simultáneas al
+proveedor y reintenta los errores transitorios (429, timeouts, 5xx) con
+espera exponencial y jitter
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from app.config import settings
+from app.services.token_budget import TokenCounter
+from app.services.llm_resilience import CircuitBreaker, ResilientCaller, backoff_seconds, embeddings_breaker, is_transient_error
+
+
+class AdaptiveLimiter:
+    """
+    Límite de peticiones simultáneas que se ajusta a los 429 del proveedor
+    
+    Cada 429 reduce el límite a la mitad; cada `recovery_successes` lotes
+    correctos seguidos lo sube en uno, hasta `max_limit` (AIMD).
+    """
+    
+    def __init__(self, max_limit: int, recovery_successes: int = 5):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.recovery_successes = recovery_successes
+        self._active = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+    
+    def acquire(self):
+        with self._condition:
+            while self._active >= self.limit:
+                self._condition.wait()
+            self._active += 1
+    
+    def release(self, rate_limited: bool = False):
+        with self._condition:
+            self._active -= 1
+            if rate_limited:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.recovery_successes and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+
+class ScheduledEmbeddings(Embeddings):
+    """
+    Envoltorio de un modelo de embeddings con lotes por tokens, concurrencia acotada y backoff
+    
+    `embed_documents` divide los textos en lotes de como mucho `max_batch_tokens`
+    tokens y `max_batch_inputs` textos, y los envía en paralelo por un pool
+    compartido por todo el proceso (las ingestas simultáneas comparten el
+    límite). Las consultas (`embed_query`) se envían directamente, con los
+    mismos reintentos. Lotes y consultas comparten el circuit breaker de
+    embeddings: con el proveedor caído fallan al instante.
+    """
+    
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model_name: str = settings.OPENAI_EMBEDDING_MODEL,
+        max_batch_tokens: int = settings.EMBEDDING_BATCH_MAX_TOKENS,
+        max_batch_inputs: int = settings.EMBEDDING_BATCH_MAX_INPUTS,
+        max_concurrency: int = settings.EMBEDDING_MAX_CONCURRENCY,
+        max_retries: int = settings.EMBEDDING_MAX_RETRIES,
+        max_backoff_seconds: float = settings.EMBEDDING_BACKOFF_MAX_SECONDS,
+        breaker: CircuitBreaker = embeddings_breaker
+    ):
+        """
+        Args:
+            underlying: Modelo de embeddings real (ej: OpenAIEmbeddings, sin reintentos propios)
+            model_name: Modelo de embeddings (para contar tokens con su codificación)
+            max_batch_tokens: Tokens máximos por petición
+            max_batch_inputs: Textos máximos por petición
+            max_concurrency: Peticiones simultáneas máximas
+            max_retries: Reintentos por lote ante errores transitorios
+            max_backoff_seconds: Espera máxima entre reintentos
+            breaker: Circuit breaker del proveedor de embeddings
+        """
+        self.underlying = underlying
+        self.max_batch_tokens = max(1, max_batch_tokens)
+        self.max_batch_inputs = max(1, max_batch_inputs)
+        self.max_retries = max_retries
+        self.max_backoff_seconds = max_backoff_seconds
+        self.breaker = breaker
+        self._query_caller = ResilientCaller(
+            "embeddings",
+            breaker,
+            timeout_seconds=settings.EMBEDDING_REQUEST_TIMEOUT_SECONDS,
+            max_retries=max_retries,
+            max_backoff_seconds=max_backoff_seconds
+        )
+        self._token_counter = TokenCounter(model_name)
+        self._limiter = AdaptiveLimiter(max_concurrency)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_concurrency),
+            thread_name_prefix="embeddings"
+        )
+        self._stats_lock = threading.Lock()
+        self.embedded = 0
+        self.batches = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.busy_seconds = 0.0
+    
+    # ============================================
+    # LOTES
+    # ============================================
+    
+    def build_batches(self, texts: List[str]) -> List[List[int]]:
+        """Índices de los textos agrupados en lotes que respetan los límites de tokens y de textos"""
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        for position, text in enumerate(texts):
+            tokens = self._token_counter.count(text)
+            if current and (
+                current_tokens + tokens > self.max_batch_tokens
+                or len(current) >= self.max_batch_inputs
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(position)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+    
+    # ============================================
+    # REINTENTOS
+    # ============================================
+    
+    @staticmethod
+    def _is_rate_limited(error: Exception) -> bool:
+        """True si el error es un 429 del proveedor"""
+        status = getattr(error, "status_code", None)
+        if status is None:
+            status = getattr(getattr(error, "response", None), "status_code", None)
+        return status == 429 or type(error).__name__ == "RateLimitError"
+    
+    def _backoff_seconds(self, attempt: int, error: Exception) -> float:
+        """Retry-After del proveedor si lo indica; si no, exponencial con jitter completo"""
+        return backoff_seconds(attempt, error, self.max_backoff_seconds)
+    
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Envía un lote respetando el límite de concurrencia y reintentando los errores transitorios"""
+        attempt = 0
+        while True:
+            probe = self.breaker.before_call()
+            self._limiter.acquire()
+            rate_limited = False
+            try:
+                vectors = self.underlying.embed_documents(texts)
+                self.breaker.record_success()
+                return vectors
+            except Exception as e:
+                if not is_transient_error(e):
+                    raise
+                self.breaker.record_failure()
+                # Solo los 429 reducen la concurrencia; timeouts y 5xx solo se reintentan
+                rate_limited = self._is_rate_limited(e)
+                if attempt >= self.max_retries:
+                    raise
+                wait = self._backoff_seconds(attempt, e)
+                reason = "Rate limit" if rate_limited else type(e).__name__
+            finally:
+                self._limiter.release(rate_limited=rate_limited)
+                self.breaker.end_probe(probe)
+            
+            attempt += 1
+            with self._stats_lock:
+                self.rate_limited += int(rate_limited)
+                self.retries += 1
+            print(f"   ⏳ {reason} en embeddings, reintento {attempt}/{self.max_retries} en {wait:.1f}s")
+            time.sleep(wait)
+    
+    # ============================================
+    # INTERFAZ Embeddings
+    # ============================================
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Calcula embeddings de documentos en lotes paralelos (mismo orden que `texts`)"""
+        if not texts:
+            return []
+        
+        started = time.monotonic()
+        batches = self.build_batches(texts)
+        futures = [
+            self._executor.submit(self._embed_batch, [texts[position] for position in batch])
+            for batch in batches
+        ]
+        
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for batch, future in zip(batches, futures):
+            for position, vector in zip(batch, future.result()):
+                vectors[position] = vector
+        
+        elapsed = time.monotonic() - started
+        with self._stats_lock:
+            self.embedded += len(texts)
+            self.batches += len(batches)
+            self.busy_seconds += elapsed
+        print(
+            f"   ⚡ {len(texts)} embeddings en {len(batches)} lotes, {elapsed:.1f}s "
+            f"({len(texts) / elapsed if elapsed else 0:.0f}/s, concurrencia {self._limiter.limit})"
+        )
+        return vectors
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embedding de una consulta (sin lotes, con plazo, reintentos y breaker)"""
+        return self._query_caller.call(lambda: self.underlying.embed_query(text))
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        """Versión asíncrona de embed_query (usa el cliente asíncrono del modelo)"""
+        return await self._query_caller.acall(lambda: self.underlying.aembed_query(text))
+    
+    def stats(self) -> Dict[str, Any]:
+        """Embeddings calculados, lotes, 429 y reintentos, y embeddings por segundo en este proceso"""
+        with self._stats_lock:
+            return {
+                "embedded": self.embedded,
+                "batches": self.batches,
+                "rate_limited": self.rate_limited,
+                "retries": self.retries + self._query_caller.retries,
+                "breaker": self.breaker.state,
+                "concurrency_limit": self._limiter.limit,
+                "embeddings_per_second": round(self.embedded / self.busy_seconds, 1) if self.busy_seconds else 0.0
+            }
@@ -0,0 +1,207 @@
+"""
+Recuperación híbrida para RAG
+Combina la búsqueda vectorial (índice HNSW de pgvector) con la búsqueda de
+texto completo de PostgreSQL (índice GIN sobre tsvector) mediante
+reciprocal rank fusion, en una sola consulta
+"""
+import asyncio
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from app.config import settings
+from app.services.chat_metrics import chat_metrics
+
+
+# Las expresiones deben coincidir con las de los índices de pet_document_chunks
+# (migración a6c4e8f2b913) para que PostgreSQL pueda usarlos
+HYBRID_SEARCH_SQL = """
+WITH semantic_candidates AS (
+    SELECT c.id, c.embedding <=> CAST(:embedding AS vector({dimensions})) AS distance
+    FROM petcare.pet_document_chunks c
+    WHERE c.pet_id = :pet_id AND c.generation = :generation
+    ORDER BY distance
+    LIMIT :candidates
+),
+semantic AS (
+    SELECT id, ROW_NUMBER() OVER (ORDER BY distance) AS rank FROM semantic_candidates
+),
+keyword_candidates AS (
+    SELECT c.id, ts_rank_cd(to_tsvector('{text_config}'::regconfig, c.content), query) AS score
+    FROM petcare.pet_document_chunks c, to_tsquery('{text_config}'::regconfig, :tsquery) query
+    WHERE c.pet_id = :pet_id AND c.generation = :generation
+      AND to_tsvector('{text_config}'::regconfig, c.content) @@ query
+    ORDER BY score DESC
+    LIMIT :candidates
+),
+keyword AS (
+    SELECT id, ROW_NUMBER() OVER (ORDER BY score DESC) AS rank FROM keyword_candidates
+)
+SELECT c.id, c.content, c.metadata,
+       COALESCE(1.0 / (:rrf_k + semantic.rank), 0) + COALESCE(1.0 / (:rrf_k + keyword.rank), 0) AS rrf_score
+FROM semantic
+FULL OUTER JOIN keyword ON keyword.id = semantic.id
+JOIN petcare.pet_document_chunks c ON c.id = COALESCE(semantic.id, keyword.id)
+ORDER BY rrf_score DESC
+LIMIT :k
+"""
+
+# Chunks ya recuperados antes (caché de recuperaciones), por clave primaria
+CHUNKS_BY_ID_SQL = """
+SELECT c.id, c.content, c.metadata
+FROM petcare.pet_document_chunks c
+WHERE c.id = ANY(CAST(:ids AS uuid[])) AND c.pet_id = :pet_id AND c.generation = :generation
+"""
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever de los chunks de una mascota que fusiona búsqueda vectorial y léxica
+    
+    La búsqueda léxica recupera los chunks que la vectorial pasa por alto
+    (nombres de medicamentos, lotes de vacunas, valores de laboratorio). Cada
+    búsqueda aporta `candidates` resultados y se puntúan con
+    1 / (rrf_k + posición) sumado entre ambas listas. Con `hybrid=False` solo
+    se usa la búsqueda vectorial.
+    
+    Con `cache` e `index_version` (PetDocumentIndex.version) las preguntas
+    repetidas reutilizan su embedding y los ids de los chunks recuperados
+    mientras el índice de la mascota no cambie.
+    """
+    
+    engine: Any
+    embeddings: Embeddings
+    pet_id: str
+    generation: int
+    hybrid: bool = settings.RAG_HYBRID_SEARCH
+    k: int = settings.RAG_TOP_K_RESULTS
+    candidates: int = settings.RAG_HYBRID_CANDIDATES
+    rrf_k: int = settings.RAG_RRF_K
+    dimensions: int = settings.RAG_EMBEDDING_DIMENSIONS
+    text_search_config: str = settings.RAG_TEXT_SEARCH_CONFIG
+    ef_search: int = settings.RAG_HNSW_EF_SEARCH
+    index_version: Optional[int] = None
+    cache: Any = None
+    
+    @staticmethod
+    def build_tsquery(query: str) -> str:
+        """Une los términos de la pregunta con OR (to_tsquery descarta las palabras vacías)"""
+        terms = re.findall(r"\w+", query.lower())
+        return " | ".join(dict.fromkeys(terms))
+    
+    def _build_sql(self) -> str:
+        """Consulta con la dimensión y la configuración de texto del índice"""
+        if not re.fullmatch(r"[a-z_]+", self.text_search_config):
+            raise ValueError(f"Configuración de texto completo no válida: {self.text_search_config}")
+        return HYBRID_SEARCH_SQL.format(
+            dimensions=int(self.dimensions),
+            text_config=self.text_search_config
+        )
+    
+    def _configure_ann_scan(self, connection):
+        """
+        Amplía la exploración de HNSW para esta transacción
+        
+        El filtro por mascota se aplica después de recorrer el índice; sin
+        escaneo iterativo (pgvector >= 0.8) una mascota con pocos chunks podría
+        quedarse sin resultados.
+        """
+        from sqlalchemy import text
+        from sqlalchemy.exc import DBAPIError
+        
+        connection.execute(text(f"SET LOCAL hnsw.ef_search = {max(int(self.ef_search), int(self.candidates))}"))
+        try:
+            with connection.begin_nested():
+                connection.execute(text("SET LOCAL hnsw.iterative_scan = relaxed_order"))
+        except DBAPIError:
+            pass
+    
+    def _search(self, query: str, embedding: List[float]) -> Tuple[List[Document], List[str]]:
+        """Ejecuta la consulta híbrida con el embedding de la pregunta (devuelve chunks e ids)"""
+        from sqlalchemy import text
+        
+        params: Dict[str, Any] = {
+            "pet_id": str(self.pet_id),
+            "generation": self.generation,
+            "embedding": "[" + ",".join(str(float(value)) for value in embedding) + "]",
+            # Sin términos la parte léxica no devuelve filas
+            "tsquery": self.build_tsquery(query) if self.hybrid else "",
+            "candidates": self.candidates,
+            "rrf_k": self.rrf_k,
+            "k": self.k,
+        }
+        
+        with self.engine.begin() as connection:
+            self._configure_ann_scan(connection)
+            rows = connection.execute(text(self._build_sql()), params).fetchall()
+        
+        documents = [
+            Document(page_content=document or "", metadata=metadata or {})
+            for _, document, metadata, _ in rows
+        ]
+        return documents, [str(chunk_id) for chunk_id, _, _, _ in rows]
+    
+    def _fetch_chunks(self, chunk_ids: List[str]) -> List[Document]:
+        """Carga chunks por id en el orden dado (los eliminados desde entonces se omiten)"""
+        from sqlalchemy import text
+        
+        if not chunk_ids:
+            return []
+        
+        params = {"ids": chunk_ids, "pet_id": str(self.pet_id), "generation": self.generation}
+        with self.engine.connect() as connection:
+            rows = connection.execute(text(CHUNKS_BY_ID_SQL), params).fetchall()
+        
+        by_id = {str(chunk_id): (document, metadata) for chunk_id, document, metadata in rows}
+        return [
+            Document(page_content=by_id[chunk_id][0] or "", metadata=by_id[chunk_id][1] or {})
+            for chunk_id in chunk_ids
+            if chunk_id in by_id
+        ]
+    
+    def _cache_lookup(self, query: str) -> Tuple[Optional[List[float]], Optional[List[str]]]:
+        """Embedding e ids cacheados de la pregunta (None si no hay caché para este índice)"""
+        if self.cache is None or self.index_version is None:
+            return None, None
+        return self.cache.lookup(self.pet_id, self.index_version, query)
+    
+    def _search_and_cache(self, query: str, embedding: List[float]) -> List[Document]:
+        """Ejecuta la consulta híbrida y guarda el resultado en la caché"""
+        documents, chunk_ids = self._search(query, embedding)
+        if self.cache is not None and self.index_version is not None:
+            self.cache.store(self.pet_id, self.index_version, query, embedding, chunk_ids)
+        return documents
+    
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        with chat_metrics.span("retrieval") as span:
+            embedding, chunk_ids = self._cache_lookup(query)
+            span["cached"] = chunk_ids is not None
+            if chunk_ids is not None:
+                documents = self._fetch_chunks(chunk_ids)
+            else:
+                if embedding is None:
+                    embedding = self.embeddings.embed_query(query)
+                documents = self._search_and_cache(query, embedding)
+            span["chunks"] = len(documents)
+        return documents
+    
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        loop = asyncio.get_running_loop()
+        with chat_metrics.span("retrieval") as span:
+            # Las consultas usan el engine síncrono compartido; se ejecutan fuera del event loop
+            embedding, chunk_ids = self._cache_lookup(query)
+            span["cached"] = chunk_ids is not None
+            if chunk_ids is not None:
+                documents = await loop.run_in_executor(None, self._fetch_chunks, chunk_ids)
+            else:
+                if embedding is None:
+                    embedding = await self.embeddings.aembed_query(query)
+                documents = await loop.run_in_executor(None, self._search_and_cache, query, embedding)
+            span["chunks"] = len(documents)
+        return documents
@@ -2,25 +2,45 @@
 Servicio LangChain mejorado para chat veterinario con IA
 Incluye manejo robusto de memoria conversacional
 """
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Deque
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_community.vectorstores import PGVector
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain.chains import ConversationalRetrievalChain
+from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
 from langchain.memory import ConversationBufferMemory
 from langchain_core.documents import Document
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, BaseMessage
 from langchain.prompts import PromptTemplate
 from app.config import settings
-from app.services.s3_service import S3Service
+from app.services.s3_service import s3_service
+from app.services.embedding_cache import CachedEmbeddings
+from app.services.embedding_scheduler import ScheduledEmbeddings
+from app.services.token_budget import token_counter, TokenBudgetRetriever
+from app.services.pet_vector_store import PetVectorStore
+from app.services.pdf_extraction import pdf_extraction_pool
+from app.services.answer_cache import answer_cache
+from app.services.chat_metrics import chat_metrics
+from app.services.token_metering import token_meter
+from app.services.llm_resilience import ResilientCaller, llm_breaker
+from app.utils.exceptions import AIProviderUnavailableException
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import hashlib
 import os
+import re
+import threading
 import tempfile
 import requests
 
 
 class LangChainService:
-    """Servicio para chat veterinario con IA usando LangChain"""
+    """
+    Servicio para chat veterinario con IA usando LangChain
+    
+    Usar `get_langchain_service()`: hay una sola instancia por proceso que
+    reutiliza los clientes HTTP de OpenAI y el cliente de S3.
+    """
     
     # Prompt optimizado para veterinario experto con énfasis en memoria
     VETERINARY_SYSTEM_PROMPT = """Eres un veterinario experto altamente calificado con más de 15 años de experiencia en medicina veterinaria. Tu especialización abarca todas las especies de animales domésticos y de compañía.
@@ -64,31 +84,86 @@ class LangChainService:
 - No puedes diagnosticar definitivamente sin pruebas
 - Siempre recomienda visita veterinaria ante síntomas graves"""
 
+    # Tokens del prompt de sistema (se calcula una vez)
+    _system_prompt_tokens: Optional[int] = None
+    
+    # Palabras que indican que la pregunta depende del historial (pronombres, referencias)
+    FOLLOW_UP_MARKERS = frozenset({
+        "eso", "esto", "ese", "esa", "esos", "esas", "aquello", "aquel", "aquella",
+        "él", "ella", "ellos", "ellas", "su", "sus", "mismo", "misma", "dicho", "dicha",
+        "anterior", "anteriormente", "antes", "mencionaste", "dijiste", "comentaste",
+        "it", "that", "this", "those", "they", "he", "she", "previous"
+    })
+    # Palabras al inicio que indican continuación ("¿y si...?", "entonces...")
+    FOLLOW_UP_OPENERS = frozenset({"y", "entonces", "pero", "también", "and", "so", "also"})
+    # Preguntas más cortas se consideran elípticas ("¿y la dosis?")
+    SELF_CONTAINED_MIN_WORDS = 5
+    # Solapamiento de palabras para reutilizar la recuperación hecha con la pregunta original
+    SPECULATIVE_MATCH_THRESHOLD = 0.8
+    # Solo se especula si la recuperación especulativa se usó al menos en esta
+    # fracción de los últimos turnos reformulados (con menos de
+    # SPECULATIVE_MIN_SAMPLES turnos observados siempre se especula)
+    SPECULATIVE_MIN_HIT_RATE = 0.3
+    SPECULATIVE_MIN_SAMPLES = 10
+    # Prefijos de rol del historial en el prompt de reformulación
+    CHAT_HISTORY_ROLES = {"human": "Human: ", "ai": "Assistant: "}
+    
     def __init__(self):
         """Inicializa el servicio LangChain"""
         if not settings.OPENAI_API_KEY:
             raise ValueError("OPENAI_API_KEY no configurada")
         
-        # Inicializar embeddings para RAG
-        self.embeddings = OpenAIEmbeddings(
-            model=settings.OPENAI_EMBEDDING_MODEL,
-            openai_api_key=settings.OPENAI_API_KEY
+        # Inicializar embeddings para RAG: los lotes, la concurrencia y los
+        # reintentos ante 429 los gestiona ScheduledEmbeddings (sin reintentos del cliente)
+        self.embeddings = ScheduledEmbeddings(
+            OpenAIEmbeddings(
+                model=settings.OPENAI_EMBEDDING_MODEL,
+                openai_api_key=settings.OPENAI_API_KEY,
+                chunk_size=settings.EMBEDDING_BATCH_MAX_INPUTS,
+                request_timeout=settings.EMBEDDING_REQUEST_TIMEOUT_SECONDS,
+                max_retries=0
+            )
         )
         
-        # Inicializar LLM con temperatura baja para respuestas consistentes
+        # Reutilizar embeddings de chunks ya calculados (reindexado, documentos duplicados)
+        if settings.EMBEDDING_CACHE_ENABLED:
+            self.embeddings = CachedEmbeddings(
+                self.embeddings,
+                model_name=settings.OPENAI_EMBEDDING_MODEL
+            )
+        
+        # Inicializar LLM con temperatura baja para respuestas consistentes; el
+        # plazo lo aplica el cliente y los reintentos ResilientCaller
         self.llm = ChatOpenAI(
             model=settings.OPENAI_MODEL,
             temperature=0.3,  # Balance entre creatividad y precisión
-            openai_api_key=settings.OPENAI_API_KEY
+            openai_api_key=settings.OPENAI_API_KEY,
+            request_timeout=settings.LLM_REQUEST_TIMEOUT_SECONDS,
+            max_retries=0
         )
         
+        # Llamadas al LLM con reintentos y circuit breaker; la respuesta final
+        # lleva su propio historial de latencias para el hedging (p95)
+        self.llm_caller = ResilientCaller("llm", llm_breaker)
+        self.answer_caller = ResilientCaller("llm_answer", llm_breaker, hedge_enabled=settings.LLM_HEDGE_ENABLED)
+        
         # Configurar LangSmith si está habilitado
         if settings.LANGSMITH_TRACING and settings.LANGSMITH_API_KEY:
             os.environ["LANGCHAIN_TRACING_V2"] = "true"
             os.environ["LANGCHAIN_API_KEY"] = settings.LANGSMITH_API_KEY
             os.environ["LANGCHAIN_PROJECT"] = settings.LANGSMITH_PROJECT
         
-        self.s3_service = S3Service()
+        self.s3_service = s3_service
+        
+        # Recuperación especulativa (pregunta original) mientras se reformula la pregunta
+        self._retrieval_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-retrieval")
+        # Si la reformulación dejó la pregunta igual en los últimos turnos (se
+        # registra también cuando no se especuló) y contadores de especulación
+        self._speculation_outcomes: Deque[bool] = deque(maxlen=50)
+        self._speculation_lock = threading.Lock()
+        self.speculative_used = 0
+        self.speculative_wasted = 0
+        self.speculative_skipped = 0
         
         # Text splitter para documentos
         self.text_splitter = RecursiveCharacterTextSplitter(
@@ -134,63 +209,106 @@ class LangChainService:
             print(f"      ❌ {error_msg}")
             raise Exception(error_msg)
     
-    def _load_pdf_documents(self, pdf_urls: List[str]) -> List[Document]:
-        """Carga y procesa múltiples PDFs con manejo robusto de errores"""
-        all_documents = []
+    def _load_single_pdf(self, pdf_url: str) -> List[Document]:
+        """Obtiene un PDF y extrae sus páginas en el pool de procesos"""
+        temp_path = None
         
-        for idx, pdf_url in enumerate(pdf_urls, 1):
-            print(f"\n📄 Procesando PDF {idx}/{len(pdf_urls)}")
-            temp_path = None
-            
-            try:
-                # Descargar PDF
-                temp_path = self._download_pdf_from_s3(pdf_url)
-                
-                # Verificar que el archivo se descargó correctamente
-                if not os.path.exists(temp_path):
-                    raise Exception("Archivo temporal no se creó correctamente")
-                
-                file_size = os.path.getsize(temp_path)
-                print(f"   📏 Tamaño del archivo: {file_size / 1024:.2f} KB")
-                
-                if file_size == 0:
-                    raise Exception("Archivo descargado está vacío")
-                
-                # Cargar PDF con PyPDFLoader
-                print(f"   📖 Leyendo contenido del PDF...")
-                loader = PyPDFLoader(temp_path)
-                documents = loader.load()
-                
-                if not documents:
-                    raise Exception("No se pudo extraer contenido del PDF")
-                
-                print(f"   ✅ Extraídas {len(documents)} página(s)")
-                
-                # Agregar metadata
-                for doc in documents:
-                    doc.metadata['source'] = pdf_url
-                    doc.metadata['source_type'] = 'pet_document'
-                    # Agregar nombre del archivo si está disponible
-                    if 'file_name' in doc.metadata:
-                        doc.metadata['file_name'] = pdf_url.split('/')[-1]
-                
-                all_documents.extend(documents)
-                print(f"   ✅ PDF procesado exitosamente")
-                
-            except Exception as e:
-                print(f"   ❌ Error procesando PDF {idx}: {str(e)}")
-                import traceback
-                print(f"   Traceback: {traceback.format_exc()}")
-                continue
-                
-            finally:
-                # Limpiar archivo temporal
-                if temp_path and os.path.exists(temp_path):
+        try:
+            with chat_metrics.span("download") as span:
+                # Documentos de nuestro bucket: get_object autenticado directo a memoria
+                source = None
+                s3_key = self.s3_service.get_key_from_url(pdf_url)
+                if s3_key:
                     try:
-                        os.unlink(temp_path)
-                        print(f"   🗑️ Archivo temporal eliminado")
+                        print(f"   📥 Descargando PDF desde S3 (get_object): {s3_key}")
+                        source = self.s3_service.download_object(s3_key)
                     except Exception as e:
-                        print(f"   ⚠️ No se pudo eliminar archivo temporal: {str(e)}")
+                        print(f"   ⚠️ get_object falló, usando la URL pública: {str(e)}")
+                
+                if source is None:
+                    # Descargar PDF por HTTP a archivo temporal
+                    temp_path = self._download_pdf_from_s3(pdf_url)
+                    
+                    # Verificar que el archivo se descargó correctamente
+                    if not os.path.exists(temp_path):
+                        raise Exception("Archivo temporal no se creó correctamente")
+                    source = temp_path
+                
+                file_size = len(source) if isinstance(source, bytes) else os.path.getsize(source)
+                span["bytes"] = file_size
+            
+            print(f"   📏 Tamaño del archivo: {file_size / 1024:.2f} KB")
+            
+            if file_size == 0:
+                raise Exception("Archivo descargado está vacío")
+            
+            # Extraer texto por tramos de páginas en paralelo (mismo resultado que PyPDFLoader)
+            print(f"   📖 Leyendo contenido del PDF...")
+            with chat_metrics.span("parse", bytes=file_size) as span:
+                pages = pdf_extraction_pool.extract(source)
+                span["pages"] = len(pages)
+            
+            if not pages:
+                raise Exception("No se pudo extraer contenido del PDF")
+            
+            print(f"   ✅ Extraídas {len(pages)} página(s)")
+            
+            return [
+                Document(
+                    page_content=text,
+                    metadata={
+                        'source': pdf_url,
+                        'page': page_number,
+                        'source_type': 'pet_document'
+                    }
+                )
+                for page_number, text in pages
+            ]
+            
+        finally:
+            # Limpiar archivo temporal
+            if temp_path and os.path.exists(temp_path):
+                try:
+                    os.unlink(temp_path)
+                    print(f"   🗑️ Archivo temporal eliminado")
+                except Exception as e:
+                    print(f"   ⚠️ No se pudo eliminar archivo temporal: {str(e)}")
+    
+    def _load_pdf_documents_by_url(self, pdf_urls: List[str]) -> Dict[str, Any]:
+        """
+        Carga varios PDFs en paralelo
+        
+        Las descargas se hacen en hilos (como máximo RAG_PDF_DOWNLOAD_CONCURRENCY
+        a la vez) y la extracción de páginas en el pool de procesos compartido.
+        
+        Returns:
+            Dict url -> lista de páginas, o la excepción si ese PDF falló
+        """
+        results: Dict[str, Any] = {}
+        if not pdf_urls:
+            return results
+        
+        workers = max(1, min(settings.RAG_PDF_DOWNLOAD_CONCURRENCY, len(pdf_urls)))
+        print(f"\n📄 Procesando {len(pdf_urls)} PDF(s) ({workers} descargas simultáneas)")
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-download") as executor:
+            futures = {pdf_url: executor.submit(self._load_single_pdf, pdf_url) for pdf_url in pdf_urls}
+            for idx, (pdf_url, future) in enumerate(futures.items(), 1):
+                try:
+                    results[pdf_url] = future.result()
+                    print(f"   ✅ PDF {idx}/{len(pdf_urls)} procesado exitosamente")
+                except Exception as e:
+                    print(f"   ❌ Error procesando PDF {idx}: {str(e)}")
+                    results[pdf_url] = e
+        
+        return results
+    
+    def _load_pdf_documents(self, pdf_urls: List[str]) -> List[Document]:
+        """Carga y procesa múltiples PDFs con manejo robusto de errores"""
+        all_documents = []
+        for pages in self._load_pdf_documents_by_url(pdf_urls).values():
+            if not isinstance(pages, Exception):
+                all_documents.extend(pages)
         
         if not all_documents:
             raise Exception("No se pudo procesar ningún PDF correctamente")
@@ -198,116 +316,260 @@ class LangChainService:
         print(f"\n✅ Total: {len(all_documents)} página(s) de {len(pdf_urls)} PDF(s)")
         return all_documents
     
-    def create_vector_store(
-        self, 
-        pdf_urls: List[str], 
+    @staticmethod
+    def compute_documents_fingerprint(documents: List[Any]) -> str:
+        """
+        Calcula la huella de contenido de los documentos de una mascota
+        
+        Usa id + tamaño + updated_at de cada PetPhoto (ordenados por id) junto con
+        la configuración de embeddings/chunking, de modo que cualquier alta, baja o
+        modificación de un documento (o un cambio de modelo) produce otra huella.
+        """
+        parts = [
+            f"{settings.OPENAI_EMBEDDING_MODEL}|{settings.RAG_CHUNK_SIZE}|{settings.RAG_CHUNK_OVERLAP}"
+        ]
+        for doc in sorted(documents, key=lambda d: str(d.id)):
+            updated_at = doc.updated_at.isoformat() if doc.updated_at else ""
+            parts.append(f"{doc.id}:{doc.file_size_bytes or 0}:{updated_at}")
+        
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+    
+    def get_vector_store(
+        self,
         pet_id: str,
-        collection_name: Optional[str] = None
-    ) -> PGVector:
-        """Crea vector store para documentos de mascota con manejo robusto de errores"""
-        if not pdf_urls:
-            raise ValueError("No hay PDFs para procesar")
+        generation: int,
+        index_version: Optional[int] = None
+    ) -> PetVectorStore:
+        """Índice de una mascota (una generación) en la tabla compartida de chunks"""
+        return PetVectorStore(self.embeddings, pet_id, generation, index_version)
+    
+    @staticmethod
+    def delete_document_vectors(document_id: str) -> int:
+        """Elimina los embeddings de un documento"""
+        return PetVectorStore.delete_document(document_id)
+    
+    @staticmethod
+    def delete_pet_vectors(pet_id: str, keep_generation: Optional[int] = None) -> int:
+        """Elimina los embeddings de una mascota (salvo la generación `keep_generation`)"""
+        return PetVectorStore.delete_pet(pet_id, keep_generation)
+    
+    def _split_document_pages(self, document: Any, pages: List[Document]) -> List[Document]:
+        """Divide las páginas de un documento en chunks etiquetados con pet_id/document_id"""
+        with chat_metrics.span("split", pages=len(pages)) as span:
+            chunks = self.text_splitter.split_documents(pages)
+            span["chunks"] = len(chunks)
+        if not chunks:
+            raise ValueError("No se pudieron crear chunks de los documentos")
         
-        print(f"\n{'='*60}")
-        print(f"🔧 INICIANDO PROCESAMIENTO DE DOCUMENTOS")
-        print(f"{'='*60}")
-        print(f"📊 Mascotas ID: {pet_id}")
-        print(f"📄 Total de PDFs: {len(pdf_urls)}")
+        for position, chunk in enumerate(chunks):
+            chunk.metadata['pet_id'] = str(document.pet_id)
+            chunk.metadata['document_id'] = str(document.id)
+            chunk.metadata['chunk_index'] = position
+        return chunks
+    
+    def prepare_document_chunks(self, documents: List[Any]) -> Dict[str, Any]:
+        """
+        Descarga, extrae y divide varios documentos a la vez (ver _load_pdf_documents_by_url)
         
-        # Cargar y procesar PDFs
-        try:
-            documents = self._load_pdf_documents(pdf_urls)
-            
-            if not documents:
-                raise ValueError("No se pudieron cargar documentos de ningún PDF")
-            
-            print(f"\n✂️ Dividiendo documentos en chunks...")
-            chunks = self.text_splitter.split_documents(documents)
-            
-            if not chunks:
-                raise ValueError("No se pudieron crear chunks de los documentos")
-            
-            print(f"✅ {len(chunks)} chunks creados")
-            print(f"   📏 Promedio de caracteres por chunk: {sum(len(c.page_content) for c in chunks) / len(chunks):.0f}")
-            
-        except Exception as e:
-            print(f"\n❌ ERROR EN PROCESAMIENTO DE DOCUMENTOS:")
-            print(f"   {str(e)}")
-            raise
+        Returns:
+            Dict document_id -> lista de chunks, o la excepción si ese documento falló
+        """
+        urls = [document.url for document in documents if document.url]
+        pages_by_url = self._load_pdf_documents_by_url(list(dict.fromkeys(urls)))
         
-        # Preparar conexión a PostgreSQL
-        if not collection_name:
-            collection_name = f"pet_{pet_id}_documents"
+        prepared: Dict[str, Any] = {}
+        for document in documents:
+            pages = pages_by_url.get(document.url) if document.url else ValueError("El documento no tiene URL")
+            try:
+                if isinstance(pages, Exception):
+                    raise pages
+                prepared[str(document.id)] = self._split_document_pages(document, pages)
+            except Exception as e:
+                prepared[str(document.id)] = e
+        return prepared
+    
+    def index_document(
+        self,
+        pet_id: str,
+        generation: int,
+        document: Any,
+        chunks: Optional[List[Document]] = None
+    ) -> int:
+        """
+        Extrae, divide y guarda los embeddings de un único documento
         
-        connection_string = settings.DATABASE_URL
-        if connection_string.startswith("postgresql+psycopg2://"):
-            connection_string = connection_string.replace(
-                "postgresql+psycopg2://", "postgresql+psycopg://", 1
-            )
-        elif connection_string.startswith("postgresql://"):
-            connection_string = connection_string.replace(
-                "postgresql://", "postgresql+psycopg://", 1
-            )
+        Cada chunk se etiqueta con pet_id/document_id y se guarda con su
+        posición; reindexar un documento en la misma generación reemplaza sus
+        vectores previos en lugar de duplicarlos.
         
-        print(f"\n💾 Almacenando embeddings en PostgreSQL...")
-        print(f"   📦 Colección: {collection_name}")
+        Args:
+            pet_id: ID de la mascota
+            generation: Generación del índice en la que se escriben los chunks
+            document: Registro PetPhoto de tipo documento
+            chunks: Chunks ya preparados con prepare_document_chunks (opcional)
         
-        try:
-            # Intentar crear vector store
-            vector_store = PGVector.from_documents(
-                documents=chunks,
-                embedding=self.embeddings,
-                collection_name=collection_name,
-                connection_string=connection_string,
-                pre_delete_collection=False,
-            )
-            print(f"✅ Vector store creado exitosamente")
-            
-        except Exception as e:
-            print(f"⚠️ Error creando vector store, intentando recrear colección...")
-            print(f"   Error: {str(e)}")
-            
-            try:
-                # Intentar eliminar colección existente
-                temp_store = PGVector(
-                    collection_name=collection_name,
-                    connection_string=connection_string,
-                    embedding_function=self.embeddings,
-                )
-                try:
-                    temp_store.delete_collection()
-                    print(f"   🗑️ Colección anterior eliminada")
-                except Exception as del_err:
-                    print(f"   ⚠️ No se pudo eliminar colección anterior: {str(del_err)}")
-            except Exception as temp_err:
-                print(f"   ⚠️ Error creando store temporal: {str(temp_err)}")
-            
-            # Reintentar creación
-            try:
-                vector_store = PGVector.from_documents(
-                    documents=chunks,
-                    embedding=self.embeddings,
-                    collection_name=collection_name,
-                    connection_string=connection_string,
-                )
-                print(f"✅ Vector store recreado exitosamente")
-            except Exception as retry_err:
-                print(f"❌ ERROR FINAL creando vector store:")
-                print(f"   {str(retry_err)}")
-                raise
+        Returns:
+            Número de chunks almacenados
+        """
+        if chunks is None:
+            if not document.url:
+                raise ValueError("El documento no tiene URL")
+            chunks = self._split_document_pages(document, self._load_pdf_documents([document.url]))
+        
+        self.get_vector_store(pet_id, generation).add_document(document.id, chunks)
+        
+        print(f"✅ Documento {document.id} indexado: {len(chunks)} chunks (mascota {pet_id}, generación {generation})")
+        return len(chunks)
+    
+    def get_ready_vector_store(
+        self,
+        db,
+        pet_id: str,
+        documents: Optional[List[Any]] = None
+    ) -> Optional[PetVectorStore]:
+        """
+        Obtiene el índice vectorial ya construido de la mascota (sin construir nada)
+        
+        El índice lo mantiene el pipeline de ingesta en segundo plano. Aquí solo se
+        abre la generación registrada en `PetDocumentIndex` si hay documentos
+        indexados. Los documentos sin estado de ingesta (subidos antes del
+        pipeline) se encolan, y si la huella de los documentos indexados ya no
+        coincide con la registrada se encola una reconstrucción de la mascota.
+        
+        Args:
+            db: Sesión de base de datos
+            pet_id: ID de la mascota
+            documents: Registros PetPhoto ya consultados (opcional, evita repetir la consulta)
+        
+        Returns:
+            Vector store listo para consultar, o None si aún no hay documentos indexados
+        """
+        from app.models import PetDocumentIndex, PetDocumentIngestion
+        from app.services.document_ingestion_service import document_ingestion_service
+        
+        if documents is None:
+            documents = self.get_pet_document_records(db, pet_id)
+        if not documents:
+            return None
+        
+        statuses = {
+            str(row.document_id): row.status
+            for row in db.query(PetDocumentIngestion).filter(
+                PetDocumentIngestion.pet_id == self._to_uuid(pet_id)
+            ).all()
+        }
+        
+        for doc in documents:
+            if str(doc.id) not in statuses:
+                document_ingestion_service.enqueue_ingestion(str(doc.id))
+        
+        ready = [
+            doc for doc in documents
+            if statuses.get(str(doc.id)) == document_ingestion_service.STATUS_INDEXED
+        ]
+        pending = len(documents) - len(ready)
+        if pending:
+            print(f"⏳ {pending} documento(s) aún no indexados para mascota {pet_id}")
+        
+        if not ready:
+            return None
+        
+        index = db.query(PetDocumentIndex).filter(
+            PetDocumentIndex.pet_id == self._to_uuid(pet_id)
+        ).first()
+        if not index:
+            return None
+        
+        if index.fingerprint != self.compute_documents_fingerprint(ready):
+            print(f"⚠️ Índice v{index.version} desactualizado, encolando reconstrucción")
+            document_ingestion_service.enqueue_reindex(str(pet_id))
+        
+        print(f"♻️ Usando índice v{index.version} ({index.chunk_count} chunks, generación {index.generation})")
+        return self.get_vector_store(pet_id, index.generation, index.version)
+    
+    @staticmethod
+    def _new_memory() -> ConversationBufferMemory:
+        """Crea una memoria conversacional vacía"""
+        return ConversationBufferMemory(
+            return_messages=True,
+            memory_key="chat_history",
+            output_key="answer"
+        )
+    
+    def _fit_history_to_budget(
+        self,
+        memory: ConversationBufferMemory,
+        question: str,
+        use_documents: bool,
+        summary: Optional[str] = None,
+        pet_record: Optional[str] = None
+    ) -> int:
+        """
+        Recorta el historial para que el prompt quepa en CHAT_PROMPT_TOKEN_BUDGET
+        
+        El presupuesto se reparte entre el prompt de sistema, la pregunta, el
+        resumen de la conversación, la ficha clínica, los documentos recuperados
+        (RAG_CONTEXT_TOKEN_BUDGET en modo RAG) y el historial, que recibe lo
+        que sobra. Los mensajes más antiguos se
+        eliminan directamente de la lista de la memoria.
+        
+        Returns:
+            Número de mensajes eliminados
+        """
+        if LangChainService._system_prompt_tokens is None:
+            LangChainService._system_prompt_tokens = token_counter.count(self.VETERINARY_SYSTEM_PROMPT)
+        
+        reserved = LangChainService._system_prompt_tokens + token_counter.count(question)
+        reserved += token_counter.count(summary or "") + token_counter.count(pet_record or "")
+        if use_documents:
+            reserved += settings.RAG_CONTEXT_TOKEN_BUDGET
+        history_budget = max(0, settings.CHAT_PROMPT_TOKEN_BUDGET - reserved)
         
-        print(f"{'='*60}")
-        print(f"✅ PROCESAMIENTO COMPLETADO")
-        print(f"{'='*60}\n")
+        with chat_metrics.span("memory_trim", budget_tokens=history_budget) as span:
+            removed = token_counter.trim_messages(memory.chat_memory.messages, history_budget)
+            span["messages_removed"] = removed
+        if removed:
+            print(f"✂️ Historial recortado por presupuesto de tokens: {removed} mensajes ({history_budget} tokens disponibles)")
+        return removed
+    
+    def _build_result(
+        self,
+        answer: str,
+        source_docs: List,
+        memory: ConversationBufferMemory,
+        has_documents: bool
+    ) -> Dict[str, Any]:
+        """Construye la respuesta estándar de ask_question / aask_question"""
+        return {
+            "answer": answer,
+            "source_documents": self._format_source_documents(source_docs),
+            "chat_history": self._extract_chat_history(memory),
+            "has_documents": has_documents,
+            "error": None
+        }
+    
+    def _build_error_result(self, error: Exception, memory: ConversationBufferMemory) -> Dict[str, Any]:
+        """Construye la respuesta estándar cuando la pregunta falla"""
+        print(f"❌ Error: {str(error)}")
+        import traceback
+        traceback.print_exc()
         
-        return vector_store
+        return {
+            "answer": f"Lo siento, ocurrió un error al procesar tu pregunta. Por favor, inténtalo nuevamente.",
+            "source_documents": [],
+            "chat_history": self._extract_chat_history(memory) if memory else [],
+            "has_documents": False,
+            "error": str(error)
+        }
     
     def ask_question(
         self,
         question: str,
-        vector_store: Optional[PGVector] = None,
+        vector_store: Optional[PetVectorStore] = None,
         memory: Optional[ConversationBufferMemory] = None,
-        use_documents: bool = True
+        use_documents: bool = True,
+        summary: Optional[str] = None,
+        pet_record: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Hace una pregunta al veterinario experto con memoria conversacional
@@ -317,6 +579,8 @@ class LangChainService:
             vector_store: Vector store con documentos (opcional)
             memory: Memoria conversacional (DEBE ser proporcionada para mantener contexto)
             use_documents: Si usar RAG o modo conversación general
+            summary: Resumen de los turnos anteriores a la memoria (modo summary)
+            pet_record: Ficha clínica de la mascota (registros de la app)
             
         Returns:
             Dict con respuesta, historial y documentos fuente
@@ -325,69 +589,95 @@ class LangChainService:
         
         # Crear memoria si no existe
         if memory is None:
-            memory = ConversationBufferMemory(
-                return_messages=True,
-                memory_key="chat_history",
-                output_key="answer"
-            )
+            memory = self._new_memory()
+        
+        self._fit_history_to_budget(
+            memory, question, use_documents and vector_store is not None, summary, pet_record
+        )
         
         try:
             # Modo con documentos (RAG)
             if use_documents and vector_store is not None:
                 answer, source_docs = self._ask_with_rag(
-                    question, vector_store, memory
+                    question, vector_store, memory, summary, pet_record
                 )
             # Modo sin documentos (conversación general)
             else:
                 answer, source_docs = self._ask_without_documents(
-                    question, memory
+                    question, memory, summary, pet_record
                 )
             
-            # Extraer historial actualizado
-            chat_history = self._extract_chat_history(memory)
-            
-            # Formatear documentos fuente
-            formatted_docs = self._format_source_documents(source_docs)
-            
-            return {
-                "answer": answer,
-                "source_documents": formatted_docs,
-                "chat_history": chat_history,
-                "has_documents": use_documents and vector_store is not None,
-                "error": None
-            }
+            return self._build_result(
+                answer, source_docs, memory, use_documents and vector_store is not None
+            )
             
+        except AIProviderUnavailableException:
+            # Breaker abierto durante el turno: 503 con Retry-After, no un error genérico
+            raise
         except Exception as e:
-            print(f"❌ Error: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            
-            return {
-                "answer": f"Lo siento, ocurrió un error al procesar tu pregunta. Por favor, inténtalo nuevamente.",
-                "source_documents": [],
-                "chat_history": self._extract_chat_history(memory) if memory else [],
-                "has_documents": False,
-                "error": str(e)
-            }
+            return self._build_error_result(e, memory)
     
-    def _ask_with_rag(
+    async def aask_question(
         self,
         question: str,
-        vector_store: PGVector,
-        memory: ConversationBufferMemory
-    ) -> tuple[str, List]:
-        """Pregunta usando RAG (con documentos)"""
-        print("📚 Modo RAG activado")
+        vector_store: Optional[PetVectorStore] = None,
+        memory: Optional[ConversationBufferMemory] = None,
+        use_documents: bool = True,
+        summary: Optional[str] = None,
+        pet_record: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Versión asíncrona de ask_question (no bloquea el event loop)
+        
+        Las llamadas al LLM usan el cliente asíncrono de OpenAI y la búsqueda
+        vectorial (embedding de la pregunta + consulta híbrida de chunks) se ejecuta
+        en el executor por defecto.
+        """
+        print(f"❓ Procesando (async): {question[:100]}...")
         
-        retriever = vector_store.as_retriever(
-            search_kwargs={"k": settings.RAG_TOP_K_RESULTS}
+        if memory is None:
+            memory = self._new_memory()
+        
+        self._fit_history_to_budget(
+            memory, question, use_documents and vector_store is not None, summary, pet_record
         )
         
-        # Prompt que combina documentos con conocimiento veterinario
-        qa_prompt = PromptTemplate(
+        try:
+            if use_documents and vector_store is not None:
+                answer, source_docs = await self._aask_with_rag(
+                    question, vector_store, memory, summary, pet_record
+                )
+            else:
+                answer, source_docs = await self._aask_without_documents(
+                    question, memory, summary, pet_record
+                )
+            
+            return self._build_result(
+                answer, source_docs, memory, use_documents and vector_store is not None
+            )
+            
+        except AIProviderUnavailableException:
+            # Breaker abierto durante el turno: 503 con Retry-After, no un error genérico
+            raise
+        except Exception as e:
+            return self._build_error_result(e, memory)
+    
+    def _build_rag_prompt(
+        self,
+        summary: Optional[str] = None,
+        pet_record: Optional[str] = None
+    ) -> PromptTemplate:
+        """Prompt que combina ficha clínica y documentos con conocimiento veterinario"""
+        background_section = ""
+        if pet_record:
+            background_section += f"{self._pet_record_section(pet_record)}\n\n"
+        if summary:
+            background_section += f"**RESUMEN DE LA CONVERSACIÓN ANTERIOR:**\n{summary}\n\n"
+        
+        return PromptTemplate(
             template=f"""{self.VETERINARY_SYSTEM_PROMPT}
 
-**DOCUMENTOS DE LA MASCOTA:**
+{{background_section}}**DOCUMENTOS DE LA MASCOTA:**
 {{context}}
 
 **PREGUNTA ACTUAL:**
@@ -395,33 +685,441 @@ class LangChainService:
 
 **TU RESPUESTA COMO VETERINARIO EXPERTO:**
 Recuerda usar toda la información que el usuario te ha dado anteriormente en esta conversación.""",
-            input_variables=["context", "question"]
+            input_variables=["context", "question"],
+            partial_variables={"background_section": background_section}
+        )
+    
+    def _build_retriever(self, vector_store: PetVectorStore) -> TokenBudgetRetriever:
+        """Retriever de documentos de la mascota acotado a RAG_CONTEXT_TOKEN_BUDGET"""
+        # Vectorial + texto completo fusionados con RRF (solo vectorial si RAG_HYBRID_SEARCH=false)
+        return TokenBudgetRetriever(
+            retriever=vector_store.as_retriever(),
+            max_tokens=settings.RAG_CONTEXT_TOKEN_BUDGET
+        )
+    
+    @staticmethod
+    def _pet_record_section(pet_record: str) -> str:
+        """Ficha clínica con el encabezado usado en los prompts"""
+        return (
+            "**FICHA CLÍNICA DE LA MASCOTA (registros de la aplicación, úsala para "
+            "preguntas sobre vacunas, desparasitaciones, visitas y alimentación):**\n"
+            f"{pet_record}"
+        )
+    
+    @staticmethod
+    def _summary_prefix(summary: Optional[str]) -> str:
+        """Resumen de la conversación en el formato del historial para reformular preguntas"""
+        if not summary:
+            return ""
+        return f"Resumen de la conversación anterior: {summary}\n"
+    
+    @staticmethod
+    def _load_history(memory: ConversationBufferMemory) -> List[BaseMessage]:
+        """Mensajes de la memoria como lista"""
+        history = memory.load_memory_variables({}).get('chat_history', [])
+        return history if isinstance(history, list) else []
+    
+    def _needs_condensing(
+        self,
+        question: str,
+        history: List[BaseMessage],
+        summary: Optional[str] = None
+    ) -> bool:
+        """
+        Decide si la pregunta debe reformularse con el historial antes de buscar
+        
+        Sin historial (primer turno) nunca; en modo "auto" tampoco si la
+        pregunta es autocontenida: suficientemente larga, sin pronombres ni
+        referencias a lo ya hablado y sin empezar como continuación.
+        """
+        if not history and not summary:
+            return False
+        if settings.RAG_CONDENSE_MODE.lower() == "always":
+            return True
+        
+        words = re.findall(r"\w+", question.lower())
+        if len(words) < self.SELF_CONTAINED_MIN_WORDS:
+            return True
+        if words[0] in self.FOLLOW_UP_OPENERS:
+            return True
+        return any(word in self.FOLLOW_UP_MARKERS for word in words)
+    
+    def _same_question(self, question: str, standalone_question: str) -> bool:
+        """La reformulación apenas cambió la pregunta (sirve la recuperación especulativa)"""
+        original = set(re.findall(r"\w+", question.lower()))
+        rewritten = set(re.findall(r"\w+", standalone_question.lower()))
+        if not original or not rewritten:
+            return False
+        return len(original & rewritten) / len(original | rewritten) >= self.SPECULATIVE_MATCH_THRESHOLD
+    
+    @classmethod
+    def _format_chat_history(cls, history: List[BaseMessage]) -> str:
+        """Historial como texto "Human: ... / Assistant: ..." (formato de ConversationalRetrievalChain)"""
+        return "".join(
+            f"\n{cls.CHAT_HISTORY_ROLES.get(message.type, f'{message.type}: ')}{message.content}"
+            for message in history
         )
+    
+    # ============================================
+    # RECUPERACIÓN ESPECULATIVA
+    # ============================================
+    
+    def _should_speculate(self) -> bool:
+        """
+        Lanza la recuperación especulativa solo si probablemente se usará
+        
+        Una búsqueda especulativa descartada no se puede detener (en el hilo
+        sigue hasta el final; en asyncio se cancela el embedding, pero no la
+        consulta ya enviada al executor): cuesta un embedding y una consulta.
+        """
+        with self._speculation_lock:
+            outcomes = list(self._speculation_outcomes)
+            if len(outcomes) < self.SPECULATIVE_MIN_SAMPLES:
+                return True
+            if sum(outcomes) / len(outcomes) >= self.SPECULATIVE_MIN_HIT_RATE:
+                return True
+            self.speculative_skipped += 1
+            return False
+    
+    def _record_speculation(self, same_question: bool, speculated: bool):
+        """Registra si la reformulación dejó la pregunta igual y el resultado de la especulación"""
+        with self._speculation_lock:
+            self._speculation_outcomes.append(same_question)
+            if speculated:
+                if same_question:
+                    self.speculative_used += 1
+                else:
+                    self.speculative_wasted += 1
+    
+    def speculation_stats(self) -> Dict[str, Any]:
+        """Recuperaciones especulativas usadas, desperdiciadas y omitidas en este proceso"""
+        with self._speculation_lock:
+            outcomes = list(self._speculation_outcomes)
+            return {
+                "used": self.speculative_used,
+                "wasted": self.speculative_wasted,
+                "skipped": self.speculative_skipped,
+                "recent_hit_rate": round(sum(outcomes) / len(outcomes), 2) if outcomes else None
+            }
+    
+    def _condense_prompt(
+        self,
+        question: str,
+        history: List[BaseMessage],
+        summary: Optional[str] = None
+    ) -> str:
+        """Prompt de reformulación (mismo formato que ConversationalRetrievalChain)"""
+        return CONDENSE_QUESTION_PROMPT.format(
+            chat_history=self._summary_prefix(summary) + self._format_chat_history(history),
+            question=question
+        )
+    
+    def _condense_question(
+        self,
+        question: str,
+        history: List[BaseMessage],
+        summary: Optional[str] = None
+    ) -> str:
+        """Reformula la pregunta como independiente usando el historial"""
+        prompt = self._condense_prompt(question, history, summary)
+        with chat_metrics.span("condense", prompt_tokens=token_counter.count(prompt)) as span:
+            response = self.llm_caller.call(lambda: self.llm.invoke(prompt))
+            standalone_question = response.content if hasattr(response, 'content') else str(response)
+            span["completion_tokens"] = self._completion_tokens(response, standalone_question)
+            token_meter.record(span["prompt_tokens"], span["completion_tokens"])
+        return standalone_question
+    
+    async def _acondense_question(
+        self,
+        question: str,
+        history: List[BaseMessage],
+        summary: Optional[str] = None
+    ) -> str:
+        """Versión asíncrona de _condense_question"""
+        prompt = self._condense_prompt(question, history, summary)
+        with chat_metrics.span("condense", prompt_tokens=token_counter.count(prompt)) as span:
+            response = await self.llm_caller.acall(lambda: self.llm.ainvoke(prompt))
+            standalone_question = response.content if hasattr(response, 'content') else str(response)
+            span["completion_tokens"] = self._completion_tokens(response, standalone_question)
+            token_meter.record(span["prompt_tokens"], span["completion_tokens"])
+        return standalone_question
+    
+    def _retrieve_for_question(
+        self,
+        question: str,
+        history: List[BaseMessage],
+        retriever: TokenBudgetRetriever,
+        summary: Optional[str] = None
+    ) -> tuple[str, List[Document]]:
+        """
+        Obtiene la pregunta a responder y sus documentos
+        
+        Si no hace falta reformular se busca directamente con la pregunta. Si
+        hace falta, la búsqueda con la pregunta original se lanza en paralelo
+        con la reformulación (si en los últimos turnos solía aprovecharse, ver
+        _should_speculate) y se reutiliza si la reformulación apenas cambió la
+        pregunta; si no, se busca de nuevo con la pregunta reformulada.
+        
+        Returns:
+            (pregunta a responder, documentos recuperados)
+        """
+        if not self._needs_condensing(question, history, summary):
+            print("   ⚡ Pregunta autocontenida: sin reformular")
+            return question, retriever.invoke(question)
+        
+        speculative = None
+        if self._should_speculate():
+            # El hilo hereda el contexto para que sus spans lleguen a la traza del turno
+            speculative = self._retrieval_executor.submit(contextvars.copy_context().run, retriever.invoke, question)
+        standalone_question = self._condense_question(question, history, summary)
+        
+        same_question = self._same_question(question, standalone_question)
+        self._record_speculation(same_question, speculative is not None)
+        if same_question:
+            if speculative is not None:
+                print("   ⚡ Reformulación equivalente: se usa la recuperación especulativa")
+                return standalone_question, speculative.result()
+            return standalone_question, retriever.invoke(question)
+        
+        if speculative is not None:
+            # Solo evita la búsqueda si aún no empezó (cuenta como desperdiciada)
+            speculative.cancel()
+        return standalone_question, retriever.invoke(standalone_question)
+    
+    async def _aretrieve_for_question(
+        self,
+        question: str,
+        history: List[BaseMessage],
+        retriever: TokenBudgetRetriever,
+        summary: Optional[str] = None
+    ) -> tuple[str, List[Document]]:
+        """Versión asíncrona de _retrieve_for_question"""
+        if not self._needs_condensing(question, history, summary):
+            print("   ⚡ Pregunta autocontenida: sin reformular")
+            return question, await retriever.ainvoke(question)
+        
+        speculative = asyncio.ensure_future(retriever.ainvoke(question)) if self._should_speculate() else None
+        try:
+            standalone_question = await self._acondense_question(question, history, summary)
+        except Exception:
+            if speculative is not None:
+                speculative.cancel()
+            raise
+        
+        same_question = self._same_question(question, standalone_question)
+        self._record_speculation(same_question, speculative is not None)
+        if same_question:
+            if speculative is not None:
+                print("   ⚡ Reformulación equivalente: se usa la recuperación especulativa")
+                return standalone_question, await speculative
+            return standalone_question, await retriever.ainvoke(question)
+        
+        if speculative is not None:
+            speculative.cancel()
+        return standalone_question, await retriever.ainvoke(standalone_question)
+    
+    def _build_rag_messages(
+        self,
+        question: str,
+        source_docs: List[Document],
+        summary: Optional[str] = None,
+        pet_record: Optional[str] = None
+    ) -> List[BaseMessage]:
+        """Mensaje del modo RAG: prompt con ficha, resumen, documentos y pregunta"""
+        context = "\n\n".join(doc.page_content for doc in source_docs)
+        return [
+            HumanMessage(content=self._build_rag_prompt(summary, pet_record).format(
+                context=context,
+                question=question
+            ))
+        ]
+    
+    def _ask_with_rag(
+        self,
+        question: str,
+        vector_store: PetVectorStore,
+        memory: ConversationBufferMemory,
+        summary: Optional[str] = None,
+        pet_record: Optional[str] = None
+    ) -> tuple[str, List]:
+        """Pregunta usando RAG (con documentos)"""
+        print("📚 Modo RAG activado")
         
-        # Crear cadena conversacional
-        chain = ConversationalRetrievalChain.from_llm(
-            llm=self.llm,
-            retriever=retriever,
-            memory=memory,
-            return_source_documents=True,
-            verbose=False,
-            combine_docs_chain_kwargs={"prompt": qa_prompt}
+        standalone_question, source_docs = self._retrieve_for_question(
+            question, self._load_history(memory), self._build_retriever(vector_store), summary
         )
         
-        result = chain.invoke({"question": question})
-        answer = result.get("answer", "")
-        source_docs = result.get("source_documents", [])
+        answer = self._generate_answer(self._build_rag_messages(standalone_question, source_docs, summary, pet_record))
+        
+        memory.save_context(
+            {"question": question},
+            {"answer": answer}
+        )
         
         return answer, source_docs
     
-    def _ask_without_documents(
+    async def _aask_with_rag(
         self,
         question: str,
-        memory: ConversationBufferMemory
+        vector_store: PetVectorStore,
+        memory: ConversationBufferMemory,
+        summary: Optional[str] = None,
+        pet_record: Optional[str] = None
     ) -> tuple[str, List]:
-        """Pregunta sin documentos (conversación general)"""
-        print("💬 Modo conversación general")
+        """Pregunta usando RAG (con documentos), versión asíncrona"""
+        print("📚 Modo RAG activado (async)")
+        
+        standalone_question, source_docs = await self._aretrieve_for_question(
+            question, self._load_history(memory), self._build_retriever(vector_store), summary
+        )
+        
+        answer = await self._agenerate_answer(self._build_rag_messages(standalone_question, source_docs, summary, pet_record))
+        
+        memory.save_context(
+            {"question": question},
+            {"answer": answer}
+        )
+        
+        return answer, source_docs
+    
+    async def astream_question(
+        self,
+        question: str,
+        vector_store: Optional[PetVectorStore] = None,
+        memory: Optional[ConversationBufferMemory] = None,
+        use_documents: bool = True,
+        summary: Optional[str] = None,
+        pet_record: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Versión en streaming de ask_question
+        
+        Genera eventos `{"type": "token", "content": ...}` a medida que llegan del
+        LLM y un evento final `{"type": "end", ...}` con la respuesta completa,
+        documentos fuente e historial. La memoria solo se actualiza cuando la
+        respuesta termina; si el stream falla o se corta, no se guarda nada.
+        """
+        print(f"❓ Procesando (streaming): {question[:100]}...")
+        
+        if memory is None:
+            memory = self._new_memory()
+        
+        self._fit_history_to_budget(
+            memory, question, use_documents and vector_store is not None, summary, pet_record
+        )
+        
+        source_docs = []
+        cached_answer, cache_embedding = None, None
+        if use_documents and vector_store is not None:
+            print("📚 Modo RAG activado (streaming)")
+            standalone_question, source_docs = await self._aretrieve_for_question(
+                question, self._load_history(memory), self._build_retriever(vector_store), summary
+            )
+            messages = self._build_rag_messages(standalone_question, source_docs, summary, pet_record)
+        else:
+            print("💬 Modo conversación general (streaming)")
+            if answer_cache.is_eligible(question, self._load_history(memory), summary, pet_record):
+                cached_answer, cache_embedding = await self._alookup_cached_answer(question)
+            messages = self._build_general_messages(question, memory, summary, pet_record)
+        
+        if cached_answer is not None:
+            answer = cached_answer
+            yield {"type": "token", "content": answer}
+        else:
+            answer_parts = []
+            with chat_metrics.span("answer", prompt_tokens=self._count_prompt_tokens(messages)) as span:
+                async for chunk in self.answer_caller.astream(lambda: self.llm.astream(messages)):
+                    content = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                    if content:
+                        answer_parts.append(content)
+                        yield {"type": "token", "content": content}
+                
+                answer = "".join(answer_parts)
+                span["completion_tokens"] = token_counter.count(answer)
+                token_meter.record(span["prompt_tokens"], span["completion_tokens"])
+            if cache_embedding is not None:
+                self._schedule_store_cached_answer(question, cache_embedding, answer)
+        
+        # Guardar en memoria solo cuando la respuesta está completa
+        memory.save_context(
+            {"question": question},
+            {"answer": answer}
+        )
         
+        yield {
+            "type": "end",
+            "answer": answer,
+            "source_documents": self._format_source_documents(source_docs),
+            "chat_history": self._extract_chat_history(memory),
+            "has_documents": use_documents and vector_store is not None
+        }
+    
+    @staticmethod
+    def _count_prompt_tokens(messages: List[BaseMessage]) -> int:
+        """Tokens del prompt enviado al LLM"""
+        return sum(token_counter.count_message(message) for message in messages)
+    
+    @staticmethod
+    def _completion_tokens(response: Any, content: str) -> int:
+        """Tokens de la respuesta según el proveedor (tiktoken si no los informa)"""
+        usage = getattr(response, "usage_metadata", None) or {}
+        if usage.get("output_tokens") is not None:
+            return usage["output_tokens"]
+        token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+        if token_usage.get("completion_tokens") is not None:
+            return token_usage["completion_tokens"]
+        return token_counter.count(content)
+    
+    def _generate_answer(self, messages: List[BaseMessage]) -> str:
+        """Invoca el LLM con los mensajes del turno (span "answer")"""
+        with chat_metrics.span("answer", prompt_tokens=self._count_prompt_tokens(messages)) as span:
+            response = self.answer_caller.call(lambda: self.llm.invoke(messages))
+            answer = response.content if hasattr(response, 'content') else str(response)
+            span["completion_tokens"] = self._completion_tokens(response, answer)
+            token_meter.record(span["prompt_tokens"], span["completion_tokens"])
+        return answer
+    
+    async def _agenerate_answer(self, messages: List[BaseMessage]) -> str:
+        """Versión asíncrona de _generate_answer"""
+        with chat_metrics.span("answer", prompt_tokens=self._count_prompt_tokens(messages)) as span:
+            # La petición duplicada que pierde también se factura: cuenta su prompt
+            response = await self.answer_caller.acall(
+                lambda: self.llm.ainvoke(messages),
+                hedge=True,
+                on_hedge_cancelled=lambda: token_meter.record(span["prompt_tokens"], 0)
+            )
+            answer = response.content if hasattr(response, 'content') else str(response)
+            span["completion_tokens"] = self._completion_tokens(response, answer)
+            token_meter.record(span["prompt_tokens"], span["completion_tokens"])
+        return answer
+    
+    def embedding_stats(self) -> Dict[str, Any]:
+        """Estadísticas de la caché y del planificador de embeddings"""
+        stats: Dict[str, Any] = {}
+        embeddings = self.embeddings
+        while embeddings is not None:
+            if isinstance(embeddings, CachedEmbeddings):
+                stats["cache"] = embeddings.stats()
+            elif isinstance(embeddings, ScheduledEmbeddings):
+                stats["scheduler"] = embeddings.stats()
+            embeddings = getattr(embeddings, "underlying", None)
+        return stats
+    
+    def resilience_stats(self) -> Dict[str, Any]:
+        """Reintentos, hedging y estado del circuit breaker de las llamadas al LLM"""
+        return {
+            "llm": self.llm_caller.stats(),
+            "answer": self.answer_caller.stats()
+        }
+    
+    def _build_general_messages(
+        self,
+        question: str,
+        memory: ConversationBufferMemory,
+        summary: Optional[str] = None,
+        pet_record: Optional[str] = None
+    ) -> List[BaseMessage]:
+        """Construye los mensajes del modo conversación general (system + historial + pregunta)"""
         # Cargar historial de memoria
         memory_vars = memory.load_memory_variables({})
         history = memory_vars.get('chat_history', [])
@@ -431,6 +1129,16 @@ Recuerda usar toda la información que el usuario te ha dado anteriormente en es
             SystemMessage(content=self.VETERINARY_SYSTEM_PROMPT)
         ]
         
+        # Ficha clínica: responde preguntas sobre los registros sin recuperar documentos
+        if pet_record:
+            messages.append(SystemMessage(content=self._pet_record_section(pet_record)))
+        
+        # Resumen de los turnos que ya salieron de la memoria
+        if summary:
+            messages.append(SystemMessage(
+                content=f"Resumen de la conversación anterior con el usuario:\n{summary}"
+            ))
+        
         # Agregar historial completo para mantener contexto
         if isinstance(history, list) and len(history) > 0:
             messages.extend(history)
@@ -439,9 +1147,32 @@ Recuerda usar toda la información que el usuario te ha dado anteriormente en es
         # Agregar pregunta actual
         messages.append(HumanMessage(content=question))
         
+        return messages
+    
+    def _ask_without_documents(
+        self,
+        question: str,
+        memory: ConversationBufferMemory,
+        summary: Optional[str] = None,
+        pet_record: Optional[str] = None
+    ) -> tuple[str, List]:
+        """Pregunta sin documentos (conversación general)"""
+        print("💬 Modo conversación general")
+        
+        cache_embedding = None
+        if answer_cache.is_eligible(question, self._load_history(memory), summary, pet_record):
+            cached_answer, cache_embedding = self._lookup_cached_answer(question)
+            if cached_answer is not None:
+                memory.save_context({"question": question}, {"answer": cached_answer})
+                return cached_answer, []
+        
+        messages = self._build_general_messages(question, memory, summary, pet_record)
+        
         # Invocar LLM
-        response = self.llm.invoke(messages)
-        answer = response.content if hasattr(response, 'content') else str(response)
+        answer = self._generate_answer(messages)
+        
+        if cache_embedding is not None:
+            self._store_cached_answer(question, cache_embedding, answer)
         
         # Guardar en memoria
         memory.save_context(
@@ -451,6 +1182,85 @@ Recuerda usar toda la información que el usuario te ha dado anteriormente en es
         
         return answer, []
     
+    async def _aask_without_documents(
+        self,
+        question: str,
+        memory: ConversationBufferMemory,
+        summary: Optional[str] = None,
+        pet_record: Optional[str] = None
+    ) -> tuple[str, List]:
+        """Pregunta sin documentos (conversación general), versión asíncrona"""
+        print("💬 Modo conversación general (async)")
+        
+        cache_embedding = None
+        if answer_cache.is_eligible(question, self._load_history(memory), summary, pet_record):
+            cached_answer, cache_embedding = await self._alookup_cached_answer(question)
+            if cached_answer is not None:
+                memory.save_context({"question": question}, {"answer": cached_answer})
+                return cached_answer, []
+        
+        messages = self._build_general_messages(question, memory, summary, pet_record)
+        
+        answer = await self._agenerate_answer(messages)
+        
+        if cache_embedding is not None:
+            self._schedule_store_cached_answer(question, cache_embedding, answer)
+        
+        memory.save_context(
+            {"question": question},
+            {"answer": answer}
+        )
+        
+        return answer, []
+    
+    def _answer_cache_scope(self) -> str:
+        """Ámbito de la caché de respuestas para la configuración actual"""
+        return answer_cache.build_scope(self.VETERINARY_SYSTEM_PROMPT)
+    
+    def _lookup_cached_answer(self, question: str) -> tuple[Optional[str], Optional[List[float]]]:
+        """
+        Busca una respuesta cacheada para una pregunta general
+        
+        Returns:
+            (respuesta cacheada o None, embedding de la pregunta para guardarla después)
+        """
+        try:
+            embedding = self.embeddings.embed_query(question)
+            cached_answer = answer_cache.lookup(self._answer_cache_scope(), embedding)
+        except Exception as e:
+            print(f"⚠️ Error consultando caché de respuestas: {str(e)}")
+            return None, None
+        
+        if cached_answer is not None:
+            print("⚡ Respuesta obtenida de la caché semántica")
+        return cached_answer, embedding
+    
+    async def _alookup_cached_answer(self, question: str) -> tuple[Optional[str], Optional[List[float]]]:
+        """Versión asíncrona de _lookup_cached_answer"""
+        try:
+            embedding = await self.embeddings.aembed_query(question)
+            cached_answer = await asyncio.get_running_loop().run_in_executor(
+                None, answer_cache.lookup, self._answer_cache_scope(), embedding
+            )
+        except Exception as e:
+            print(f"⚠️ Error consultando caché de respuestas: {str(e)}")
+            return None, None
+        
+        if cached_answer is not None:
+            print("⚡ Respuesta obtenida de la caché semántica")
+        return cached_answer, embedding
+    
+    def _store_cached_answer(self, question: str, embedding: List[float], answer: str):
+        """Guarda una respuesta general en la caché (los errores no afectan al chat)"""
+        try:
+            answer_cache.store(self._answer_cache_scope(), question, embedding, answer)
+        except Exception as e:
+            print(f"⚠️ Error guardando en caché de respuestas: {str(e)}")
+    
+    def _schedule_store_cached_answer(self, question: str, embedding: List[float], answer: str):
+        """Guarda la respuesta en segundo plano, sin retrasar la respuesta al usuario"""
+        asyncio.get_running_loop().run_in_executor(None, self._store_cached_answer, question, embedding, answer)
+    
     def _extract_chat_history(self, memory: ConversationBufferMemory) -> List[Dict[str, str]]:
         """Extrae historial de conversación de forma robusta"""
         history = []
@@ -497,24 +1307,47 @@ Recuerda usar toda la información que el usuario te ha dado anteriormente en es
         
         return formatted
     
-    def get_pet_documents_from_db(self, db, pet_id: str) -> List[str]:
-        """Obtiene URLs de documentos PDF de mascota desde DB"""
-        from app.models import PetPhoto
+    @staticmethod
+    def _to_uuid(pet_id):
+        """Convierte pet_id a UUID si llega como string"""
         import uuid
         
         try:
-            pet_uuid = uuid.UUID(pet_id) if isinstance(pet_id, str) else pet_id
+            return uuid.UUID(pet_id) if isinstance(pet_id, str) else pet_id
         except (ValueError, AttributeError):
-            pet_uuid = pet_id
-        
-        print(f"🔍 Buscando documentos para mascota: {pet_id}")
+            return pet_id
+    
+    def get_pet_document_records(self, db, pet_id: str) -> List[Any]:
+        """Obtiene los registros PetPhoto de tipo documento de la mascota"""
+        from app.models import PetPhoto
         
-        documents = db.query(PetPhoto).filter(
-            PetPhoto.pet_id == pet_uuid,
+        return db.query(PetPhoto).filter(
+            PetPhoto.pet_id == self._to_uuid(pet_id),
             PetPhoto.file_type == "document"
         ).all()
+    
+    def get_pet_documents_from_db(self, db, pet_id: str) -> List[str]:
+        """Obtiene URLs de documentos PDF de mascota desde DB"""
+        print(f"🔍 Buscando documentos para mascota: {pet_id}")
+        
+        documents = self.get_pet_document_records(db, pet_id)
         
         urls = [doc.url for doc in documents if doc.url]
         print(f"📄 {len(urls)} documentos encontrados")
         
-        return urls
\ No newline at end of file
+        return urls
+
+
+# Instancia única por proceso (se crea al primer uso: requiere OPENAI_API_KEY)
+_langchain_service: Optional[LangChainService] = None
+_langchain_service_lock = threading.Lock()
+
+
+def get_langchain_service() -> LangChainService:
+    """Devuelve el servicio LangChain del proceso, creándolo la primera vez"""
+    global _langchain_service
+    if _langchain_service is None:
+        with _langchain_service_lock:
+            if _langchain_service is None:
+                _langchain_service = LangChainService()
+    return _langchain_service
@@ -0,0 +1,394 @@
+"""
+Resiliencia de las llamadas a OpenAI (LLM y embeddings)
+- Plazo por llamada: un proveedor colgado no retiene el worker
+- Reintentos con backoff exponencial y jitter ante errores transitorios
+- Petición duplicada (hedging) de la respuesta si tarda más que su p95
+- Circuit breaker: con el proveedor caído se falla al instante con un 503
+"""
+import asyncio
+import math
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+from fastapi import HTTPException
+from app.config import settings
+from app.utils.exceptions import AIProviderUnavailableException
+
+T = TypeVar("T")
+
+# Códigos HTTP que indican un problema pasajero del proveedor (un 409 es un conflicto, no se reintenta)
+TRANSIENT_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+# Errores de openai/httpx sin código HTTP (timeouts y conexiones cortadas)
+TRANSIENT_ERROR_NAMES = frozenset({
+    "APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError",
+    "ConnectError", "ConnectTimeout", "ReadTimeout", "ReadError", "RemoteProtocolError"
+})
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """True si vale la pena reintentar: timeout, conexión, 408, 429 o 5xx"""
+    if isinstance(error, HTTPException):
+        # Errores propios de la API (ej: breaker abierto), no del proveedor
+        return False
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in TRANSIENT_ERROR_NAMES:
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status in TRANSIENT_STATUS_CODES
+
+
+def backoff_seconds(attempt: int, error: BaseException, max_seconds: float, base_seconds: float = 1.0) -> float:
+    """Retry-After del proveedor si lo indica; si no, exponencial con jitter completo"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    retry_after: Optional[Any] = headers.get("retry-after")
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), max_seconds)
+        except ValueError:
+            pass
+    return random.uniform(0, min(max_seconds, base_seconds * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por proveedor (compartido entre hilos y event loop)
+    
+    - cerrado: las llamadas pasan; `failure_threshold` fallos transitorios
+      seguidos lo abren
+    - abierto: las llamadas fallan al instante durante `reset_seconds`
+    - semiabierto: pasado ese tiempo se deja pasar una llamada de prueba;
+      si sale bien se cierra y si falla vuelve a abrirse
+    
+    Quien recibe la prueba de `before_call` debe devolverla con `end_probe`
+    al terminar (en un `finally`): si falla con un error no transitorio o se
+    cancela, la siguiente llamada puede volver a probar.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = settings.LLM_BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = settings.LLM_BREAKER_RESET_SECONDS
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+        self.opened = 0
+        self.rejected = 0
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+    
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "open" if now - self._opened_at < self.reset_seconds else "half_open"
+    
+    def _retry_after(self, now: float) -> int:
+        return max(1, math.ceil(self.reset_seconds - (now - self._opened_at)))
+    
+    def check(self):
+        """Falla al instante si está abierto (sin ocupar la llamada de prueba)"""
+        with self._lock:
+            now = time.monotonic()
+            if self._state(now) == "open":
+                self.rejected += 1
+                raise AIProviderUnavailableException(self._retry_after(now))
+    
+    def before_call(self) -> Optional[float]:
+        """
+        Permite la llamada o lanza AIProviderUnavailableException
+        
+        Returns:
+            Identificador de la prueba si la llamada es la de semiabierto (None si no)
+        """
+        with self._lock:
+            now = time.monotonic()
+            state = self._state(now)
+            if state == "closed":
+                return None
+            if state == "half_open":
+                # Una sola prueba a la vez (otra si la anterior quedó sin respuesta)
+                if self._probe_started is None or now - self._probe_started > self.reset_seconds:
+                    self._probe_started = now
+                    return now
+            self.rejected += 1
+            raise AIProviderUnavailableException(self._retry_after(now) if state == "open" else 1)
+    
+    def end_probe(self, probe: Optional[float]):
+        """Libera la prueba de semiabierto, termine como termine la llamada"""
+        if probe is None:
+            return
+        with self._lock:
+            if self._probe_started == probe:
+                self._probe_started = None
+    
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                print(f"🟢 Circuit breaker {self.name} cerrado: el proveedor responde")
+            self._failures = 0
+            self._opened_at = None
+            self._probe_started = None
+    
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._state(now) != "open":
+                    self.opened += 1
+                    print(f"🔴 Circuit breaker {self.name} abierto tras {self._failures} fallos seguidos")
+                self._opened_at = now
+                self._probe_started = None
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state(time.monotonic()),
+                "consecutive_failures": self._failures,
+                "opened": self.opened,
+                "rejected": self.rejected
+            }
+
+
+class ResilientCaller:
+    """
+    Ejecuta llamadas a un proveedor con plazo, reintentos, hedging y breaker
+    
+    Las funciones se pasan sin ejecutar (`lambda: llm.invoke(...)`) porque
+    cada intento las vuelve a llamar. Solo cuentan para el breaker los
+    errores transitorios; un 400 se propaga sin reintentar.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        breaker: CircuitBreaker,
+        timeout_seconds: float = settings.LLM_REQUEST_TIMEOUT_SECONDS,
+        max_retries: int = settings.LLM_MAX_RETRIES,
+        max_backoff_seconds: float = settings.LLM_BACKOFF_MAX_SECONDS,
+        hedge_enabled: bool = False,
+        hedge_min_delay_seconds: float = settings.LLM_HEDGE_MIN_DELAY_SECONDS,
+        hedge_min_samples: int = 20
+    ):
+        self.name = name
+        self.breaker = breaker
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
+        self.max_backoff_seconds = max_backoff_seconds
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_delay_seconds = hedge_min_delay_seconds
+        self.hedge_min_samples = hedge_min_samples
+        self._latencies: Deque[float] = deque(maxlen=512)
+        self._stats_lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        # Peticiones duplicadas canceladas tras empezar (el proveedor ya las factura)
+        self.hedges_cancelled = 0
+    
+    # ============================================
+    # SÍNCRONO
+    # ============================================
+    
+    def call(self, fn: Callable[[], T]) -> T:
+        """Llamada síncrona (el plazo lo aplica el cliente HTTP del modelo)"""
+        attempt = 0
+        while True:
+            try:
+                return self._observe(fn)
+            except Exception as e:
+                wait = self._retry_wait(attempt, e)
+            attempt += 1
+            time.sleep(wait)
+    
+    def _observe(self, fn: Callable[[], T]) -> T:
+        probe = self.breaker.before_call()
+        started = time.monotonic()
+        try:
+            result = fn()
+        except Exception as e:
+            if is_transient_error(e):
+                self.breaker.record_failure()
+            raise
+        finally:
+            self.breaker.end_probe(probe)
+        self._record_success(time.monotonic() - started)
+        return result
+    
+    # ============================================
+    # ASÍNCRONO
+    # ============================================
+    
+    async def acall(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        hedge: bool = False,
+        on_hedge_cancelled: Optional[Callable[[], None]] = None
+    ) -> T:
+        """
+        Llamada asíncrona con plazo por intento
+        
+        Con `hedge` (y hedging habilitado) se lanza una segunda petición si la
+        primera supera el p95 reciente, y se usa la que termine antes. La que
+        pierde se cancela, pero el proveedor ya la cobró: `on_hedge_cancelled`
+        se llama una vez por cada petición cancelada para que el llamador
+        pueda contarla.
+        """
+        attempt = 0
+        while True:
+            try:
+                if hedge and self.hedge_enabled:
+                    return await self._ahedged(fn, on_hedge_cancelled)
+                return await self._aobserve(fn)
+            except Exception as e:
+                wait = self._retry_wait(attempt, e)
+            attempt += 1
+            await asyncio.sleep(wait)
+    
+    async def _aobserve(self, fn: Callable[[], Awaitable[T]]) -> T:
+        probe = self.breaker.before_call()
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(fn(), self.timeout_seconds)
+        except Exception as e:
+            if is_transient_error(e):
+                self.breaker.record_failure()
+            raise
+        finally:
+            # También si se cancela (petición duplicada perdedora, cliente desconectado)
+            self.breaker.end_probe(probe)
+        self._record_success(time.monotonic() - started)
+        return result
+    
+    async def _ahedged(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        on_hedge_cancelled: Optional[Callable[[], None]] = None
+    ) -> T:
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._aobserve(fn)
+        
+        first = asyncio.ensure_future(self._aobserve(fn))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+        
+        with self._stats_lock:
+            self.hedges += 1
+        print(f"   🔀 {self.name}: sin respuesta tras {delay:.1f}s (p95), lanzando segunda petición")
+        second = asyncio.ensure_future(self._aobserve(fn))
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            with self._stats_lock:
+                                self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                with self._stats_lock:
+                    self.hedges_cancelled += len(pending)
+                if on_hedge_cancelled is not None:
+                    for _ in pending:
+                        on_hedge_cancelled()
+    
+    async def astream(self, fn: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        Stream con breaker y reintentos mientras no se haya emitido nada
+        
+        Una vez enviado el primer fragmento al cliente no se reintenta (se
+        duplicaría texto); el plazo entre fragmentos lo aplica el cliente HTTP.
+        """
+        attempt = 0
+        while True:
+            probe = self.breaker.before_call()
+            started = time.monotonic()
+            emitted = False
+            try:
+                async for item in fn():
+                    emitted = True
+                    yield item
+            except Exception as e:
+                if is_transient_error(e):
+                    self.breaker.record_failure()
+                if emitted:
+                    raise
+                wait = self._retry_wait(attempt, e)
+            else:
+                self._record_success(time.monotonic() - started)
+                return
+            finally:
+                # También si el cliente cierra el stream a medias
+                self.breaker.end_probe(probe)
+            attempt += 1
+            await asyncio.sleep(wait)
+    
+    # ============================================
+    # AUXILIARES
+    # ============================================
+    
+    def _retry_wait(self, attempt: int, error: Exception) -> float:
+        """Espera antes del siguiente intento (relanza `error` si no se reintenta)"""
+        if not is_transient_error(error) or attempt >= self.max_retries:
+            raise error
+        wait = backoff_seconds(attempt, error, self.max_backoff_seconds)
+        with self._stats_lock:
+            self.retries += 1
+        print(f"   ⏳ {self.name}: {type(error).__name__}, reintento {attempt + 1}/{self.max_retries} en {wait:.1f}s")
+        return wait
+    
+    def _record_success(self, seconds: float):
+        self.breaker.record_success()
+        with self._stats_lock:
+            self.calls += 1
+            self._latencies.append(seconds)
+    
+    def hedge_delay(self) -> Optional[float]:
+        """p95 de las llamadas recientes (None hasta tener `hedge_min_samples`)"""
+        with self._stats_lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        p95 = ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)]
+        return max(self.hedge_min_delay_seconds, p95)
+    
+    def stats(self) -> Dict[str, Any]:
+        hedge_delay = self.hedge_delay()
+        with self._stats_lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "hedges_cancelled": self.hedges_cancelled,
+                "hedge_delay_ms": round(hedge_delay * 1000, 1) if hedge_delay is not None else None,
+                "breaker": self.breaker.stats()
+            }
+
+
+# Breakers globales: uno por proveedor, compartidos por todas las llamadas del proceso
+llm_breaker = CircuitBreaker("llm")
+embeddings_breaker = CircuitBreaker("embeddings")
@@ -0,0 +1,117 @@
+"""
+Extracción de texto de PDFs en paralelo
+Las páginas se extraen en un pool de procesos (pypdf es CPU-bound y retiene
+el GIL). Las funciones que ejecutan los procesos hijos solo dependen de pypdf
+para que arranquen rápido.
+"""
+import io
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Tuple, Union
+from app.config import settings
+
+
+def _open_pdf(source: Union[str, bytes]):
+    """Abre un PDF desde una ruta o desde su contenido en memoria"""
+    import pypdf
+    
+    if isinstance(source, bytes):
+        return pypdf.PdfReader(io.BytesIO(source))
+    return pypdf.PdfReader(source)
+
+
+def count_pdf_pages(source: Union[str, bytes]) -> int:
+    """Número de páginas de un PDF (ruta o contenido en memoria)"""
+    return len(_open_pdf(source).pages)
+
+
+def extract_pdf_pages(source: Union[str, bytes], start: int, end: int) -> List[Tuple[int, str]]:
+    """Texto de las páginas [start, end) de un PDF (se ejecuta en un proceso hijo)"""
+    reader = _open_pdf(source)
+    return [(page_number, reader.pages[page_number].extract_text()) for page_number in range(start, end)]
+
+
+class PdfExtractionPool:
+    """
+    Pool de procesos compartido para extraer texto de PDFs
+    
+    Cada PDF se reparte en tramos de `pages_per_task` páginas; los tramos de
+    todos los PDFs en curso compiten por los mismos procesos. Los procesos se
+    crean con "spawn" (seguro con los hilos del servidor) al primer uso.
+    """
+    
+    def __init__(
+        self,
+        max_processes: int = settings.RAG_PDF_PARSER_PROCESSES,
+        pages_per_task: int = settings.RAG_PDF_PAGES_PER_TASK
+    ):
+        self.max_processes = max_processes if max_processes > 0 else (os.cpu_count() or 1)
+        self.pages_per_task = max(1, pages_per_task)
+        self._executor = None
+        self._lock = threading.Lock()
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Crea el pool de procesos la primera vez que se necesita"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_processes,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+    
+    def _reset_executor(self):
+        """Descarta un pool roto (un proceso hijo murió) para recrearlo en el siguiente uso"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+    
+    def extract(self, source: Union[str, bytes]) -> List[Tuple[int, str]]:
+        """
+        Extrae el texto de todas las páginas de un PDF
+        
+        Args:
+            source: Ruta del archivo o contenido del PDF en memoria. En memoria,
+                cada tarea recibe una copia del contenido, así que los tramos se
+                agrandan para no crear más tareas que procesos.
+        
+        Returns:
+            Lista de (número de página, texto) en orden
+        """
+        page_count = count_pdf_pages(source)
+        pages_per_task = self.pages_per_task
+        if isinstance(source, bytes):
+            pages_per_task = max(pages_per_task, math.ceil(page_count / self.max_processes))
+        
+        ranges = [
+            (start, min(start + pages_per_task, page_count))
+            for start in range(0, page_count, pages_per_task)
+        ]
+        
+        if self.max_processes <= 1:
+            return [page for start, end in ranges for page in extract_pdf_pages(source, start, end)]
+        
+        try:
+            executor = self._get_executor()
+            futures = [executor.submit(extract_pdf_pages, source, start, end) for start, end in ranges]
+            return [page for future in futures for page in future.result()]
+        except BrokenProcessPool as e:
+            print(f"⚠️ Pool de extracción de PDFs roto, extrayendo en el hilo actual: {str(e)}")
+            self._reset_executor()
+            return [page for start, end in ranges for page in extract_pdf_pages(source, start, end)]
+    
+    def shutdown(self):
+        """Detiene los procesos hijos"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+# Instancia global del pool de extracción
+pdf_extraction_pool = PdfExtractionPool()
@@ -0,0 +1,284 @@
+"""
+Ficha clínica de la mascota para el chat con IA
+Resume en pocas líneas los registros de la app (vacunas, desparasitaciones,
+visitas, nutrición y comidas) para incluirlos en el prompt sin búsquedas
+vectoriales. La ficha se guarda en PostgreSQL y se invalida en la misma
+transacción en que se escriben esos registros.
+"""
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, List, Optional, Set
+from sqlalchemy import event, literal, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.services.single_flight import SingleFlight
+
+
+class PetRecordSummaryService:
+    """
+    Genera y cachea la ficha clínica compacta de cada mascota
+    
+    Cada escritura de Pet, Vaccination, Deworming, VetVisit, NutritionPlan o
+    Meal incrementa `records_version` de la mascota (evento after_flush). Una
+    ficha solo se reutiliza si se generó con la versión vigente, y solo se
+    guarda si la versión no cambió mientras se generaba.
+    """
+    
+    # Longitud máxima de los textos libres (motivo, diagnóstico, notas...)
+    MAX_TEXT_CHARS = 160
+    
+    def __init__(self, max_items: int = settings.PET_RECORD_SUMMARY_MAX_ITEMS):
+        self.max_items = max(1, max_items)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Peticiones simultáneas de la misma mascota comparten una sola generación
+        self._builds = SingleFlight()
+    
+    # ============================================
+    # LECTURA (chat)
+    # ============================================
+    
+    def get_summary(self, pet_id: Any) -> Optional[str]:
+        """
+        Devuelve la ficha clínica de la mascota, generándola si no está vigente
+        
+        Returns:
+            Texto de la ficha, o None si la mascota no existe
+        """
+        from app.models import PetRecordSummary
+        
+        if isinstance(pet_id, str):
+            pet_id = uuid.UUID(pet_id)
+        
+        db = SessionLocal()
+        try:
+            cached = db.get(PetRecordSummary, pet_id)
+            if cached is not None and cached.summary is not None and cached.summary_version == cached.records_version:
+                self._count(hit=True)
+                return cached.summary
+        finally:
+            db.close()
+        
+        return self._builds.do(str(pet_id), self._rebuild, pet_id)
+    
+    def _rebuild(self, pet_id: uuid.UUID) -> Optional[str]:
+        """Genera la ficha y la guarda si los registros no cambiaron mientras tanto"""
+        from app.models import Pet, PetRecordSummary
+        
+        db = SessionLocal()
+        try:
+            # Versión leída ANTES que los registros: si cambian después, la ficha no se guarda
+            cached = db.get(PetRecordSummary, pet_id)
+            records_version = cached.records_version if cached is not None else 0
+            pet = db.get(Pet, pet_id)
+            if pet is None:
+                return None
+            
+            summary = self.build_summary(db, pet)
+            self._count(hit=False)
+            
+            statement = insert(PetRecordSummary).values(
+                pet_id=pet.id,
+                records_version=records_version,
+                summary_version=records_version,
+                summary=summary,
+                updated_at=datetime.now()
+            ).on_conflict_do_update(
+                index_elements=["pet_id"],
+                set_={"summary": summary, "summary_version": records_version, "updated_at": datetime.now()},
+                where=PetRecordSummary.records_version == records_version
+            )
+            try:
+                db.execute(statement)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"⚠️ Error guardando ficha clínica de mascota {pet_id}: {str(e)}")
+            
+            return summary
+        finally:
+            db.close()
+    
+    def _count(self, hit: bool):
+        """Actualiza los contadores de aciertos/fallos de la caché"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+    
+    def stats(self) -> dict:
+        """Aciertos y fallos de la caché de fichas en este proceso"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "coalesced": self._builds.coalesced}
+    
+    # ============================================
+    # GENERACIÓN
+    # ============================================
+    
+    def _shorten(self, text: Optional[str]) -> str:
+        """Texto libre en una línea y acotado a MAX_TEXT_CHARS"""
+        text = " ".join((text or "").split())
+        if len(text) > self.MAX_TEXT_CHARS:
+            return text[:self.MAX_TEXT_CHARS - 3] + "..."
+        return text
+    
+    @staticmethod
+    def _date(value) -> str:
+        """Fecha en formato ISO (sin hora)"""
+        if value is None:
+            return "?"
+        return value.date().isoformat() if isinstance(value, datetime) else value.isoformat()
+    
+    def build_summary(self, db, pet) -> str:
+        """
+        Construye la ficha clínica de una mascota
+        
+        Solo contiene datos guardados (no la edad calculada), así la ficha
+        cacheada no caduca con el paso del tiempo.
+        """
+        from app.models import Vaccination, Deworming, VetVisit, NutritionPlan, Meal
+        
+        lines: List[str] = []
+        
+        profile = f"{pet.name} ({pet.species}"
+        if pet.breed:
+            profile += f", {pet.breed}"
+        profile += ")"
+        if pet.sex:
+            profile += f", sexo: {pet.sex}"
+        if pet.birth_date:
+            profile += f", nacimiento: {self._date(pet.birth_date)}"
+        if pet.weight_kg is not None:
+            profile += f", peso: {pet.weight_kg} kg"
+        lines.append(f"Mascota: {profile}")
+        if pet.notes:
+            lines.append(f"Notas: {self._shorten(pet.notes)}")
+        
+        # Última aplicación de cada vacuna
+        vaccinations = db.query(Vaccination).filter(
+            Vaccination.pet_id == pet.id
+        ).order_by(Vaccination.date_administered.desc()).all()
+        latest_by_vaccine = {}
+        for vaccination in vaccinations:
+            latest_by_vaccine.setdefault(vaccination.vaccine_name.strip().lower(), vaccination)
+        vaccine_items = []
+        for vaccination in list(latest_by_vaccine.values())[:self.max_items]:
+            item = f"{vaccination.vaccine_name} {self._date(vaccination.date_administered)}"
+            if vaccination.next_due:
+                item += f" (próxima {self._date(vaccination.next_due)})"
+            vaccine_items.append(item)
+        lines.append("Vacunas (última de cada una): " + ("; ".join(vaccine_items) or "sin registros"))
+        
+        dewormings = db.query(Deworming).filter(
+            Deworming.pet_id == pet.id
+        ).order_by(Deworming.date_administered.desc()).limit(self.max_items).all()
+        deworming_items = []
+        for deworming in dewormings:
+            item = f"{self._date(deworming.date_administered)} {deworming.medication or 'sin medicamento indicado'}"
+            if deworming.next_due:
+                item += f" (próxima {self._date(deworming.next_due)})"
+            deworming_items.append(item)
+        lines.append("Desparasitaciones: " + ("; ".join(deworming_items) or "sin registros"))
+        
+        visits = db.query(VetVisit).filter(
+            VetVisit.pet_id == pet.id
+        ).order_by(VetVisit.visit_date.desc()).limit(self.max_items).all()
+        if visits:
+            lines.append("Visitas veterinarias recientes:")
+            for visit in visits:
+                details = [
+                    f"{label}: {self._shorten(value)}"
+                    for label, value in (
+                        ("motivo", visit.reason),
+                        ("diagnóstico", visit.diagnosis),
+                        ("tratamiento", visit.treatment)
+                    )
+                    if value
+                ]
+                if visit.follow_up_date:
+                    details.append(f"control: {self._date(visit.follow_up_date)}")
+                lines.append(f"- {self._date(visit.visit_date)}: " + ("; ".join(details) or "sin detalles"))
+        else:
+            lines.append("Visitas veterinarias: sin registros")
+        
+        plans = db.query(NutritionPlan).filter(
+            NutritionPlan.pet_id == pet.id
+        ).order_by(NutritionPlan.updated_at.desc()).limit(self.max_items).all()
+        plan_items = []
+        for plan in plans:
+            item = plan.name or "plan sin nombre"
+            if plan.calories_per_day:
+                item += f", {plan.calories_per_day} kcal/día"
+            if plan.description:
+                item += f": {self._shorten(plan.description)}"
+            plan_items.append(item)
+        if plan_items:
+            lines.append("Planes de nutrición: " + "; ".join(plan_items))
+        
+        meals = db.query(Meal).filter(
+            Meal.pet_id == pet.id
+        ).order_by(Meal.meal_time.desc()).limit(self.max_items).all()
+        meal_items = []
+        for meal in meals:
+            item = f"{self._date(meal.meal_time)} {self._shorten(meal.description) or 'comida'}"
+            if meal.calories:
+                item += f" ({meal.calories} kcal)"
+            meal_items.append(item)
+        if meal_items:
+            lines.append("Comidas recientes: " + "; ".join(meal_items))
+        
+        return "\n".join(lines)
+    
+    # ============================================
+    # INVALIDACIÓN (evento de SQLAlchemy)
+    # ============================================
+    
+    @staticmethod
+    def _changed_pet_ids(session: Session) -> Set[Any]:
+        """IDs de mascotas cuyos registros se insertan, modifican o eliminan en el flush"""
+        from sqlalchemy import inspect
+        from app.models import Pet, Vaccination, Deworming, VetVisit, NutritionPlan, Meal
+        
+        tracked = (Vaccination, Deworming, VetVisit, NutritionPlan, Meal)
+        pet_ids = set()
+        for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(instance, Pet):
+                pet_ids.add(instance.id)
+            elif isinstance(instance, tracked):
+                # Incluye la mascota anterior si el registro cambió de mascota
+                history = inspect(instance).attrs.pet_id.history
+                pet_ids.update(history.added or ())
+                pet_ids.update(history.unchanged or ())
+                pet_ids.update(history.deleted or ())
+        pet_ids.discard(None)
+        return pet_ids
+    
+    def invalidate_after_flush(self, session: Session, flush_context):
+        """Incrementa records_version de las mascotas afectadas, en la misma transacción"""
+        from app.models import Pet, PetRecordSummary
+        
+        pet_ids = self._changed_pet_ids(session)
+        if not pet_ids:
+            return
+        
+        # Solo mascotas que siguen existiendo (las eliminadas borran su ficha en cascada)
+        statement = insert(PetRecordSummary).from_select(
+            ["pet_id", "records_version"],
+            select(Pet.id, literal(1)).where(Pet.id.in_(pet_ids))
+        ).on_conflict_do_update(
+            index_elements=["pet_id"],
+            set_={"records_version": PetRecordSummary.records_version + 1}
+        )
+        session.connection().execute(statement)
+
+
+# Instancia global del servicio
+pet_record_summary_service = PetRecordSummaryService()
+
+# Invalidar la ficha en cualquier sesión que escriba registros de mascotas
+event.listen(Session, "after_flush", pet_record_summary_service.invalidate_after_flush)
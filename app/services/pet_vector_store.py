@@ -0,0 +1,127 @@
+"""
+Índice vectorial de documentos de mascotas (RAG)
+Todos los chunks viven en una sola tabla (petcare.pet_document_chunks) con
+pet_id, document_id y generación como columnas indexadas; un único índice
+HNSW y uno de texto completo sirven a todas las mascotas
+"""
+import uuid
+from typing import Any, List, Optional
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from app.database import SessionLocal, engine
+from app.services.chat_metrics import chat_metrics
+from app.services.hybrid_retriever import HybridRetriever
+from app.services.retrieval_cache import retrieval_cache
+from app.services.token_budget import token_counter
+
+
+class PetVectorStore:
+    """Chunks de una generación del índice de una mascota dentro de la tabla compartida"""
+    
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        pet_id: str,
+        generation: int,
+        index_version: Optional[int] = None
+    ):
+        """
+        Args:
+            embeddings: Modelo de embeddings (el del servicio LangChain)
+            pet_id: ID de la mascota
+            generation: Generación vigente (PetDocumentIndex.generation) o la que se está construyendo
+            index_version: PetDocumentIndex.version al abrir el índice para consultas
+                (activa la caché de recuperaciones; None durante la indexación)
+        """
+        self.embeddings = embeddings
+        self.pet_id = str(pet_id)
+        self.generation = generation
+        self.index_version = index_version
+    
+    def add_document(self, document_id: Any, chunks: List[Document]) -> int:
+        """
+        Calcula los embeddings de los chunks de un documento y los guarda
+        
+        Los chunks previos del documento en esta generación se reemplazan en
+        la misma transacción, así que reindexar un documento no duplica filas.
+        """
+        from app.models import PetDocumentChunk
+        
+        texts = [chunk.page_content for chunk in chunks]
+        with chat_metrics.span("embed", chunks=len(texts), tokens=sum(token_counter.count(text) for text in texts)):
+            vectors = self.embeddings.embed_documents(texts)
+        
+        db = SessionLocal()
+        try:
+            with chat_metrics.span("vector_insert", chunks=len(chunks)):
+                db.execute(delete(PetDocumentChunk).where(
+                    PetDocumentChunk.document_id == str(document_id),
+                    PetDocumentChunk.generation == self.generation
+                ))
+                if chunks:
+                    db.execute(insert(PetDocumentChunk).values([
+                        {
+                            "id": uuid.uuid4(),
+                            "pet_id": self.pet_id,
+                            "document_id": str(document_id),
+                            "generation": self.generation,
+                            "chunk_index": position,
+                            "content": chunk.page_content,
+                            "chunk_metadata": chunk.metadata,
+                            "embedding": vector,
+                        }
+                        for position, (chunk, vector) in enumerate(zip(chunks, vectors))
+                    ]))
+                db.commit()
+        finally:
+            db.close()
+        return len(chunks)
+    
+    def as_retriever(self) -> HybridRetriever:
+        """Retriever filtrado por esta mascota y generación"""
+        return HybridRetriever(
+            engine=engine,
+            embeddings=self.embeddings,
+            pet_id=self.pet_id,
+            generation=self.generation,
+            index_version=self.index_version,
+            cache=retrieval_cache
+        )
+    
+    # ============================================
+    # OPERACIONES MASIVAS (una sentencia)
+    # ============================================
+    
+    @staticmethod
+    def delete_document(document_id: str) -> int:
+        """Elimina los chunks de un documento en todas las generaciones"""
+        from app.models import PetDocumentChunk
+        
+        db = SessionLocal()
+        try:
+            result = db.execute(delete(PetDocumentChunk).where(
+                PetDocumentChunk.document_id == str(document_id)
+            ))
+            db.commit()
+            return result.rowcount or 0
+        finally:
+            db.close()
+    
+    @staticmethod
+    def delete_pet(pet_id: str, keep_generation: Optional[int] = None) -> int:
+        """Elimina los chunks de una mascota (salvo, si se indica, los de `keep_generation`)"""
+        from app.models import PetDocumentChunk
+        
+        statement = delete(PetDocumentChunk).where(PetDocumentChunk.pet_id == str(pet_id))
+        if keep_generation is not None:
+            statement = statement.where(PetDocumentChunk.generation != keep_generation)
+        
+        db = SessionLocal()
+        try:
+            result = db.execute(statement)
+            db.commit()
+            return result.rowcount or 0
+        finally:
+            db.close()
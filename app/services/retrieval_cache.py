@@ -0,0 +1,102 @@
+"""
+Caché de recuperaciones RAG por mascota
+Guarda, por (mascota, pregunta normalizada), el embedding de la pregunta y
+los ids de los chunks recuperados con la versión del índice vigente. Repetir
+la pregunta con el mismo índice evita el embedding y la búsqueda vectorial;
+si el índice cambió, solo se reutiliza el embedding.
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+
+
+class RetrievalCache:
+    """LRU en memoria del proceso; cada entrada recuerda la versión del índice con la que se obtuvo"""
+    
+    def __init__(self, max_entries: int = settings.RAG_RETRIEVAL_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # (pet_id, pregunta normalizada) -> (versión del índice, embedding, ids de chunks)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[int, List[float], List[str]]]" = OrderedDict()
+        self.hits = 0
+        self.embedding_hits = 0
+        self.misses = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+    
+    @staticmethod
+    def normalize(question: str) -> str:
+        """Minúsculas y solo palabras: ignora mayúsculas, signos y espacios"""
+        return " ".join(re.findall(r"\w+", question.lower()))
+    
+    def lookup(
+        self,
+        pet_id: str,
+        index_version: int,
+        question: str
+    ) -> Tuple[Optional[List[float]], Optional[List[str]]]:
+        """
+        Busca una recuperación previa de la pregunta
+        
+        Returns:
+            (embedding o None, ids de chunks o None). Los ids solo se devuelven
+            si se obtuvieron con `index_version`.
+        """
+        if not self.enabled:
+            return None, None
+        
+        key = (str(pet_id), self.normalize(question))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, None
+            
+            self._entries.move_to_end(key)
+            version, embedding, chunk_ids = entry
+            if version != index_version:
+                self.embedding_hits += 1
+                return embedding, None
+            
+            self.hits += 1
+            return embedding, list(chunk_ids)
+    
+    def store(
+        self,
+        pet_id: str,
+        index_version: int,
+        question: str,
+        embedding: List[float],
+        chunk_ids: List[str]
+    ):
+        """Guarda (o reemplaza) la recuperación de la pregunta"""
+        if not self.enabled:
+            return
+        
+        key = (str(pet_id), self.normalize(question))
+        with self._lock:
+            self._entries[key] = (index_version, list(embedding), list(chunk_ids))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Aciertos completos, aciertos solo de embedding y fallos en este proceso"""
+        with self._lock:
+            lookups = self.hits + self.embedding_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "embedding_hits": self.embedding_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# Instancia global de la caché
+retrieval_cache = RetrievalCache()
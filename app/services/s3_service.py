@@ -7,6 +7,7 @@ import io
 import uuid
 import base64
 from typing import Optional, BinaryIO
+from urllib.parse import urlparse, unquote
 from datetime import datetime, timedelta
 from PIL import Image
 from botocore.exceptions import ClientError
@@ -435,6 +436,45 @@ class S3Service:
         except ClientError as e:
             print(f"❌ Error subiendo documento a S3: {str(e)}")
             return None
+    
+    def get_key_from_url(self, url: str) -> Optional[str]:
+        """
+        Obtiene la clave S3 de una URL generada por este servicio
+        
+        Args:
+            url: URL pública del objeto (https://bucket.s3.region.amazonaws.com/key)
+        
+        Returns:
+            Clave del objeto o None si la URL no pertenece al bucket configurado
+        """
+        if not url:
+            return None
+        
+        parsed = urlparse(url)
+        if not parsed.netloc.startswith(f"{self.bucket_name}.s3") or not parsed.netloc.endswith(".amazonaws.com"):
+            return None
+        
+        s3_key = unquote(parsed.path.lstrip('/'))
+        return s3_key or None
+    
+    def download_object(self, s3_key: str) -> bytes:
+        """
+        Descarga un objeto de S3 a memoria con el cliente autenticado
+        
+        Funciona con buckets privados y reutiliza el pool de conexiones del
+        cliente. Pensado para documentos (limitados a MAX_DOCUMENT_SIZE_MB).
+        
+        Args:
+            s3_key: Clave del objeto en S3
+        
+        Returns:
+            Contenido binario del objeto
+        """
+        response = self.s3_client.get_object(
+            Bucket=self.bucket_name,
+            Key=s3_key
+        )
+        return response['Body'].read()
 
 # Instancia global del servicio
 s3_service = S3Service()
\ No newline at end of file
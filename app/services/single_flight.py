@@ -0,0 +1,59 @@
+"""
+Coalescencia de trabajos concurrentes (single-flight)
+Si varios hilos piden el mismo trabajo a la vez, solo el primero lo ejecuta;
+los demás esperan y reciben su mismo resultado (o su misma excepción)
+"""
+import threading
+from typing import Any, Callable, Dict, Optional
+
+
+class _Call:
+    """Trabajo en curso de una clave"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[Exception] = None
+
+
+class SingleFlight:
+    """Ejecuta como mucho un trabajo a la vez por clave y comparte su resultado"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.coalesced = 0
+    
+    def do(self, key: str, func: Callable, *args, **kwargs) -> Any:
+        """
+        Ejecuta `func(*args, **kwargs)` o espera al que ya se está ejecutando para `key`
+        
+        La clave se libera al terminar: una llamada posterior vuelve a ejecutar
+        el trabajo (no es una caché).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
@@ -0,0 +1,116 @@
+"""
+Conteo de tokens para acotar el tamaño del prompt del chat con IA
+Usa tiktoken con la codificación del modelo configurado
+"""
+import threading
+from typing import List
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.retrievers import BaseRetriever
+from app.config import settings
+
+
+class TokenCounter:
+    """Cuenta tokens de textos y mensajes y recorta listas a un presupuesto"""
+    
+    # Tokens extra por mensaje de chat (rol y separadores del formato de OpenAI)
+    MESSAGE_OVERHEAD_TOKENS = 4
+    
+    def __init__(self, model_name: str = settings.OPENAI_MODEL):
+        self.model_name = model_name
+        self._encoding = None
+        self._encoding_failed = False
+        self._lock = threading.Lock()
+    
+    def _get_encoding(self):
+        """Carga la codificación de tiktoken una sola vez (perezosa)"""
+        if self._encoding is not None or self._encoding_failed:
+            return self._encoding
+        
+        with self._lock:
+            if self._encoding is None and not self._encoding_failed:
+                import tiktoken
+                try:
+                    try:
+                        self._encoding = tiktoken.encoding_for_model(self.model_name)
+                    except KeyError:
+                        self._encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    # Sin acceso a los ficheros BPE: se usa una estimación por caracteres
+                    print(f"⚠️ No se pudo cargar tiktoken, estimando tokens: {str(e)}")
+                    self._encoding_failed = True
+        return self._encoding
+    
+    def count(self, text: str) -> int:
+        """Número de tokens de un texto"""
+        if not text:
+            return 0
+        
+        encoding = self._get_encoding()
+        if encoding is None:
+            return len(text) // 4 + 1
+        return len(encoding.encode(text, disallowed_special=()))
+    
+    def count_message(self, message: BaseMessage) -> int:
+        """Número de tokens de un mensaje de chat"""
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        return self.count(content) + self.MESSAGE_OVERHEAD_TOKENS
+    
+    def trim_messages(self, messages: List[BaseMessage], max_tokens: int) -> int:
+        """
+        Elimina en el sitio los mensajes más antiguos hasta caber en `max_tokens`
+        
+        La lista se modifica directamente (sin reconstruirla) y nunca queda
+        empezando por una respuesta del asistente sin su pregunta.
+        
+        Returns:
+            Número de mensajes eliminados
+        """
+        token_counts = [self.count_message(message) for message in messages]
+        total = sum(token_counts)
+        
+        start = 0
+        while start < len(messages) and total > max_tokens:
+            total -= token_counts[start]
+            start += 1
+        while start < len(messages) and isinstance(messages[start], AIMessage):
+            start += 1
+        
+        if start:
+            del messages[:start]
+        return start
+    
+    def fit_documents(self, documents: List[Document], max_tokens: int) -> List[Document]:
+        """Documentos recuperados (en orden de relevancia) que caben en `max_tokens`"""
+        fitted = []
+        total = 0
+        for document in documents:
+            total += self.count(document.page_content)
+            if total > max_tokens:
+                break
+            fitted.append(document)
+        return fitted
+
+
+# Instancia global del contador de tokens
+token_counter = TokenCounter()
+
+
+class TokenBudgetRetriever(BaseRetriever):
+    """Envuelve un retriever y descarta los documentos que exceden `max_tokens`"""
+    
+    retriever: BaseRetriever
+    max_tokens: int
+    
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        documents = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return token_counter.fit_documents(documents, self.max_tokens)
+    
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        documents = await self.retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
+        return token_counter.fit_documents(documents, self.max_tokens)
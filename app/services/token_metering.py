@@ -0,0 +1,317 @@
+"""
+Medición de tokens del LLM por usuario y límite diario
+Cada llamada al modelo hecha durante una petición de chat suma sus tokens
+(prompt contado con tiktoken, respuesta según el proveedor) al usuario de la
+petición. Los contadores se acumulan en memoria y se guardan por lotes en
+petcare.user_token_usage (una fila por usuario y día).
+"""
+import atexit
+import threading
+import time
+from contextvars import ContextVar
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from app.config import settings
+from app.database import SessionLocal
+from app.utils.exceptions import TokenBudgetExceededException
+
+
+class RequestUsage:
+    """Tokens consumidos por una petición"""
+    
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls = 0
+    
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "llm_calls": self.calls
+        }
+
+
+class TokenMeter:
+    """
+    Contadores de tokens por usuario y día con límite diario
+    
+    El consumo del día se calcula como lo ya guardado (leído de la base de
+    datos como mucho una vez cada `usage_cache_seconds` por usuario) más lo
+    pendiente de guardar, así comprobar el límite no cuesta una consulta por
+    petición. Los pendientes se guardan cada `flush_seconds` en una sola
+    sentencia; mientras dura el commit siguen contando como "en vuelo", y el
+    commit y las lecturas de la base de datos no se solapan (`_db_lock`), así
+    un consumo nunca se cuenta dos veces ni deja de contarse.
+    """
+    
+    def __init__(
+        self,
+        daily_budget: int = settings.CHAT_DAILY_TOKEN_BUDGET,
+        flush_seconds: int = settings.CHAT_TOKEN_USAGE_FLUSH_SECONDS,
+        usage_cache_seconds: int = 60
+    ):
+        self.daily_budget = daily_budget
+        self.flush_seconds = max(1, flush_seconds)
+        self.usage_cache_seconds = usage_cache_seconds
+        self._lock = threading.Lock()
+        # (user_id, día) -> [prompt, completion, peticiones] pendientes de guardar
+        self._pending: Dict[Tuple[str, date], List[int]] = {}
+        # Contadores que se están guardando ahora mismo (aún no persistidos)
+        self._in_flight: Dict[Tuple[str, date], List[int]] = {}
+        # Serializa el guardado con las lecturas de lo ya persistido
+        self._db_lock = threading.Lock()
+        # (user_id, día) -> (tokens guardados, momento de la lectura)
+        self._persisted: Dict[Tuple[str, date], Tuple[int, float]] = {}
+        self._current: ContextVar[Optional[RequestUsage]] = ContextVar("token_usage", default=None)
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.rejected = 0
+        self.flushes = 0
+    
+    # ============================================
+    # PETICIONES
+    # ============================================
+    
+    def begin_request(self, user_id: Any) -> RequestUsage:
+        """
+        Empieza a medir la petición actual (en el contexto del llamador)
+        
+        El límite se comprueba antes con ensure_within_budget, que puede
+        consultar la base de datos y conviene ejecutar en el threadpool.
+        """
+        user_id = str(user_id)
+        usage = RequestUsage(user_id)
+        self._current.set(usage)
+        with self._lock:
+            self._pending_entry(user_id)[2] += 1
+        self._start_flusher()
+        return usage
+    
+    def resume(self, usage: Optional[RequestUsage]):
+        """Sigue midiendo `usage` desde otro contexto (ej: el generador de un stream)"""
+        self._current.set(usage)
+    
+    def record(self, prompt_tokens: int, completion_tokens: int):
+        """Suma una llamada al LLM a la petición actual (sin petición activa no se atribuye)"""
+        usage = self._current.get()
+        if usage is None:
+            return
+        
+        usage.prompt_tokens += prompt_tokens
+        usage.completion_tokens += completion_tokens
+        usage.calls += 1
+        self.record_for(usage.user_id, prompt_tokens, completion_tokens)
+    
+    def current_user_id(self) -> Optional[str]:
+        """Usuario de la petición que se está midiendo (None fuera de una petición)"""
+        usage = self._current.get()
+        return usage.user_id if usage is not None else None
+    
+    def record_for(self, user_id: Any, prompt_tokens: int, completion_tokens: int):
+        """Suma tokens al consumo diario de un usuario fuera de su petición (ej: tareas en segundo plano)"""
+        with self._lock:
+            entry = self._pending_entry(str(user_id))
+            entry[0] += prompt_tokens
+            entry[1] += completion_tokens
+    
+    def _pending_entry(self, user_id: str) -> List[int]:
+        """Contadores pendientes del usuario para hoy (llamar con el lock tomado)"""
+        key = (user_id, date.today())
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = self._pending[key] = [0, 0, 0]
+        return entry
+    
+    # ============================================
+    # LÍMITE DIARIO
+    # ============================================
+    
+    def used_today(self, user_id: Any) -> int:
+        """Tokens consumidos hoy por el usuario (guardados + en vuelo + pendientes)"""
+        from app.models import UserTokenUsage
+        
+        key = (str(user_id), date.today())
+        now = time.monotonic()
+        with self._lock:
+            cached = self._persisted.get(key)
+        
+        if cached is None or now - cached[1] > self.usage_cache_seconds:
+            # Sin solaparse con un guardado: lo leído incluye un lote entero o nada de él
+            with self._db_lock:
+                db = SessionLocal()
+                try:
+                    row = db.query(UserTokenUsage.prompt_tokens, UserTokenUsage.completion_tokens).filter(
+                        UserTokenUsage.user_id == key[0],
+                        UserTokenUsage.usage_date == key[1]
+                    ).first()
+                finally:
+                    db.close()
+                with self._lock:
+                    self._persisted[key] = ((row.prompt_tokens + row.completion_tokens) if row else 0, now)
+        
+        with self._lock:
+            persisted = self._persisted[key][0]
+            pending = self._pending.get(key) or [0, 0, 0]
+            in_flight = self._in_flight.get(key) or [0, 0, 0]
+            return persisted + pending[0] + pending[1] + in_flight[0] + in_flight[1]
+    
+    def ensure_within_budget(self, user_id: Any):
+        """Lanza TokenBudgetExceededException si el usuario agotó su límite diario"""
+        if self.daily_budget <= 0:
+            return
+        if self.used_today(user_id) >= self.daily_budget:
+            with self._lock:
+                self.rejected += 1
+            print(f"⛔ Usuario {user_id} sin tokens disponibles hoy (límite {self.daily_budget})")
+            raise TokenBudgetExceededException(self.daily_budget)
+    
+    # ============================================
+    # ESCRITURA POR LOTES
+    # ============================================
+    
+    def _start_flusher(self):
+        """Arranca el hilo que guarda los contadores (la primera vez)"""
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="token-usage-flush", daemon=True)
+                self._flusher.start()
+    
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Error guardando contadores de tokens: {str(e)}")
+    
+    def flush(self):
+        """Guarda los contadores pendientes en una sola sentencia (se recuperan si falla)"""
+        with self._db_lock:
+            self._flush_locked()
+    
+    def _flush_locked(self):
+        """Guarda los pendientes (llamar con `_db_lock` tomado)"""
+        from app.models import UserTokenUsage
+        
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._in_flight = pending
+        if not pending:
+            return
+        
+        statement = insert(UserTokenUsage).values([
+            {
+                "user_id": user_id,
+                "usage_date": usage_date,
+                "prompt_tokens": counters[0],
+                "completion_tokens": counters[1],
+                "requests": counters[2]
+            }
+            for (user_id, usage_date), counters in pending.items()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_id", "usage_date"],
+            set_={
+                "prompt_tokens": UserTokenUsage.prompt_tokens + statement.excluded.prompt_tokens,
+                "completion_tokens": UserTokenUsage.completion_tokens + statement.excluded.completion_tokens,
+                "requests": UserTokenUsage.requests + statement.excluded.requests,
+                "updated_at": func.now()
+            }
+        )
+        
+        db = SessionLocal()
+        try:
+            db.execute(statement)
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                self._in_flight = {}
+                for key, counters in pending.items():
+                    entry = self._pending.setdefault(key, [0, 0, 0])
+                    for position in range(3):
+                        entry[position] += counters[position]
+            raise
+        finally:
+            db.close()
+        
+        with self._lock:
+            self.flushes += 1
+            self._in_flight = {}
+            # Lo guardado pasa de en vuelo a persistido sin volver a leerlo
+            for key, counters in pending.items():
+                cached = self._persisted.get(key)
+                if cached is not None:
+                    self._persisted[key] = (cached[0] + counters[0] + counters[1], cached[1])
+    
+    def shutdown(self):
+        """Detiene el hilo y guarda lo pendiente"""
+        self._stop.set()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"⚠️ Error guardando contadores de tokens: {str(e)}")
+    
+    # ============================================
+    # INFORMES
+    # ============================================
+    
+    def report(self, db, days: int = 7, limit: int = 50) -> List[Dict[str, Any]]:
+        """Consumo por usuario en los últimos `days` días, de mayor a menor"""
+        from app.models import User, UserTokenUsage
+        
+        self.flush()
+        
+        since = date.today() - timedelta(days=max(1, days) - 1)
+        prompt_tokens = func.sum(UserTokenUsage.prompt_tokens)
+        completion_tokens = func.sum(UserTokenUsage.completion_tokens)
+        rows = db.query(
+            UserTokenUsage.user_id,
+            User.email,
+            prompt_tokens.label("prompt_tokens"),
+            completion_tokens.label("completion_tokens"),
+            func.sum(UserTokenUsage.requests).label("requests")
+        ).join(
+            User, User.id == UserTokenUsage.user_id
+        ).filter(
+            UserTokenUsage.usage_date >= since
+        ).group_by(
+            UserTokenUsage.user_id, User.email
+        ).order_by(
+            (prompt_tokens + completion_tokens).desc()
+        ).limit(limit).all()
+        
+        return [
+            {
+                "user_id": str(row.user_id),
+                "email": row.email,
+                "prompt_tokens": int(row.prompt_tokens),
+                "completion_tokens": int(row.completion_tokens),
+                "total_tokens": int(row.prompt_tokens + row.completion_tokens),
+                "requests": int(row.requests)
+            }
+            for row in rows
+        ]
+    
+    def stats(self) -> Dict[str, Any]:
+        """Estado del medidor en este proceso"""
+        with self._lock:
+            return {
+                "daily_budget": self.daily_budget,
+                "pending_users": len(self._pending),
+                "flushes": self.flushes,
+                "rejected": self.rejected
+            }
+
+
+# Instancia global del medidor
+token_meter = TokenMeter()
+
+# Guardar los contadores pendientes al apagar el proceso
+atexit.register(token_meter.shutdown)
@@ -68,4 +68,35 @@ class InsufficientPermissionsException(HTTPException):
         super().__init__(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="No tienes permisos suficientes para realizar esta acción"
+        )
+
+class TokenBudgetExceededException(HTTPException):
+    def __init__(self, budget: int):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Has alcanzado el límite diario de {budget} tokens del chat con IA. Inténtalo de nuevo mañana"
+        )
+
+class ChatQueueFullException(HTTPException):
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Tienes demasiadas preguntas en curso. Espera a que terminen antes de enviar otra",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+class ChatOverloadedException(HTTPException):
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El chat con IA está saturado en este momento. Inténtalo de nuevo en unos segundos",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+class AIProviderUnavailableException(HTTPException):
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El asistente veterinario no está disponible en este momento por un problema con el proveedor de IA. Inténtalo de nuevo en unos segundos",
+            headers={"Retry-After": str(retry_after)},
         )
\ No newline at end of file
@@ -0,0 +1 @@
+"""Benchmarks del backend (ver benchmarks/chat_pipeline.py)"""
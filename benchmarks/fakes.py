@@ -0,0 +1,245 @@
+"""
+Dobles deterministas para el benchmark del chat
+LLM y embeddings falsos con latencia configurable, corpus de PDFs generados
+con semilla y un servidor HTTP local que sustituye a S3
+"""
+import asyncio
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+# ============================================
+# LLM Y EMBEDDINGS
+# ============================================
+
+class FakeChatModel(BaseChatModel):
+    """
+    Sustituto de ChatOpenAI: respuesta determinista tras `latency_seconds`
+    
+    La respuesta depende solo del último mensaje, así dos ejecuciones con la
+    misma semilla producen las mismas conversaciones.
+    """
+    
+    latency_seconds: float = 0.5
+    on_call: Optional[Callable[[float], None]] = None
+    
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake-chat"
+    
+    @staticmethod
+    def _respond(messages: List[BaseMessage]) -> str:
+        last = messages[-1].content if messages else ""
+        last = last if isinstance(last, str) else str(last)
+        # Reformulación de preguntas: devuelve la pregunta de seguimiento tal cual
+        follow_up = re.search(r"Follow Up Input:\s*(.+?)\s*(?:\n|$)", last)
+        if follow_up:
+            return follow_up.group(1)
+        digest = hashlib.sha256(last.encode("utf-8")).hexdigest()[:8]
+        return f"Respuesta de prueba {digest}: revisa las indicaciones del veterinario y mantén las vacunas al día."
+    
+    def _record(self, started: float):
+        if self.on_call is not None:
+            self.on_call(time.perf_counter() - started)
+    
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        started = time.perf_counter()
+        time.sleep(self.latency_seconds)
+        result = ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+        self._record(started)
+        return result
+    
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        started = time.perf_counter()
+        await asyncio.sleep(self.latency_seconds)
+        result = ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+        self._record(started)
+        return result
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Sustituto de OpenAIEmbeddings: bolsa de palabras con hashing, normalizada
+    
+    Textos con palabras en común quedan cerca en similitud coseno, así la
+    búsqueda vectorial devuelve resultados con sentido. Cada petición tarda
+    `latency_seconds` más `per_text_seconds` por texto.
+    """
+    
+    def __init__(self, dimensions: int, latency_seconds: float = 0.1, per_text_seconds: float = 0.0):
+        self.dimensions = dimensions
+        self.latency_seconds = latency_seconds
+        self.per_text_seconds = per_text_seconds
+    
+    def _vector(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for word in re.findall(r"\w+", text.lower()):
+            bucket = int.from_bytes(hashlib.md5(word.encode("utf-8")).digest()[:4], "big")
+            vector[bucket % self.dimensions] += 1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency_seconds + self.per_text_seconds * len(texts))
+        return [self._vector(text) for text in texts]
+    
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency_seconds)
+        return self._vector(text)
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency_seconds)
+        return self._vector(text)
+
+
+# ============================================
+# CORPUS DE PDFs
+# ============================================
+
+TOPICS = {
+    "vacunas": [
+        "Se aplico la vacuna antirrabica lote {lot} sin reacciones adversas.",
+        "Refuerzo de polivalente DHPPi programado para dentro de {n} semanas.",
+        "La vacuna de leptospirosis requiere refuerzo anual.",
+    ],
+    "desparasitacion": [
+        "Desparasitacion interna con Drontal {n} comprimidos segun peso.",
+        "Tratamiento externo con pipeta de fipronil cada {n} semanas.",
+        "Se recomienda repetir la desparasitacion en {n} meses.",
+    ],
+    "laboratorio": [
+        "Hemograma: hematocrito {n} por ciento, leucocitos dentro de rango.",
+        "Bioquimica: creatinina {dec} mg/dl y ALT {n} UI/l.",
+        "Urianalisis con densidad {dec} y sin cristales.",
+    ],
+    "nutricion": [
+        "Dieta de mantenimiento de {n} kcal diarias repartidas en dos tomas.",
+        "Cambio gradual a pienso renal durante {n} dias.",
+        "Peso actual {dec} kg, condicion corporal 5 sobre 9.",
+    ],
+}
+
+
+def _sentence(rng: random.Random, template: str) -> str:
+    return template.format(
+        lot=f"{rng.choice('ABCDEFGH')}{rng.randint(1000, 9999)}",
+        n=rng.randint(2, 60),
+        dec=f"{rng.uniform(0.5, 40):.1f}"
+    )
+
+
+def generate_document_text(rng: random.Random, pages: int, lines_per_page: int = 40) -> List[List[str]]:
+    """Líneas de texto por página de un informe veterinario sintético"""
+    topics = list(TOPICS)
+    return [
+        [_sentence(rng, rng.choice(TOPICS[rng.choice(topics)])) for _ in range(lines_per_page)]
+        for _ in range(pages)
+    ]
+
+
+def build_pdf(pages: List[List[str]]) -> bytes:
+    """PDF mínimo (Helvetica, texto ASCII) legible por pypdf"""
+    font_id = 3 + 2 * len(pages)
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            " ".join(f"{3 + 2 * index} 0 R" for index in range(len(pages))), len(pages)
+        ),
+    ]
+    for index, lines in enumerate(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * index} 0 R "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>"
+        )
+        escaped = [line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines]
+        stream = "BT /F1 9 Tf 11 TL 40 760 Td " + " ".join(f"({line}) Tj T*" for line in escaped) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    
+    output = "%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return output.encode("latin-1")
+
+
+# ============================================
+# SUSTITUTO LOCAL DE S3
+# ============================================
+
+class LocalObjectServer:
+    """
+    Servidor HTTP en memoria que sirve los PDFs generados
+    
+    Sustituye a las URLs públicas de S3: el servicio descarga por HTTP las URLs
+    que no pertenecen al bucket configurado. `latency_seconds` simula el
+    tiempo de primer byte.
+    """
+    
+    def __init__(self, latency_seconds: float = 0.0):
+        self.objects: Dict[str, bytes] = {}
+        self.latency_seconds = latency_seconds
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = server.objects.get(self.path.lstrip("/"))
+                if server.latency_seconds:
+                    time.sleep(server.latency_seconds)
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/pdf")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+    
+    def start(self) -> "LocalObjectServer":
+        self._thread.start()
+        return self
+    
+    def put(self, key: str, body: bytes) -> str:
+        """Guarda un objeto y devuelve su URL"""
+        self.objects[key] = body
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/{key}"
+    
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()